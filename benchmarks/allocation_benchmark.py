@@ -0,0 +1,100 @@
+"""
+Measures allocation churn of short requests with handler and frame pools enabled and disabled: handlers and frames
+constructed per request, garbage collections triggered per 1000 requests, and bytes allocated by ceptic per request as
+traced by tracemalloc. Client and server run in the same process, so both sides are counted.
+Usage: python -m benchmarks.allocation_benchmark [--requests COUNT] [--port PORT]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from ceptic.client import CepticClient, ClientSettings
+from ceptic.common import CommandType, CepticStatusCode
+from ceptic.security import SecuritySettings
+from ceptic.server import CepticServer, ServerSettings
+from ceptic.stream import CepticRequest, CepticResponse, StreamFrame, StreamHandlerInternal, StreamManager
+
+
+class ConstructionCounter(object):
+    """
+    Counts calls to a class's __init__ while active.
+    """
+
+    def __init__(self, cls: type) -> None:
+        self.cls = cls
+        self.count = 0
+        self.original_init = cls.__init__
+
+    def __enter__(self) -> 'ConstructionCounter':
+        original_init = self.original_init
+
+        def counting_init(instance, *args, **kwargs):
+            self.count += 1
+            original_init(instance, *args, **kwargs)
+
+        self.cls.__init__ = counting_init
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.cls.__init__ = self.original_init
+
+
+def allocated_bytes(snapshot: tracemalloc.Snapshot, previous: tracemalloc.Snapshot) -> int:
+    # only count growth in allocations made by ceptic code
+    filters = [tracemalloc.Filter(True, "*ceptic*")]
+    stats = snapshot.filter_traces(filters).compare_to(previous.filter_traces(filters), "filename")
+    return sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+
+
+def run_mode(port: int, requests: int, pooled: bool) -> dict:
+    handler_pool_size, frame_pool_size = StreamManager.HANDLER_POOL_SIZE, StreamManager.FRAME_POOL_SIZE
+    if not pooled:
+        StreamManager.HANDLER_POOL_SIZE = StreamManager.FRAME_POOL_SIZE = 0
+    server = CepticServer(security=SecuritySettings.server_unsecure(), settings=ServerSettings(port=port))
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK, body=b"pong"))
+    server.start()
+    client = CepticClient(settings=ClientSettings(legacy_handshake=False), security=SecuritySettings.client_unsecure())
+    try:
+        # warm up manager, and pools if enabled
+        for _ in range(100):
+            client.connect(CepticRequest(CommandType.GET, f"localhost:{port}/"))
+        gc.collect()
+        collections_before = gc.get_stats()[0]["collections"]
+        tracemalloc.start()
+        snapshot_before = tracemalloc.take_snapshot()
+        with ConstructionCounter(StreamHandlerInternal) as handlers, ConstructionCounter(StreamFrame) as frames:
+            for _ in range(requests):
+                client.connect(CepticRequest(CommandType.GET, f"localhost:{port}/"))
+        snapshot_after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        collections = gc.get_stats()[0]["collections"] - collections_before
+        return {
+            "mode": "pooled" if pooled else "unpooled",
+            "handlers_per_request": handlers.count / requests,
+            "frames_per_request": frames.count / requests,
+            "gc_per_1000_requests": collections * 1000 / requests,
+            "retained_bytes_per_request": allocated_bytes(snapshot_after, snapshot_before) / requests,
+        }
+    finally:
+        client.stop()
+        server.stop()
+        StreamManager.HANDLER_POOL_SIZE, StreamManager.FRAME_POOL_SIZE = handler_pool_size, frame_pool_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per mode")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+
+    for port, pooled in ((args.port, False), (args.port + 1, True)):
+        result = run_mode(port, args.requests, pooled)
+        print(f"{result['mode']:>8}: {result['handlers_per_request']:5.2f} handlers/request, "
+              f"{result['frames_per_request']:5.2f} frames/request, "
+              f"{result['gc_per_1000_requests']:6.1f} gen0 collections/1000 requests, "
+              f"{result['retained_bytes_per_request']:8.1f} bytes retained/request")
+
+
+if __name__ == "__main__":
+    main()
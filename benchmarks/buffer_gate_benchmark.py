@@ -0,0 +1,92 @@
+"""
+Measures per-frame cost of handler buffer accounting: the previous SafeCounter and Event pair, which polled every
+100 ms while full, against CreditGate. Runs uncontended (buffer never fills) and contended (a producer thread waits on a
+consumer thread through a small buffer) cases.
+Usage: python -m benchmarks.buffer_gate_benchmark [--frames COUNT] [--frame-size BYTES]
+"""
+import argparse
+from collections import deque
+from threading import Thread, Event, Condition
+from time import perf_counter
+
+from ceptic.stream import CreditGate, SafeCounter
+
+
+class CounterEventGate(object):
+    """
+    Buffer accounting as handlers did it before CreditGate, kept here as a baseline.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.counter = SafeCounter()
+        self.ready_or_stop = Event()
+        self.wait_timeout = 0.1
+
+    def is_full(self) -> bool:
+        return self.counter.value > self.capacity
+
+    def acquire(self, amount: int) -> bool:
+        self.counter.increment(amount)
+        if self.is_full():
+            self.ready_or_stop.clear()
+            while self.is_full():
+                if self.ready_or_stop.wait(self.wait_timeout):
+                    break
+        return True
+
+    def release(self, amount: int) -> None:
+        self.counter.decrement(amount)
+        if not self.is_full() and not self.ready_or_stop.is_set():
+            self.ready_or_stop.set()
+
+
+def run_uncontended(gate, frames: int, frame_size: int) -> float:
+    start = perf_counter()
+    for _ in range(frames):
+        gate.acquire(frame_size)
+        gate.release(frame_size)
+    return (perf_counter() - start) / frames
+
+
+def run_contended(gate, frames: int, frame_size: int) -> float:
+    queue = deque()
+    available = Condition()
+
+    def consume():
+        for _ in range(frames):
+            with available:
+                while not queue:
+                    available.wait()
+                queue.popleft()
+            gate.release(frame_size)
+
+    consumer = Thread(target=consume)
+    start = perf_counter()
+    consumer.start()
+    for _ in range(frames):
+        gate.acquire(frame_size)
+        with available:
+            queue.append(frame_size)
+            available.notify()
+    consumer.join()
+    return (perf_counter() - start) / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200000, help="frames per case")
+    parser.add_argument("--frame-size", type=int, default=128, help="bytes per frame")
+    args = parser.parse_args()
+
+    # contended buffer fits four frames, so producer regularly waits for consumer
+    cases = (("uncontended", run_uncontended, args.frame_size * 1000),
+             ("contended", run_contended, args.frame_size * 4))
+    for case, run, capacity in cases:
+        for name, gate_class in (("counter+event", CounterEventGate), ("credit gate", CreditGate)):
+            per_frame = run(gate_class(capacity), args.frames, args.frame_size)
+            print(f"{case:>11} {name:>13}: {per_frame * 1000000:7.3f} us/frame")
+
+
+if __name__ == "__main__":
+    main()
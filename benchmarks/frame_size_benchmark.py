@@ -0,0 +1,94 @@
+"""
+Compares fixed and adaptive frame sizing: a bulk download runs in the background while small requests share its
+connection, measuring bulk throughput against small request tail latency.
+Usage: python -m benchmarks.frame_size_benchmark [--duration SECONDS] [--bulk-size BYTES] [--port PORT]
+"""
+import argparse
+import statistics
+from threading import Thread, Event
+from time import perf_counter
+
+from ceptic.client import CepticClient, ClientSettings
+from ceptic.common import CommandType, CepticStatusCode
+from ceptic.endpoint import CommandSettings
+from ceptic.security import SecuritySettings
+from ceptic.server import CepticServer, ServerSettings
+from ceptic.stream import CepticRequest, CepticResponse, Timer
+
+
+def create_server(port: int, bulk_size: int) -> CepticServer:
+    settings = ServerSettings(port=port)
+    server = CepticServer(security=SecuritySettings.server_unsecure(), settings=settings)
+    bulk_body = b"x" * bulk_size
+
+    def bulk_entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=bulk_body)
+
+    def ping_entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=b"pong")
+
+    # fixed frames always use the largest size frame generator allows
+    fixed_size = settings.frame_max_size // 2
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/bulk/fixed", bulk_entry,
+                     CommandSettings.create_with_send_frame_size(fixed_size, fixed_size))
+    server.add_route(CommandType.GET, "/bulk/adaptive", bulk_entry)
+    server.add_route(CommandType.GET, "/ping", ping_entry)
+    return server
+
+
+def run_mode(client: CepticClient, port: int, mode: str, duration: float) -> dict:
+    stop_event = Event()
+    bulk_bytes = [0]
+
+    def run_bulk():
+        while not stop_event.is_set():
+            response = client.connect(CepticRequest(CommandType.GET, f"localhost:{port}/bulk/{mode}"))
+            bulk_bytes[0] += len(response.body)
+
+    bulk_thread = Thread(target=run_bulk, daemon=True)
+    timer = Timer()
+    timer.start()
+    bulk_thread.start()
+    latencies = []
+    while timer.get_time_current() < duration:
+        start = perf_counter()
+        client.connect(CepticRequest(CommandType.GET, f"localhost:{port}/ping"))
+        latencies.append((perf_counter() - start) * 1000)
+    stop_event.set()
+    bulk_thread.join()
+    elapsed = timer.stop()
+    latencies.sort()
+    return {
+        "mode": mode,
+        "bulk_mb_per_s": bulk_bytes[0] / elapsed / 1000000,
+        "ping_count": len(latencies),
+        "ping_p50_ms": statistics.median(latencies),
+        "ping_p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "ping_max_ms": latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds to run each mode")
+    parser.add_argument("--bulk-size", type=int, default=20000000, help="bytes per bulk response")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+
+    server = create_server(args.port, args.bulk_size)
+    server.start()
+    client = CepticClient(settings=ClientSettings(legacy_handshake=False), security=SecuritySettings.client_unsecure())
+    try:
+        for mode in ("fixed", "adaptive"):
+            result = run_mode(client, args.port, mode, args.duration)
+            print(f"{result['mode']:>8}: bulk {result['bulk_mb_per_s']:8.1f} MB/s | "
+                  f"ping p50 {result['ping_p50_ms']:7.2f} ms, p99 {result['ping_p99_ms']:7.2f} ms, "
+                  f"max {result['ping_max_ms']:7.2f} ms ({result['ping_count']} pings)")
+    finally:
+        client.stop()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Throughput and latency suite: runs CepticServer and CepticClient on localhost and measures requests per second and
+p50/p99 latency for tiny requests, echoed bodies of increasing size, echo exchanges, many concurrent streams sharing
+one manager and requests spread over many managers. Every scenario runs in unsecure and secure mode and with each
+encoding. Results are printed and written as JSON; when a baseline JSON from an earlier run is given, scenarios whose
+requests per second dropped by more than the tolerance are reported and the exit code is 1.
+Usage: python -m benchmarks.suite [--output PATH] [--baseline PATH] [--tolerance FRACTION] [--requests COUNT]
+                                  [--body-sizes BYTES,...] [--streams COUNT] [--managers COUNT]
+                                  [--modes unsecure,secure] [--encodings none,gzip,base64] [--scenarios NAME,...]
+                                  [--port PORT]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, time
+
+from ceptic.client import CepticClient, ClientSettings
+from ceptic.common import CommandType, CepticStatusCode
+from ceptic.encode import EncodeGetter
+from ceptic.security import SecuritySettings
+from ceptic.server import CepticServer, ServerSettings
+from ceptic.stream import CepticRequest, CepticResponse, StreamException
+
+CERTS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "tests")
+SERVER_CERTS = os.path.join(CERTS_DIR, "server_certs")
+CLIENT_CERTS = os.path.join(CERTS_DIR, "client_certs")
+
+SCENARIOS = ("tiny", "body", "exchange", "streams", "managers")
+MODES = ("unsecure", "secure")
+ENCODINGS = tuple(EncodeGetter.encode_dict)
+
+
+def create_security(mode: str, server: bool) -> SecuritySettings:
+    if mode == "unsecure":
+        return SecuritySettings.server_unsecure() if server else SecuritySettings.client_unsecure()
+    if server:
+        return SecuritySettings.server(local_cert=os.path.join(SERVER_CERTS, "cert_server.pem"),
+                                       local_key=os.path.join(SERVER_CERTS, "key_server.pem"))
+    return SecuritySettings.client(remote_cert=os.path.join(CLIENT_CERTS, "cert_server.pem"), verify_remote=False)
+
+
+def create_server(mode: str, port: int) -> CepticServer:
+    server = CepticServer(security=create_security(mode, True), settings=ServerSettings(port=port))
+
+    def echo_entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    def exchange_entry(request: CepticRequest):
+        stream = request.begin_exchange()
+        if not stream:
+            return CepticResponse(CepticStatusCode.UNEXPECTED_END)
+        try:
+            while True:
+                data = stream.read(1000)
+                if not data.is_data():
+                    break
+                stream.send(data.data)
+            return CepticResponse(CepticStatusCode.EXCHANGE_END)
+        except StreamException:
+            return CepticResponse(CepticStatusCode.UNEXPECTED_END)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/echo", echo_entry)
+    server.add_route(CommandType.GET, "/exchange", exchange_entry)
+    return server
+
+
+def create_request(port: int, endpoint: str, encoding: str, body: bytes = None) -> CepticRequest:
+    request = CepticRequest(CommandType.GET, f"localhost:{port}{endpoint}", body=body)
+    request.encoding = encoding
+    return request
+
+
+def percentile(latencies: list[float], fraction: float) -> float:
+    # latencies must already be sorted
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+def summarize(latencies: list[float], elapsed: float, transferred: int = 0) -> dict:
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "requests_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mb_per_s": transferred / elapsed / 1000000,
+    }
+
+
+def run_sequential(client: CepticClient, port: int, encoding: str, count: int, body: bytes = None) -> dict:
+    latencies = []
+    start = perf_counter()
+    for _ in range(count):
+        request_start = perf_counter()
+        response = client.connect(create_request(port, "/echo", encoding, body))
+        latencies.append(perf_counter() - request_start)
+        if response.status != CepticStatusCode.OK:
+            raise RuntimeError(f"request failed with status {response.status}")
+    # body is sent and echoed back
+    return summarize(latencies, perf_counter() - start, 2 * count * len(body or b""))
+
+
+def run_concurrent(client: CepticClient, port: int, encoding: str, count: int, concurrency: int) -> dict:
+    def timed_connect(_):
+        request_start = perf_counter()
+        response = client.connect(create_request(port, "/echo", encoding, b"x" * 100))
+        if response.status != CepticStatusCode.OK:
+            raise RuntimeError(f"request failed with status {response.status}")
+        return perf_counter() - request_start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = perf_counter()
+        latencies = list(executor.map(timed_connect, range(count)))
+        elapsed = perf_counter() - start
+    return summarize(latencies, elapsed, 2 * count * 100)
+
+
+def run_exchange(client: CepticClient, port: int, encoding: str, count: int) -> dict:
+    request = create_request(port, "/exchange", encoding)
+    request.exchange = True
+    response = client.connect(request)
+    if response.status != CepticStatusCode.EXCHANGE_START:
+        raise RuntimeError(f"exchange failed to start with status {response.status}")
+    stream = response.stream
+    chunk = b"x" * 1000
+    latencies = []
+    start = perf_counter()
+    for _ in range(count):
+        exchange_start = perf_counter()
+        stream.send(chunk)
+        data = stream.read(len(chunk) * 2)
+        latencies.append(perf_counter() - exchange_start)
+        if not data.is_data():
+            raise RuntimeError("exchange ended early")
+    elapsed = perf_counter() - start
+    stream.send_response(CepticResponse(CepticStatusCode.OK))
+    stream.read(1000)
+    return summarize(latencies, elapsed, 2 * count * len(chunk))
+
+
+def run_mode(mode: str, port: int, args: argparse.Namespace) -> list[dict]:
+    server = create_server(mode, port)
+    server.start()
+    # server is current, so compact handshake and flow control are used
+    stream_client = CepticClient(settings=ClientSettings(manager_max_count=1, legacy_handshake=False),
+                                 security=create_security(mode, False))
+    manager_client = CepticClient(settings=ClientSettings(manager_min_count=args.managers,
+                                                          manager_max_count=args.managers, legacy_handshake=False),
+                                  security=create_security(mode, False))
+    results = []
+    try:
+        # warm up managers, so that connecting and handshaking are not measured
+        stream_client.connect(create_request(port, "/echo", "none"))
+        manager_client.prewarm(f"localhost:{port}", args.managers)
+        for encoding in args.encodings:
+            cases = []
+            if "tiny" in args.scenarios:
+                cases.append(("tiny", {}, lambda: run_sequential(stream_client, port, encoding, args.requests)))
+            if "body" in args.scenarios:
+                for size in args.body_sizes:
+                    # bound bytes sent per size, so that largest bodies finish in reasonable time
+                    count = max(2, min(args.requests, args.body_budget // size))
+                    cases.append(("body", {"body_size": size},
+                                  lambda size=size, count=count: run_sequential(stream_client, port, encoding, count,
+                                                                                b"x" * size)))
+            if "exchange" in args.scenarios:
+                cases.append(("exchange", {}, lambda: run_exchange(stream_client, port, encoding, args.requests)))
+            if "streams" in args.scenarios:
+                cases.append(("streams", {"concurrency": args.streams},
+                              lambda: run_concurrent(stream_client, port, encoding, args.requests, args.streams)))
+            if "managers" in args.scenarios:
+                cases.append(("managers", {"managers": args.managers, "concurrency": args.streams},
+                              lambda: run_concurrent(manager_client, port, encoding, args.requests, args.streams)))
+            for scenario, params, run in cases:
+                result = {"scenario": scenario, "mode": mode, "encoding": encoding, **params}
+                result.update(run())
+                print_result(result)
+                results.append(result)
+    finally:
+        stream_client.stop()
+        manager_client.stop()
+        server.stop()
+    return results
+
+
+def get_result_key(result: dict) -> str:
+    params = ",".join(f"{name}={result[name]}" for name in ("body_size", "concurrency", "managers") if name in result)
+    return f"{result['scenario']}[{params}]/{result['mode']}/{result['encoding']}"
+
+
+def print_result(result: dict) -> None:
+    print(f"{get_result_key(result):>50}: {result['requests_per_s']:9.1f} req/s, "
+          f"p50 {result['p50_ms']:8.2f} ms, p99 {result['p99_ms']:8.2f} ms, {result['mb_per_s']:8.1f} MB/s")
+
+
+def find_regressions(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    baseline_rates = {get_result_key(result): result["requests_per_s"] for result in baseline}
+    regressions = []
+    for result in results:
+        key = get_result_key(result)
+        if key in baseline_rates and result["requests_per_s"] < baseline_rates[key] * (1 - tolerance):
+            regressions.append(f"{key}: {result['requests_per_s']:.1f} req/s, "
+                               f"baseline {baseline_rates[key]:.1f} req/s")
+    return regressions
+
+
+def parse_list(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark_results.json", help="path to write JSON results to")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional drop in req/s")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--body-sizes", type=lambda value: [int(size) for size in parse_list(value)],
+                        default=[1000, 100000, 10000000, 100000000], help="comma-separated body sizes in bytes")
+    parser.add_argument("--body-budget", type=int, default=200000000, help="max bytes to send per body size")
+    parser.add_argument("--streams", type=int, default=32, help="concurrent streams")
+    parser.add_argument("--managers", type=int, default=8, help="managers to spread requests over")
+    parser.add_argument("--modes", type=parse_list, default=list(MODES))
+    parser.add_argument("--encodings", type=parse_list, default=list(ENCODINGS))
+    parser.add_argument("--scenarios", type=parse_list, default=list(SCENARIOS))
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+
+    results = []
+    for index, mode in enumerate(args.modes):
+        results.extend(run_mode(mode, args.port + index, args))
+    with open(args.output, "w") as file:
+        json.dump({
+            "timestamp": time(),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "results": results,
+        }, file, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+from math import inf
+from threading import Lock
+from time import monotonic
+from typing import Union
+
+
+class CoDel(object):
+    """
+    Controlled delay policy for shedding streams, as in CoDel queue management. Delay is how long a stream waited in
+    server's worker queue to start being handled. Server becomes overloaded once no stream of a whole interval started
+    within target, and stays overloaded until an interval has a stream start within target again. While overloaded,
+    any stream that waited longer than target is shed. Otherwise, a stream is only shed if it waited longer than a
+    whole interval, so that short bursts are absorbed.
+    """
+
+    def __init__(self, target: float, interval: float) -> None:
+        self.target = target
+        self.interval = interval
+        self.interval_end = monotonic() + interval
+        # smallest delay seen in current interval
+        self.min_delay = inf
+        self.overloaded = False
+        self.lock = Lock()
+
+    def should_shed(self, delay: float, now: float = None) -> bool:
+        now = monotonic() if now is None else now
+        with self.lock:
+            if delay < self.min_delay:
+                self.min_delay = delay
+            if now >= self.interval_end:
+                self.overloaded = self.min_delay > self.target
+                self.min_delay = inf
+                self.interval_end = now + self.interval
+            return delay > (self.target if self.overloaded else self.interval)
+
+
+class AdmissionController(object):
+    """
+    Server-wide limits on concurrent streams and on bytes of request bodies in flight, along with optional shedding of
+    streams once server is overloaded. A limit of 0 means no limit. Admit methods return reason for rejecting, or None
+    if admitted; each admitted stream and byte count must be released once its request is done.
+    """
+    # reasons streams are rejected for
+    SHED = "shed"
+    STREAM_LIMIT = "stream_limit"
+    BYTE_LIMIT = "byte_limit"
+    REASONS = (SHED, STREAM_LIMIT, BYTE_LIMIT)
+
+    def __init__(self, stream_max_count: int = 0, inflight_bytes_max: int = 0, shed_target: float = 0.0,
+                 shed_interval: float = 0.1) -> None:
+        self.stream_max_count = stream_max_count
+        self.inflight_bytes_max = inflight_bytes_max
+        self.codel: Union[CoDel, None] = CoDel(shed_target, shed_interval) if shed_target > 0 else None
+        self.stream_count = 0
+        self.inflight_bytes = 0
+        self.lock = Lock()
+
+    def admit_stream(self, delay: float) -> Union[str, None]:
+        """
+        :param delay: seconds stream waited between being started by peer and being handled, mostly spent queued for a
+        worker
+        """
+        if self.codel and self.codel.should_shed(delay):
+            return self.SHED
+        with self.lock:
+            if self.stream_max_count and self.stream_count >= self.stream_max_count:
+                return self.STREAM_LIMIT
+            self.stream_count += 1
+        return None
+
+    def release_stream(self) -> None:
+        with self.lock:
+            self.stream_count -= 1
+
+    def admit_bytes(self, length: int) -> Union[str, None]:
+        if not length:
+            return None
+        with self.lock:
+            if self.inflight_bytes_max and self.inflight_bytes + length > self.inflight_bytes_max:
+                return self.BYTE_LIMIT
+            self.inflight_bytes += length
+        return None
+
+    def release_bytes(self, length: int) -> None:
+        if not length:
+            return
+        with self.lock:
+            self.inflight_bytes -= length
+
+    def get_error(self, reason: str) -> str:
+        if reason == self.SHED:
+            return "server is overloaded"
+        if reason == self.STREAM_LIMIT:
+            return f"server stream limit of {self.stream_max_count} reached"
+        return f"server limit of {self.inflight_bytes_max} request bytes in flight reached"
+
+    def get_stats(self) -> dict[str, Union[int, bool]]:
+        return {
+            "streams": self.stream_count,
+            "inflight_bytes": self.inflight_bytes,
+            "overloaded": self.codel is not None and self.codel.overloaded,
+        }
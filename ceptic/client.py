@@ -1,16 +1,25 @@
 import ssl
 import socket
 import uuid
-from typing import Union, List
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Lock, Event, Thread
+from time import perf_counter
+from typing import Union, Iterable, Generator
 from uuid import UUID
 
-from ceptic.common import Constants, SpreadType, CepticException, CepticIOException, CepticStatusCode
+from ceptic.common import Constants, SpreadType, CepticException, CepticIOException, CepticStatusCode, \
+    CepticCapability
+from ceptic.handshake import ClientHandshake, ServerHandshake
 from ceptic.net import SocketCeptic
-from ceptic.security import SecuritySettings
+from ceptic.security import SecuritySettings, get_tls_session_stats
 from ceptic.stream import StreamFrame, StreamHandlerInternal, CepticRequest, CepticResponse, StreamManager, \
     StreamSettings, \
-    StreamException, StreamHandler
+    StreamException, StreamRefusedException, StreamHandlerStoppedException, StreamHandler, SafeCounter, FlowWindow, \
+    Reaper
 from ceptic.interfaces import IRemovableManagers
+from ceptic.log import client_logger
+from ceptic.metrics import CepticMetrics
+from ceptic.tracing import CepticHooks, HookRegistry
 
 
 class ClientSettings(object):
@@ -21,7 +30,17 @@ class ClientSettings(object):
                  body_max: int = 102400000,
                  stream_min_timeout: int = 1, stream_timeout: int = 5,
                  read_buffer_size: int = 102400000, send_buffer_size: int = 102400000,
-                 default_port: int = Constants.DEFAULT_PORT):
+                 default_port: int = Constants.DEFAULT_PORT,
+                 eager_body: bool = False,
+                 async_max_count: int = 64,
+                 manager_min_count: int = 1, manager_max_count: int = 0,
+                 manager_handler_threshold: int = 0,
+                 maintain_delay: float = 1.0,
+                 legacy_handshake: bool = True,
+                 flow_control: bool = True, connection_window_size: int = 0,
+                 compact_frames: bool = True,
+                 trace_ids: bool = False,
+                 goaway: bool = True):
         self._version = version
         self._headers_min_size = headers_min_size
         self._headers_max_size = headers_max_size
@@ -41,6 +60,29 @@ class ClientSettings(object):
         self._send_buffer_size = send_buffer_size
         self._read_buffer_size = read_buffer_size
         self._default_port = default_port
+        self._eager_body = eager_body
+        if async_max_count < 1:
+            raise ValueError("async_max_count must be at least 1; was {}.".format(async_max_count))
+        self._async_max_count = async_max_count
+        if manager_max_count and manager_min_count > manager_max_count:
+            raise ValueError("manager_min_count must not be greater than manager_max_count; were {} and {}.".format(
+                manager_min_count, manager_max_count))
+        self._manager_min_count = manager_min_count
+        self._manager_max_count = manager_max_count
+        self._manager_handler_threshold = manager_handler_threshold
+        self._maintain_delay = maintain_delay
+        # servers that predate compact handshake only understand legacy handshake, so it is used until servers are
+        # known to be upgraded; flow control needs compact handshake, since only it carries windows
+        self._legacy_handshake = legacy_handshake
+        self._flow_control = flow_control
+        if connection_window_size and connection_window_size < frame_max_size:
+            raise ValueError("connection_window_size must be at least frame_max_size ({}); was {}.".format(
+                frame_max_size, connection_window_size))
+        self._connection_window_size = connection_window_size
+        self._compact_frames = compact_frames
+        # send a trace id with requests that do not have one, so that server can correlate them
+        self._trace_ids = trace_ids
+        self._goaway = goaway
 
     @property
     def version(self) -> str:
@@ -86,15 +128,152 @@ class ClientSettings(object):
     def default_port(self) -> int:
         return self._default_port
 
+    @property
+    def eager_body(self) -> bool:
+        return self._eager_body
+
+    @property
+    def capabilities(self) -> CepticCapability:
+        capabilities = CepticCapability.NONE
+        if self._eager_body:
+            capabilities |= CepticCapability.EAGER_BODY
+        if self._flow_control:
+            capabilities |= CepticCapability.FLOW_CONTROL
+        if self._compact_frames:
+            capabilities |= CepticCapability.COMPACT_FRAMES
+        if self._goaway:
+            capabilities |= CepticCapability.GOAWAY
+        return capabilities
+
+    @property
+    def flow_control(self) -> bool:
+        return self._flow_control
+
+    @property
+    def compact_frames(self) -> bool:
+        return self._compact_frames
+
+    @property
+    def trace_ids(self) -> bool:
+        return self._trace_ids
+
+    @property
+    def goaway(self) -> bool:
+        return self._goaway
+
+    @property
+    def stream_window_size(self) -> int:
+        return min(self._read_buffer_size, FlowWindow.MAX_SIZE)
+
+    @property
+    def connection_window_size(self) -> int:
+        # by default, allow a few streams to have full windows in flight at once
+        if self._connection_window_size:
+            return min(self._connection_window_size, FlowWindow.MAX_SIZE)
+        return min(self.stream_window_size * 4, FlowWindow.MAX_SIZE)
+
+    @property
+    def async_max_count(self) -> int:
+        return self._async_max_count
+
+    @property
+    def manager_min_count(self) -> int:
+        return self._manager_min_count
+
+    @property
+    def manager_max_count(self) -> int:
+        return self._manager_max_count
+
+    @property
+    def manager_handler_threshold(self) -> int:
+        return self._manager_handler_threshold
+
+    @property
+    def maintain_delay(self) -> float:
+        return self._maintain_delay
+
+    @property
+    def legacy_handshake(self) -> bool:
+        return self._legacy_handshake
+
+
+class ConnectResult(object):
+    def __init__(self, request: CepticRequest, response: CepticResponse = None, error: BaseException = None) -> None:
+        self.request = request
+        self.response = response
+        self.error = error
+
+    def has_error(self) -> bool:
+        return self.error is not None
+
+
+class ManagerPool(object):
+    """
+    StreamManagers connected to a single destination. Lock is held while choosing or creating a manager.
+    """
+    def __init__(self, destination: str) -> None:
+        self.destination = destination
+        self.managers: dict[UUID, StreamManager] = dict()
+        self.lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self.managers)
+
+    def add(self, manager: StreamManager) -> None:
+        self.managers[manager.manager_id] = manager
+
+    def remove(self, manager_id: UUID) -> Union[StreamManager, None]:
+        return self.managers.pop(manager_id, None)
+
+    def get_active_managers(self) -> list[StreamManager]:
+        """
+        Returns managers that may start new streams; managers going away only finish streams already started.
+        """
+        return [manager for manager in list(self.managers.values())
+                if not manager.is_stopped() and not manager.is_going_away()]
+
+    def get_stopped_managers(self) -> list[StreamManager]:
+        return [manager for manager in list(self.managers.values()) if manager.is_stopped()]
+
+    def get_least_loaded(self) -> Union[StreamManager, None]:
+        """
+        Returns active manager with fewest handlers (ties broken by fewest queued frames) that has not reached
+        its handler limit, or None if there is no such manager.
+        """
+        available = [manager for manager in self.get_active_managers() if not manager.is_handler_limit_reached()]
+        if not available:
+            return None
+        return min(available, key=StreamManager.get_load)
+
 
 class CepticClient(IRemovableManagers):
     def __init__(self, settings: ClientSettings = None, security: SecuritySettings = None):
         super()
         self.managers: dict[UUID, StreamManager] = dict()
-        self.destination_map: dict[str, set[UUID]] = dict()
+        self.destination_map: dict[str, ManagerPool] = dict()
         self.settings = settings if settings else ClientSettings()
         self.security = security if security else SecuritySettings.client()
         self.ssl_context: Union[ssl.SSLContext, None] = None
+        # lock for managers and destination_map
+        self.managers_lock = Lock()
+        # executor for async connections, created on first use
+        self.executor: Union[ThreadPoolExecutor, None] = None
+        self.executor_lock = Lock()
+        # destinations to keep managers open to, and thread that keeps them open; both guarded by maintained_lock
+        self.maintained: dict[str, int] = dict()
+        self.maintain_thread: Union[Thread, None] = None
+        self.maintained_lock = Lock()
+        self.maintain_event = Event()
+        self.should_stop = False
+        # tls sessions to resume per host and port, and tls handshakes done and how many of them were resumed
+        self.tls_sessions: dict[str, ssl.SSLSession] = dict()
+        self.tls_handshake_counter = SafeCounter()
+        self.tls_resumed_counter = SafeCounter()
+        # expires idle handlers and managers, and keeps healthy managers alive
+        self.reaper = Reaper()
+        self.metrics = CepticMetrics(StreamManager.FRAME_TYPE_NAMES)
+        # tracing hooks, shared with managers
+        self.hooks = HookRegistry()
         self.setup_security()
 
     # region Security
@@ -132,6 +311,32 @@ class CepticClient(IRemovableManagers):
     @property
     def secure(self):
         return self.security.secure
+
+    def get_tls_session_stats(self) -> dict[str, Union[int, float]]:
+        return get_tls_session_stats(self.tls_handshake_counter.value, self.tls_resumed_counter.value)
+    # endregion
+
+    # region Stats
+    def get_stats(self, per_manager: bool = False) -> dict:
+        """
+        Returns counters and histograms of all managers, current and removed, along with connection, handshake, request
+        latency per command, and tls stats. Durations are in seconds.
+        :param per_manager: if true, also include stats of each current manager
+        """
+        stats = self.metrics.get_stats(list(self.managers.values()), per_manager)
+        stats["tls"] = self.get_tls_session_stats()
+        return stats
+    # endregion
+
+    # region Hooks
+    def add_hooks(self, hooks: CepticHooks) -> None:
+        """
+        Register hooks to be called on connections, streams, frames and requests of this client.
+        """
+        self.hooks.add(hooks)
+
+    def remove_hooks(self, hooks: CepticHooks) -> bool:
+        return self.hooks.remove(hooks)
     # endregion
 
     # region Connection
@@ -143,43 +348,117 @@ class CepticClient(IRemovableManagers):
 
         manager: StreamManager
         handler: StreamHandlerInternal
-        # if normal, check if a manager is available for destination
-        if spread == SpreadType.NORMAL:
-            manager = self.get_available_manager_for_destination(destination)
-            if manager:
+        # a stream refused by a server going away was not processed, so it is retried once on another manager
+        for attempt in range(2):
+            # if normal, check if a manager is available for destination, otherwise create one;
+            # hold pool's lock so concurrent connects don't each create a new manager
+            if spread == SpreadType.NORMAL:
+                pool = self.get_pool(destination)
+                with pool.lock:
+                    manager = self.get_available_manager_for_destination(destination)
+                    if not manager:
+                        manager = self.create_new_manager(request.host, request.port, destination)
+                    handler = manager.create_handler()
+            # else if standalone, make stored destination be random UUID to avoid reuse
+            else:
+                # create new manager
+                manager = self.create_new_manager(request.host, request.port, destination + str(uuid.uuid4()))
                 handler = manager.create_handler()
-                # connect to server with this handler, returning CepticResponse
+            # connect to server with this handler, returning CepticResponse
+            try:
                 return self.connect_with_handler(handler, request)
-        # else if standalone, make stored destination be random UUID to avoid reuse
-        else:
-            destination += str(uuid.uuid4())
-        # create new manager
-        manager = self.create_new_manager(request, destination)
-        handler = manager.create_handler()
-        # connect to server with this handler, returning CepticResponse
-        return self.connect_with_handler(handler, request)
+            except StreamRefusedException:
+                if attempt:
+                    raise
+                # if server did not send GOAWAY, make sure manager is not chosen again
+                manager.handle_peer_going_away()
 
     def connect_standalone(self, request: CepticRequest) -> CepticResponse:
         return self.connect(request, spread=SpreadType.STANDALONE)
 
+    def connect_async(self, request: CepticRequest, spread: SpreadType = SpreadType.NORMAL) -> Future:
+        """
+        Connect on a worker thread, returning a Future that resolves to the CepticResponse.
+        At most async_max_count setting connections are run at once; the rest wait their turn.
+        """
+        return self.get_executor().submit(self.connect, request, spread)
+
+    def connect_many(self, requests: Iterable[CepticRequest], spread: SpreadType = SpreadType.NORMAL,
+                     max_concurrency: int = 0) -> Generator[ConnectResult, None, None]:
+        """
+        Connect all requests concurrently, yielding a ConnectResult for each one as it completes.
+        Requests to the same destination share that destination's managers.
+        :param requests: requests to connect; consumed lazily as earlier requests complete
+        :param spread: SpreadType to use for every request
+        :param max_concurrency: max requests in flight at once (uses async_max_count setting by default)
+        """
+        if max_concurrency <= 0:
+            max_concurrency = self.settings.async_max_count
+        request_iter = iter(requests)
+        pending: dict[Future, CepticRequest] = dict()
+        # fill up to max concurrency, then submit next request whenever one completes
+        for request in request_iter:
+            pending[self.connect_async(request, spread)] = request
+            if len(pending) >= max_concurrency:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                request = pending.pop(future)
+                next_request = next(request_iter, None)
+                if next_request is not None:
+                    pending[self.connect_async(next_request, spread)] = next_request
+                error = future.exception()
+                if error:
+                    yield ConnectResult(request, error=error)
+                else:
+                    yield ConnectResult(request, response=future.result())
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        with self.executor_lock:
+            if not self.executor:
+                self.executor = ThreadPoolExecutor(max_workers=self.settings.async_max_count,
+                                                   thread_name_prefix="CepticClient")
+            return self.executor
+
     def connect_with_handler(self, stream: StreamHandlerInternal, request: CepticRequest) -> CepticResponse:
+        # unless stream is kept open for an exchange, handler can be reused once this returns
+        keep_stream = False
+        # latency is kept per command only; endpoints requested by a client are unbounded
+        start = perf_counter()
+        response: Union[CepticResponse, None] = None
+        if request.trace_id is None and self.settings.trace_ids:
+            request.trace_id = uuid.uuid4().hex
+        if self.hooks.request_start:
+            self.hooks.call(self.hooks.request_start, request)
         try:
+            # set stream priority, based on request header; server does the same for its side of stream
+            if request.priority is not None:
+                stream.set_priority(request.priority)
             # create frames from request and send
             stream.send_request(request)
-            # wait for response
-            data = stream.read(max_length=stream.settings.frame_max_size)
-            if not data.is_response():
-                raise StreamException("No CepticResponse found in response")
-            response = data.response
-            # if not success status code, close stream and return response
-            if not CepticStatusCode.is_success(response.status):
-                stream.send_close()
-                return response
+            # if eager body was negotiated, server does not send a response between header and body
+            if not stream.settings.eager_body:
+                # wait for response
+                data = stream.read(max_length=stream.settings.frame_max_size)
+                if not data.is_response():
+                    raise StreamException("No CepticResponse found in response")
+                response = data.response
+                # if not success status code, close stream and return response
+                if not CepticStatusCode.is_success(response.status):
+                    stream.send_close()
+                    return response
             # set stream encoding based on request header
             stream.set_encode(request.encoding)
             # send body if content length header is present and greater than 0
             if request.content_length:
-                stream.send(request.body)
+                try:
+                    stream.send(request.body)
+                except StreamHandlerStoppedException:
+                    # with eager body, server may reject request and close stream before whole body is sent;
+                    # response it sent before closing is still queued, so read it below
+                    if not stream.settings.eager_body:
+                        raise
             # get response
             data = stream.read(stream.settings.frame_max_size)
             if not data.is_response():
@@ -196,40 +475,142 @@ class CepticClient(IRemovableManagers):
             # close stream if no Exchange header on response
             if not response.exchange or not request.exchange:
                 stream.send_close()
+            else:
+                keep_stream = True
             return response
-        except CepticException as e:
+        except CepticException:
             stream.send_close()
             raise
-        except Exception as e:
-            raise
+        finally:
+            duration = perf_counter() - start
+            self.metrics.observe_request(request.command, duration)
+            if self.hooks.request_end:
+                self.hooks.call(self.hooks.request_end, request, response, duration)
+            if not keep_stream:
+                stream.manager.release_handler(stream)
 
     def handle_new_connection(self, handler: StreamHandlerInternal) -> None:
         raise NotImplementedError
+
     # endregion
 
     # region Stop
     def stop(self):
+        self.should_stop = True
+        self.maintain_event.set()
+        self.reaper.stop()
+        with self.executor_lock:
+            if self.executor:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
         self.remove_all_managers()
     # endregion
 
     # region Managers
-    def create_new_manager(self, request: CepticRequest, destination: str) -> StreamManager:
+    def prewarm(self, destination: str, count: int = 0) -> list[StreamManager]:
+        """
+        Open managers to destination until it has at least count active managers, so that later connects do not
+        pay for connecting and handshaking. Returns newly created managers.
+        :param destination: host with optional port, i.e. "localhost:9000"
+        :param count: active managers to have (uses manager_min_count setting by default)
+        """
+        host, port = self.split_destination(destination)
+        destination = f"{host}:{port}"
+        if count <= 0:
+            count = self.settings.manager_min_count
+        if self.settings.manager_max_count:
+            count = min(count, self.settings.manager_max_count)
+        created = []
+        pool = self.get_pool(destination)
+        with pool.lock:
+            self.remove_stopped_managers(pool)
+            while len(pool.get_active_managers()) < count:
+                created.append(self.create_new_manager(host, port, destination))
+        return created
+
+    def maintain(self, destination: str, count: int = 0) -> None:
+        """
+        Keep count active managers open to destination in the background, reconnecting whenever a manager stops.
+        Does not block; managers are opened by the maintainer thread.
+        :param destination: host with optional port, i.e. "localhost:9000"
+        :param count: active managers to keep (uses manager_min_count setting by default)
+        """
+        host, port = self.split_destination(destination)
+        with self.maintained_lock:
+            self.maintained[f"{host}:{port}"] = count
+            if not self.maintain_thread:
+                self.maintain_thread = Thread(target=self.run_maintainer)
+                self.maintain_thread.daemon = True
+                self.maintain_thread.start()
+        self.maintain_event.set()
+
+    def unmaintain(self, destination: str) -> None:
+        """
+        Stop keeping managers open to destination; already open managers are left as they are.
+        """
+        host, port = self.split_destination(destination)
+        with self.maintained_lock:
+            self.maintained.pop(f"{host}:{port}", None)
+
+    def run_maintainer(self) -> None:
+        while not self.should_stop:
+            self.maintain_event.clear()
+            with self.maintained_lock:
+                maintained = list(self.maintained.items())
+            for destination, count in maintained:
+                if self.should_stop:
+                    break
+                try:
+                    self.prewarm(destination, count)
+                except Exception:
+                    # destination may be temporarily unreachable; try again next time
+                    continue
+            # wait until next check, or until a manager stops or a destination is added
+            self.maintain_event.wait(self.settings.maintain_delay)
+
+    def handle_stopped_manager(self, manager: StreamManager) -> None:
+        # stopped managers are forgotten right away, so that dead connections hold no handlers or buffers
+        self.forget_manager(manager)
+        # wake maintainer so that maintained destinations are reconnected right away
+        if self.is_maintained(manager.destination):
+            self.maintain_event.set()
+
+    def handle_going_away_manager(self, manager: StreamManager) -> None:
+        # manager no longer counts as active, so maintainer should replace it right away
+        if self.is_maintained(manager.destination):
+            self.maintain_event.set()
+
+    def is_maintained(self, destination: str) -> bool:
+        with self.maintained_lock:
+            return destination in self.maintained
+
+    def create_new_manager(self, host: str, port: int, destination: str) -> StreamManager:
+        # handshake time includes connecting
+        start = perf_counter()
         try:
             raw_s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             raw_s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             raw_s.settimeout(5)  # TODO: set all timeouts to match settings
             # s.setblocking(True)
             try:
-                raw_s.connect((request.host, request.port))
+                raw_s.connect((host, port))
             except Exception:
                 raw_s.close()
                 raise
             # connect the socket to the remote endpoint
             try:
                 s: Union[SocketCeptic, None] = None
+                ssl_s: Union[ssl.SSLSocket, None] = None
                 if self.security.secure:
                     try:
-                        ssl_s: ssl.SSLSocket = self.ssl_context.wrap_socket(raw_s, server_side=False)
+                        # attempt to resume previous session with same host and port, if there is one
+                        session = self.tls_sessions.get(f"{host}:{port}") if self.security.session_resumption \
+                            else None
+                        ssl_s = self.ssl_context.wrap_socket(raw_s, server_side=False, server_hostname=host,
+                                                             session=session)
+                        self.tls_handshake_counter.increment()
+                        if ssl_s.session_reused:
+                            self.tls_resumed_counter.increment()
                         # wrap as SocketCeptic
                         s = SocketCeptic(ssl_s)
                     except ssl.SSLError as e:
@@ -238,51 +619,46 @@ class CepticClient(IRemovableManagers):
                     # wrap as SocketCeptic
                     s = SocketCeptic(raw_s)
 
-                # send version
-                s.send_raw_str(f"{self.settings.version:>16}")
-                # send frame min size
-                s.send_raw_str(f"{self.settings.frame_min_size:>16}")
-                # send frame max size
-                s.send_raw_str(f"{self.settings.frame_max_size:>16}")
-                # send headers min size
-                s.send_raw_str(f"{self.settings.headers_min_size:>16}")
-                # send headers max size
-                s.send_raw_str(f"{self.settings.headers_max_size:>16}")
-                # send stream min timeout
-                s.send_raw_str(f"{self.settings.stream_min_timeout:>4}")
-                # send stream timeout
-                s.send_raw_str(f"{self.settings.stream_timeout:>4}")
-                # get response
-                response = s.recv_raw_str(1)
-                # if not positive, get additional info and raise exception
-                if response != 'y':
-                    error_string = s.recv_str(1024)
-                    raise CepticIOException(f"Client settings not compatible with server settings: {error_string}")
-                # otherwise receive decided values
-                server_frame_max_size_str = s.recv_raw_str(16).strip()
-                server_header_max_size_str = s.recv_raw_str(16).strip()
-                server_stream_timeout_str = s.recv_raw_str(4).strip()
-                server_handler_max_count_str = s.recv_raw_str(4).strip()
-
-                # attempt to convert to integers
-                frame_max_size: int
-                headers_max_size: int
-                stream_timeout: int
-                handler_max_count: int
-                try:
-                    frame_max_size = int(server_frame_max_size_str)
-                    headers_max_size = int(server_header_max_size_str)
-                    stream_timeout = int(server_stream_timeout_str)
-                    handler_max_count = int(server_handler_max_count_str)
-                except ValueError:
-                    raise CepticIOException(f"Server's values were not all integers, could not proceed: "
-                                            f"{server_frame_max_size_str},{server_header_max_size_str},"
-                                            f"{server_stream_timeout_str},{server_handler_max_count_str}")
+                # send all settings at once and get server's decided values
+                handshake = ClientHandshake(self.settings.version,
+                                            self.settings.frame_min_size, self.settings.frame_max_size,
+                                            self.settings.headers_min_size, self.settings.headers_max_size,
+                                            self.settings.stream_min_timeout, self.settings.stream_timeout,
+                                            self.settings.capabilities, self.settings.stream_window_size,
+                                            self.settings.connection_window_size)
+                if self.settings.legacy_handshake:
+                    # flow control needs windows, which only compact handshake carries
+                    handshake.capabilities &= ~CepticCapability.FLOW_CONTROL
+                    s.send_raw(handshake.to_legacy_bytes())
+                    response = ServerHandshake.from_legacy_socket(s)
+                else:
+                    s.send_raw(handshake.to_bytes())
+                    response = ServerHandshake.from_socket(s)
+                # if not positive, raise exception with server's explanation
+                if not response.accepted:
+                    raise CepticIOException(f"Client settings not compatible with server settings: {response.error}")
+                frame_max_size = response.frame_max_size
+                headers_max_size = response.headers_max_size
+                stream_timeout = response.stream_timeout
+                handler_max_count = response.handler_max_count
+                capabilities = response.capabilities
+                # server should never choose capabilities that client did not request
+                if capabilities & ~handshake.capabilities:
+                    raise CepticIOException(f"Server chose capabilities ({int(capabilities)}) that client did not "
+                                            f"request ({int(handshake.capabilities)})")
+                if CepticCapability.FLOW_CONTROL in capabilities and \
+                        min(response.stream_window_size, response.connection_window_size) < frame_max_size:
+                    raise CepticIOException(f"Server chose flow control windows ({response.stream_window_size},"
+                                            f"{response.connection_window_size}) smaller than frameMaxSize "
+                                            f"({frame_max_size})")
 
                 # verify server's chosen values are valid for client
                 # TODO: expand checks to check lower bounds
                 stream_settings = StreamSettings(self.settings.send_buffer_size, self.settings.read_buffer_size,
-                                                 frame_max_size, headers_max_size, stream_timeout, handler_max_count)
+                                                 frame_max_size, headers_max_size, stream_timeout, handler_max_count,
+                                                 capabilities, self.settings.stream_window_size,
+                                                 self.settings.connection_window_size, response.stream_window_size,
+                                                 response.connection_window_size)
                 if stream_settings.frame_max_size > self.settings.frame_max_size:
                     raise CepticIOException(f"Server chose frameMaxSize ({stream_settings.frame_max_size}) "
                                             f"higher than client's ({self.settings.frame_max_size})")
@@ -292,60 +668,107 @@ class CepticClient(IRemovableManagers):
                 if stream_settings.stream_timeout > self.settings.stream_timeout:
                     raise CepticIOException(f"Server chose streamTimeout ({stream_settings.stream_timeout}) "
                                             f"higher than client's ({self.settings.stream_timeout})")
+                # handshake complete; remove connect timeout so idle managers are not stopped by socket timeouts
+                s.settimeout(None)
+                # store tls session for later resumption; with TLS 1.3, server has sent its session tickets by now
+                if ssl_s and self.security.session_resumption and ssl_s.session:
+                    self.tls_sessions[f"{host}:{port}"] = ssl_s.session
                 # create manager
-                manager = StreamManager(s, uuid.uuid4(), destination, stream_settings, self, is_server=False)
+                manager = StreamManager(s, uuid.uuid4(), destination, stream_settings, self, is_server=False,
+                                        hooks=self.hooks)
                 # add and start manager
                 self.add_manager(manager)
+                duration = perf_counter() - start
+                # call hooks before manager starts, so that they come before any of its streams
+                if self.hooks.handshake_done:
+                    self.hooks.call(self.hooks.handshake_done, manager, duration)
                 manager.start()
+                self.metrics.connections_opened.increment()
+                self.metrics.handshake_time.observe(duration)
+                client_logger.debug("connected to %s as manager %s", destination, manager.manager_id)
                 return manager
             except Exception:
                 raw_s.close()
                 raise
-        except Exception:
+        except Exception as e:
+            self.metrics.connections_rejected.increment()
+            client_logger.debug("could not connect to %s: %s: %s", destination, type(e).__name__, e)
             raise
 
     def add_manager(self, manager: StreamManager) -> None:
-        manager_set = self.destination_map.get(manager.destination)
-        # if manager set already exists for this destination, add manager to that set
-        if manager_set:
-            manager_set.add(manager.manager_id)
-        # otherwise create new set and add to destination map
-        else:
-            manager_set = set()
-            manager_set.add(manager.manager_id)
-            self.destination_map[manager.destination] = manager_set
-        # add manager to dict
-        self.managers[manager.manager_id] = manager
+        with self.managers_lock:
+            # add manager to pool for its destination, creating pool if needed
+            pool = self.destination_map.get(manager.destination)
+            if pool is None:
+                pool = ManagerPool(manager.destination)
+                self.destination_map[manager.destination] = pool
+            pool.add(manager)
+            # add manager to dict
+            self.managers[manager.manager_id] = manager
+        self.reaper.add_manager(manager)
 
     def get_manager(self, manager_id: UUID) -> Union[StreamManager, None]:
         return self.managers.get(manager_id)
 
+    def get_pool(self, destination: str) -> ManagerPool:
+        with self.managers_lock:
+            pool = self.destination_map.get(destination)
+            if pool is None:
+                pool = ManagerPool(destination)
+                self.destination_map[destination] = pool
+            return pool
+
     def get_available_manager_for_destination(self, destination: str) -> Union[StreamManager, None]:
-        manager_set = self.destination_map.get(destination)
-        # if manager set exists, try to get first manager that isn't saturated with handlers
-        if manager_set:
-            for manager_id in manager_set:
-                manager = self.get_manager(manager_id)
-                if manager and not manager.is_stopped() and not manager.is_handler_limit_reached():
-                    return manager
-        # otherwise return None
-        return None
+        """
+        Returns least loaded manager for destination, or None if a new manager should be created instead.
+        A new manager is preferred while there are fewer than manager_min_count active managers, or when the least
+        loaded manager has reached manager_handler_threshold handlers, as long as manager_max_count is not reached.
+        Raises CepticException if manager_max_count is reached and every manager has reached its handler limit.
+        """
+        pool = self.get_pool(destination)
+        self.remove_stopped_managers(pool)
+        active_count = len(pool.get_active_managers())
+        can_grow = not self.settings.manager_max_count or active_count < self.settings.manager_max_count
+        if can_grow and active_count < self.settings.manager_min_count:
+            return None
+        manager = pool.get_least_loaded()
+        if not manager:
+            if can_grow:
+                return None
+            raise CepticException(f"All {active_count} managers for destination {destination} have reached their "
+                                  f"handler limit")
+        threshold = self.settings.manager_handler_threshold
+        if can_grow and threshold and manager.get_handler_count() >= threshold:
+            return None
+        return manager
+
+    def remove_stopped_managers(self, pool: ManagerPool) -> list[StreamManager]:
+        return [self.remove_manager(manager.manager_id) for manager in pool.get_stopped_managers()]
 
     def remove_manager(self, manager_id: UUID) -> Union[StreamManager, None]:
-        # remove manager from managers dict
-        try:
-            manager = self.managers.pop(manager_id)
-            manager.stop("removed by CepticClient")
-            # remove manager from manager set in destination map
-            manager_set = self.destination_map.get(manager.destination)
-            if manager_set:
-                try:
-                    manager_set.remove(manager.manager_id)
-                except KeyError:
-                    pass
-            return manager
-        except KeyError:
+        # stop manager and remove it from managers dict
+        manager = self.managers.get(manager_id)
+        if manager is None:
             return None
+        manager.stop("removed by CepticClient")
+        self.forget_manager(manager)
+        return manager
+
+    def forget_manager(self, manager: StreamManager) -> None:
+        # whichever of stopping and removing pops manager first retires it, so that it is only counted once
+        with self.managers_lock:
+            if self.managers.pop(manager.manager_id, None) is None:
+                return
+            # remove manager from its destination's pool; empty pools are dropped, since standalone managers each
+            # have a destination of their own. A pool being chosen from keeps its lock held, so it is left alone
+            pool = self.destination_map.get(manager.destination)
+            if pool is not None:
+                pool.remove(manager.manager_id)
+                if not pool and not pool.lock.locked():
+                    self.destination_map.pop(manager.destination, None)
+        self.reaper.remove_manager(manager)
+        self.metrics.retire(manager.metrics)
+        client_logger.debug("removed manager %s to %s", manager.manager_id, manager.destination)
 
     def remove_all_managers(self) -> list[StreamManager]:
         removed_managers = []
@@ -354,3 +777,15 @@ class CepticClient(IRemovableManagers):
             removed_managers.append(self.remove_manager(manager_id))
         return removed_managers
     # endregion
+
+    # region Helpers
+    def split_destination(self, destination: str) -> tuple[str, int]:
+        host, has_port, port_str = destination.partition(":")
+        if not has_port:
+            return host, self.settings.default_port
+        try:
+            return host, int(port_str)
+        except ValueError as e:
+            raise CepticException(f"Port must be an integer, not {port_str}.") from e
+
+    # endregion
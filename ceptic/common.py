@@ -1,4 +1,4 @@
-from enum import Enum, IntEnum
+from enum import Enum, IntEnum, IntFlag
 from typing import Union, List
 
 
@@ -57,6 +57,7 @@ class CepticStatusCode(IntEnum):
     UNEXPECTED_END = 460
     MISSING_EXCHANGE = 461
     INTERNAL_SERVER_ERROR = 500
+    SERVICE_UNAVAILABLE = 503
 
     @staticmethod
     def is_success(status_code: int) -> bool:
@@ -83,6 +84,19 @@ class HeaderType(object):
     EXCHANGE = "Exchange"
     FILES = "Files"
     ERRORS = "Errors"
+    PRIORITY = "Priority"
+    TRACE_ID = "Trace-Id"
+
+
+class CepticCapability(IntFlag):
+    """
+    Contains optional protocol features that are negotiated during the settings handshake.
+    """
+    NONE = 0
+    EAGER_BODY = 1
+    FLOW_CONTROL = 2
+    COMPACT_FRAMES = 4
+    GOAWAY = 8
 
 
 class SpreadType(Enum):
@@ -172,3 +186,23 @@ class CepticHeaders(object):
     def files(self, value: Union[List, None]) -> None:
         self.headers[HeaderType.FILES] = value
     # endregion
+
+    # region Priority
+    @property
+    def priority(self) -> Union[int, None]:
+        return self.headers.get(HeaderType.PRIORITY)
+
+    @priority.setter
+    def priority(self, value: Union[int, None]) -> None:
+        self.headers[HeaderType.PRIORITY] = value
+    # endregion
+
+    # region Trace Id
+    @property
+    def trace_id(self) -> Union[str, None]:
+        return self.headers.get(HeaderType.TRACE_ID)
+
+    @trace_id.setter
+    def trace_id(self, value: Union[str, None]) -> None:
+        self.headers[HeaderType.TRACE_ID] = value
+    # endregion
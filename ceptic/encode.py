@@ -5,7 +5,7 @@ from abc import ABC
 from ceptic.common import CepticException
 from gzip import GzipFile
 
-from typing import List, Type
+from typing import Type
 
 
 class EncoderException(CepticException):
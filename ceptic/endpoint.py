@@ -1,8 +1,9 @@
 import re
 from typing import Union, List, Callable
 
-from ceptic.common import CepticException, Constants
-from ceptic.stream import CepticRequest, CepticResponse, StreamFrame
+from ceptic.common import CepticException, Constants, CepticCapability
+from ceptic.log import endpoint_logger
+from ceptic.stream import CepticRequest, CepticResponse, StreamFrame, FlowWindow
 
 EndpointEntry = Callable[[CepticRequest], CepticResponse]
 
@@ -33,7 +34,16 @@ class ServerSettings(object):
                  handler_max_count: int = 0,
                  request_queue_size: int = 10,
                  verbose: bool = False,
-                 daemon: bool = False):
+                 daemon: bool = False,
+                 eager_body: bool = True,
+                 handshake_timeout: float = 5.0, handshake_max_count: int = 64,
+                 flow_control: bool = True, connection_window_size: int = 0,
+                 compact_frames: bool = True, goaway: bool = True,
+                 metrics_port: int = -1, metrics_host: str = "",
+                 trace_ids: bool = False,
+                 profile_sample_rate: float = 0.0, profile_cprofile: bool = False,
+                 connection_max_count: int = 0, stream_max_count: int = 0, inflight_bytes_max: int = 0,
+                 shed_target: float = 0.0, shed_interval: float = 0.1, worker_max_count: int = 0):
         self._port = port
         self._version = version
         self._headers_min_size = headers_min_size
@@ -57,6 +67,46 @@ class ServerSettings(object):
         self._request_queue_size = request_queue_size
         self._verbose = verbose
         self._daemon = daemon
+        self._eager_body = eager_body
+        self._handshake_timeout = handshake_timeout
+        if handshake_max_count < 1:
+            raise ValueError("handshake_max_count must be at least 1; was {}.".format(handshake_max_count))
+        self._handshake_max_count = handshake_max_count
+        self._flow_control = flow_control
+        if connection_window_size and connection_window_size < frame_max_size:
+            raise ValueError("connection_window_size must be at least frame_max_size ({}); was {}.".format(
+                frame_max_size, connection_window_size))
+        self._connection_window_size = connection_window_size
+        self._compact_frames = compact_frames
+        self._goaway = goaway
+        self._metrics_port = metrics_port
+        self._metrics_host = metrics_host
+        # give requests without a trace id one, so that hooks can always correlate them
+        self._trace_ids = trace_ids
+        # fraction of requests to profile; profiling can also be changed while server is running
+        if not 0.0 <= profile_sample_rate <= 1.0:
+            raise ValueError("profile_sample_rate must be between 0.0 and 1.0; was {}.".format(profile_sample_rate))
+        self._profile_sample_rate = profile_sample_rate
+        self._profile_cprofile = profile_cprofile
+        # server-wide limits, 0 for no limit; streams over a limit get SERVICE_UNAVAILABLE
+        self._connection_max_count = connection_max_count
+        self._stream_max_count = stream_max_count
+        self._inflight_bytes_max = inflight_bytes_max
+        # streams are handled by a pool of worker_max_count threads, waiting in its queue while all are busy; 0 starts a
+        # thread per stream
+        if worker_max_count < 0:
+            raise ValueError("worker_max_count must not be negative; was {}.".format(worker_max_count))
+        self._worker_max_count = worker_max_count
+        # streams are shed once they wait in worker queue longer than shed_target for a whole shed_interval; 0.0
+        # disables. Without a worker pool streams never queue, so shedding needs one
+        if shed_target < 0 or shed_interval <= 0:
+            raise ValueError("shed_target must not be negative and shed_interval must be positive; "
+                             "were {} and {}.".format(shed_target, shed_interval))
+        if shed_target and not worker_max_count:
+            raise ValueError("shed_target requires worker_max_count to be set, since streams only wait to be handled "
+                             "in worker queue.")
+        self._shed_target = shed_target
+        self._shed_interval = shed_interval
 
     @property
     def port(self) -> int:
@@ -118,25 +168,144 @@ class ServerSettings(object):
     def daemon(self) -> bool:
         return self._daemon
 
+    @property
+    def eager_body(self) -> bool:
+        return self._eager_body
+
+    @property
+    def handshake_timeout(self) -> float:
+        return self._handshake_timeout
+
+    @property
+    def handshake_max_count(self) -> int:
+        return self._handshake_max_count
+
+    @property
+    def capabilities(self) -> CepticCapability:
+        capabilities = CepticCapability.NONE
+        if self._eager_body:
+            capabilities |= CepticCapability.EAGER_BODY
+        if self._flow_control:
+            capabilities |= CepticCapability.FLOW_CONTROL
+        if self._compact_frames:
+            capabilities |= CepticCapability.COMPACT_FRAMES
+        if self._goaway:
+            capabilities |= CepticCapability.GOAWAY
+        return capabilities
+
+    @property
+    def flow_control(self) -> bool:
+        return self._flow_control
+
+    @property
+    def compact_frames(self) -> bool:
+        return self._compact_frames
+
+    @property
+    def goaway(self) -> bool:
+        return self._goaway
+
+    @property
+    def metrics_port(self) -> int:
+        """
+        Port to serve OpenMetrics text on, at /metrics; negative to not serve metrics, 0 to pick any free port.
+        """
+        return self._metrics_port
+
+    @property
+    def metrics_host(self) -> str:
+        return self._metrics_host
+
+    @property
+    def trace_ids(self) -> bool:
+        return self._trace_ids
+
+    @property
+    def profile_sample_rate(self) -> float:
+        return self._profile_sample_rate
+
+    @property
+    def profile_cprofile(self) -> bool:
+        return self._profile_cprofile
+
+    @property
+    def connection_max_count(self) -> int:
+        """
+        Connections open or in handshake, server-wide; further connections are closed right after being accepted.
+        """
+        return self._connection_max_count
+
+    @property
+    def stream_max_count(self) -> int:
+        """
+        Streams being handled, across all connections.
+        """
+        return self._stream_max_count
+
+    @property
+    def inflight_bytes_max(self) -> int:
+        """
+        Sum of Content-Length of requests being handled, across all connections.
+        """
+        return self._inflight_bytes_max
+
+    @property
+    def shed_target(self) -> float:
+        return self._shed_target
+
+    @property
+    def shed_interval(self) -> float:
+        return self._shed_interval
+
+    @property
+    def worker_max_count(self) -> int:
+        """
+        Threads handling streams, across all connections; further streams wait in queue until a thread is free.
+        """
+        return self._worker_max_count
+
+    @property
+    def stream_window_size(self) -> int:
+        return min(self._read_buffer_size, FlowWindow.MAX_SIZE)
+
+    @property
+    def connection_window_size(self) -> int:
+        # by default, allow a few streams to have full windows in flight at once
+        if self._connection_window_size:
+            return min(self._connection_window_size, FlowWindow.MAX_SIZE)
+        return min(self.stream_window_size * 4, FlowWindow.MAX_SIZE)
+
 
 class CommandSettings(object):
-    def __init__(self, body_max: int, time_max: int) -> None:
+    def __init__(self, body_max: int, time_max: int,
+                 send_frame_min_size: int = -1, send_frame_max_size: int = -1) -> None:
         self.body_max = body_max
         self.time_max = time_max
+        # bounds for size of frames sent by endpoint; frames shrink toward min while other streams are waiting to send
+        self.send_frame_min_size = send_frame_min_size
+        self.send_frame_max_size = send_frame_max_size
 
     def copy(self) -> 'CommandSettings':
-        return CommandSettings(self.body_max, self.time_max)
+        return CommandSettings(self.body_max, self.time_max, self.send_frame_min_size, self.send_frame_max_size)
 
     @staticmethod
     def combine(initial: 'CommandSettings', updates: 'CommandSettings') -> 'CommandSettings':
         body_max = updates.body_max if updates.body_max >= 0 else initial.body_max
         time_max = updates.time_max if updates.time_max >= 0 else initial.time_max
-        return CommandSettings(body_max, time_max)
+        send_frame_min_size = updates.send_frame_min_size if updates.send_frame_min_size >= 0 \
+            else initial.send_frame_min_size
+        send_frame_max_size = updates.send_frame_max_size if updates.send_frame_max_size >= 0 \
+            else initial.send_frame_max_size
+        return CommandSettings(body_max, time_max, send_frame_min_size, send_frame_max_size)
 
     @staticmethod
     def create_with_body_max(body_max: int) -> 'CommandSettings':
         return CommandSettings(body_max, -1)
 
+    @staticmethod
+    def create_with_send_frame_size(send_frame_min_size: int, send_frame_max_size: int) -> 'CommandSettings':
+        return CommandSettings(-1, -1, send_frame_min_size, send_frame_max_size)
+
 
 class CommandEntry(object):
 
@@ -173,7 +342,9 @@ class CommandEntry(object):
         settings_to_use = CommandSettings.combine(self.settings, endpoint_settings) if endpoint_settings \
             else self.settings
         # put pattern into endpoint map
-        self.endpoint_map[endpoint_pattern] = EndpointSaved(entry, endpoint_pattern.variables, settings_to_use)
+        self.endpoint_map[endpoint_pattern] = EndpointSaved(entry, endpoint_pattern.variables, settings_to_use,
+                                                            endpoint)
+        endpoint_logger.debug("added endpoint %s %s", self.command, endpoint)
 
     def get_endpoint(self, endpoint: str) -> 'EndpointValue':
         # separate query string from endpoint
@@ -214,7 +385,7 @@ class CommandEntry(object):
             values[variable_name] = match.group(index)
             index += 1
         return EndpointValue(match_endpoint_saved.entry, values, parsed.queryparams, parsed.querystring,
-                             match_endpoint_saved.settings)
+                             match_endpoint_saved.settings, match_endpoint_saved.route)
 
     def remove_endpoint(self, endpoint: str) -> Union['EndpointSaved', None]:
         try:
@@ -300,20 +471,24 @@ class EndpointPattern(object):
 
 
 class EndpointSaved(object):
-    def __init__(self, entry: EndpointEntry, variables: list[str], settings: CommandSettings) -> None:
+    def __init__(self, entry: EndpointEntry, variables: list[str], settings: CommandSettings,
+                 route: str = None) -> None:
         self.entry = entry
         self.variables = variables
         self.settings = settings
+        # endpoint as it was added, with variables unfilled
+        self.route = route
 
 
 class EndpointValue(object):
     def __init__(self, entry: EndpointEntry, values: dict[str, str], params: dict[str, str], querystring: str,
-                 settings: CommandSettings) -> None:
+                 settings: CommandSettings, route: str = None) -> None:
         self.entry = entry
         self.values = values
         self.params = params
         self.querystring = querystring
         self.settings = settings
+        self.route = route
 
     def execute(self, request: CepticRequest) -> CepticResponse:
         request.values = self.values
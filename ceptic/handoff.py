@@ -0,0 +1,67 @@
+import os
+import socket
+import subprocess
+import sys
+from typing import NoReturn, Union
+
+from ceptic.log import server_logger
+
+# environment variable through which a listening socket's fd is passed to a new process
+LISTEN_FD_ENV = "CEPTIC_LISTEN_FD"
+
+
+def inherit_listen_socket() -> Union[socket.socket, None]:
+    """
+    Returns listening socket passed on by previous process through LISTEN_FD_ENV, or None if there is none. Variable is
+    removed, so that processes started by this one do not adopt same fd by accident.
+    """
+    value = os.environ.pop(LISTEN_FD_ENV, None)
+    if value is None:
+        return None
+    try:
+        fd = int(value)
+    except ValueError:
+        raise ValueError("{} must be an fd number; was '{}'.".format(LISTEN_FD_ENV, value))
+    listen_socket = socket.socket(fileno=fd)
+    # keep fd from leaking into further processes
+    listen_socket.set_inheritable(False)
+    server_logger.info("inherited listening socket on fd %d", fd)
+    return listen_socket
+
+
+def get_handoff_env(listen_socket: socket.socket, env: dict[str, str] = None) -> dict[str, str]:
+    env = dict(os.environ if env is None else env)
+    env[LISTEN_FD_ENV] = str(listen_socket.fileno())
+    return env
+
+
+def get_default_args() -> list[str]:
+    # command this process was started with
+    return [sys.executable] + sys.argv
+
+
+def spawn_with_listen_socket(listen_socket: socket.socket, args: list[str] = None,
+                             env: dict[str, str] = None) -> subprocess.Popen:
+    """
+    Start a new process that can adopt listen_socket through inherit_listen_socket, while this process keeps serving.
+    Returns once process is started; both processes accept on socket until this one stops.
+    :param args: command to run; defaults to command this process was started with
+    """
+    args = args if args else get_default_args()
+    fd = listen_socket.fileno()
+    server_logger.info("spawning process to take over listening socket on fd %d: %s", fd, args)
+    return subprocess.Popen(args, env=get_handoff_env(listen_socket, env), pass_fds=(fd,))
+
+
+def reexec_with_listen_socket(listen_socket: socket.socket, args: list[str] = None,
+                              env: dict[str, str] = None) -> NoReturn:
+    """
+    Replace this process with a new program that can adopt listen_socket through inherit_listen_socket. Connections
+    queued on socket are kept, but connections of this process are closed without draining; use
+    spawn_with_listen_socket to drain them first.
+    :param args: command to run; defaults to command this process was started with
+    """
+    args = args if args else get_default_args()
+    os.set_inheritable(listen_socket.fileno(), True)
+    server_logger.info("re-executing to hand off listening socket on fd %d: %s", listen_socket.fileno(), args)
+    os.execve(args[0], args, get_handoff_env(listen_socket, env))
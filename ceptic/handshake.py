@@ -0,0 +1,183 @@
+import struct
+
+from ceptic.common import CepticIOException, CepticCapability
+from ceptic.net import SocketCeptic
+
+
+class ClientHandshake(object):
+    """
+    Settings sent by client to begin a connection. Compact format is a single struct-encoded message starting with
+    MAGIC; legacy format is fixed-width ASCII fields, which always start with a space-padded version string.
+    """
+    __slots__ = ("version", "frame_min_size", "frame_max_size", "headers_min_size", "headers_max_size",
+                 "stream_min_timeout", "stream_timeout", "capabilities", "stream_window_size", "connection_window_size")
+
+    MAGIC = 0xCE
+    # magic, version, frame min size, frame max size, headers min size, headers max size, stream min timeout,
+    # stream timeout, capabilities, stream window size, connection window size
+    STRUCT = struct.Struct("!B16sIIIIHHIII")
+    LEGACY_SIZE = 16 * 5 + 4 * 2
+
+    def __init__(self, version: str, frame_min_size: int, frame_max_size: int, headers_min_size: int,
+                 headers_max_size: int, stream_min_timeout: int, stream_timeout: int,
+                 capabilities: CepticCapability = CepticCapability.NONE,
+                 stream_window_size: int = 0, connection_window_size: int = 0) -> None:
+        self.version = version
+        self.frame_min_size = frame_min_size
+        self.frame_max_size = frame_max_size
+        self.headers_min_size = headers_min_size
+        self.headers_max_size = headers_max_size
+        self.stream_min_timeout = stream_min_timeout
+        self.stream_timeout = stream_timeout
+        self.capabilities = capabilities
+        # receive windows; only carried by compact format
+        self.stream_window_size = stream_window_size
+        self.connection_window_size = connection_window_size
+
+    def to_bytes(self) -> bytes:
+        return self.STRUCT.pack(self.MAGIC, self.version.encode(), self.frame_min_size, self.frame_max_size,
+                                self.headers_min_size, self.headers_max_size, self.stream_min_timeout,
+                                self.stream_timeout, int(self.capabilities), self.stream_window_size,
+                                self.connection_window_size)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'ClientHandshake':
+        """
+        Raises ValueError if data is not a compact client handshake.
+        """
+        try:
+            magic, version, *values, capabilities, stream_window_size, connection_window_size = \
+                cls.STRUCT.unpack(data)
+        except struct.error as e:
+            raise ValueError(f"Client handshake could not be unpacked: {e}") from e
+        if magic != cls.MAGIC:
+            raise ValueError(f"Client handshake did not start with magic byte: {magic}")
+        return cls(version.rstrip(b"\0").decode(), *values, CepticCapability(capabilities), stream_window_size,
+                   connection_window_size)
+
+    def to_legacy_bytes(self) -> bytes:
+        # if any capabilities are requested, append them to version so that servers which do not negotiate
+        # capabilities can still read the version field
+        version = self.version
+        if self.capabilities:
+            version = f"{version}+{int(self.capabilities)}"
+        return (f"{version:>16}{self.frame_min_size:>16}{self.frame_max_size:>16}{self.headers_min_size:>16}"
+                f"{self.headers_max_size:>16}{self.stream_min_timeout:>4}{self.stream_timeout:>4}").encode()
+
+    @classmethod
+    def from_legacy_bytes(cls, data: bytes) -> 'ClientHandshake':
+        """
+        Raises ValueError if any field is not of expected type.
+        """
+        data_str = data.decode()
+        # version may be followed by requested capabilities, separated by '+'
+        version, has_capabilities, capabilities_str = data_str[0:16].strip().partition("+")
+        capabilities = CepticCapability(int(capabilities_str)) if has_capabilities else CepticCapability.NONE
+        return cls(version, int(data_str[16:32]), int(data_str[32:48]), int(data_str[48:64]), int(data_str[64:80]),
+                   int(data_str[80:84]), int(data_str[84:88]), capabilities)
+
+    @staticmethod
+    def is_compact(data: bytes) -> bool:
+        return data[0] == ClientHandshake.MAGIC
+
+    @staticmethod
+    def requested_capabilities_legacy(data: bytes) -> bool:
+        """
+        Returns if legacy client handshake had capabilities appended to version.
+        """
+        return b"+" in data[0:16]
+
+    @classmethod
+    def recv_bytes_by_deadline(cls, s: SocketCeptic, deadline: float) -> bytes:
+        """
+        Receive client handshake in either format by deadline; first byte decides how many more bytes are expected.
+        :raises SocketCepticException: when socket is unexpectedly closed, EOF, or deadline passes
+        """
+        first = s.recv_raw_by_deadline(1, deadline)
+        if cls.is_compact(first):
+            return first + s.recv_raw_by_deadline(cls.STRUCT.size - 1, deadline)
+        return first + s.recv_raw_by_deadline(cls.LEGACY_SIZE - 1, deadline)
+
+
+class ServerHandshake(object):
+    """
+    Settings chosen by server in response to a ClientHandshake, or an error if client's settings were rejected.
+    """
+    __slots__ = ("accepted", "frame_max_size", "headers_max_size", "stream_timeout", "handler_max_count",
+                 "capabilities", "stream_window_size", "connection_window_size", "error")
+
+    MAGIC = ClientHandshake.MAGIC
+    # magic, accepted, frame max size, headers max size, stream timeout, handler max count, capabilities,
+    # stream window size, connection window size
+    STRUCT = struct.Struct("!BBIIHIIII")
+    ERROR_MAX_LENGTH = 1024
+
+    def __init__(self, frame_max_size: int = 0, headers_max_size: int = 0, stream_timeout: int = 0,
+                 handler_max_count: int = 0, capabilities: CepticCapability = CepticCapability.NONE,
+                 stream_window_size: int = 0, connection_window_size: int = 0, error: str = None) -> None:
+        self.accepted = error is None
+        self.frame_max_size = frame_max_size
+        self.headers_max_size = headers_max_size
+        self.stream_timeout = stream_timeout
+        self.handler_max_count = handler_max_count
+        self.capabilities = capabilities
+        # receive windows; only carried by compact format
+        self.stream_window_size = stream_window_size
+        self.connection_window_size = connection_window_size
+        self.error = error[0:self.ERROR_MAX_LENGTH] if error is not None else None
+
+    @classmethod
+    def rejected(cls, error: str) -> 'ServerHandshake':
+        return cls(error=error)
+
+    def send(self, s: SocketCeptic) -> None:
+        s.send_raw(self.STRUCT.pack(self.MAGIC, self.accepted, self.frame_max_size, self.headers_max_size,
+                                    self.stream_timeout, self.handler_max_count, int(self.capabilities),
+                                    self.stream_window_size, self.connection_window_size))
+        if not self.accepted:
+            s.send_str(self.error)
+
+    @classmethod
+    def from_socket(cls, s: SocketCeptic) -> 'ServerHandshake':
+        data = s.recv_raw(cls.STRUCT.size)
+        try:
+            magic, accepted, *values, capabilities, stream_window_size, connection_window_size = \
+                cls.STRUCT.unpack(data)
+        except struct.error as e:
+            raise CepticIOException(f"Server handshake could not be unpacked: {e}") from e
+        if magic != cls.MAGIC:
+            raise CepticIOException(f"Server handshake did not start with magic byte: {magic}")
+        if not accepted:
+            return cls.rejected(s.recv_str(cls.ERROR_MAX_LENGTH))
+        return cls(*values, CepticCapability(capabilities), stream_window_size, connection_window_size)
+
+    def send_legacy(self, s: SocketCeptic, send_capabilities: bool) -> None:
+        if not self.accepted:
+            s.send_raw_str("n")
+            s.send_str(self.error)
+            return
+        # clients that requested capabilities get 'c' followed by the capabilities chosen
+        data = f"{'c' if send_capabilities else 'y'}{self.frame_max_size:>16}{self.headers_max_size:>16}" \
+               f"{self.stream_timeout:>4}{self.handler_max_count:>4}"
+        if send_capabilities:
+            data += f"{int(self.capabilities):>4}"
+        s.send_raw_str(data)
+
+    @classmethod
+    def from_legacy_socket(cls, s: SocketCeptic) -> 'ServerHandshake':
+        response = s.recv_raw_str(1)
+        # if not positive, get additional info
+        if response not in ('y', 'c'):
+            return cls.rejected(s.recv_str(cls.ERROR_MAX_LENGTH))
+        frame_max_size_str = s.recv_raw_str(16).strip()
+        headers_max_size_str = s.recv_raw_str(16).strip()
+        stream_timeout_str = s.recv_raw_str(4).strip()
+        handler_max_count_str = s.recv_raw_str(4).strip()
+        capabilities_str = s.recv_raw_str(4).strip() if response == 'c' else "0"
+        try:
+            return cls(int(frame_max_size_str), int(headers_max_size_str), int(stream_timeout_str),
+                       int(handler_max_count_str), CepticCapability(int(capabilities_str)))
+        except ValueError:
+            raise CepticIOException(f"Server's values were not all integers, could not proceed: "
+                                    f"{frame_max_size_str},{headers_max_size_str},"
+                                    f"{stream_timeout_str},{handler_max_count_str},{capabilities_str}")
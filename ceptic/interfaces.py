@@ -1,4 +1,6 @@
 from abc import abstractmethod
+from threading import Thread
+from typing import Callable
 
 import ceptic.stream as cs
 
@@ -7,3 +9,25 @@ class IRemovableManagers(object):
     @abstractmethod
     def handle_new_connection(self, handler: 'cs.StreamHandlerInternal') -> None:
         raise NotImplementedError
+
+    def start_new_connection(self, run: Callable[['cs.StreamHandlerInternal'], None],
+                             handler: 'cs.StreamHandlerInternal') -> None:
+        """
+        Call run(handler), which calls handle_new_connection, off of manager's receive thread; by default on a new
+        thread.
+        """
+        handler_thread = Thread(target=run, args=(handler,))
+        handler_thread.daemon = True
+        handler_thread.start()
+
+    def handle_stopped_manager(self, manager: 'cs.StreamManager') -> None:
+        pass
+
+    def handle_going_away_manager(self, manager: 'cs.StreamManager') -> None:
+        pass
+
+    def handle_drained_manager(self, manager: 'cs.StreamManager') -> None:
+        """
+        Manager that is going away removed its last stream.
+        """
+        pass
@@ -0,0 +1,114 @@
+import atexit
+import logging
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from threading import Lock
+from time import monotonic
+from typing import Union
+
+# loggers per subsystem; ceptic adds no handlers of its own unless verbose logging is enabled
+logger = logging.getLogger("ceptic")
+logger.addHandler(logging.NullHandler())
+server_logger = logging.getLogger("ceptic.server")
+client_logger = logging.getLogger("ceptic.client")
+stream_logger = logging.getLogger("ceptic.stream")
+endpoint_logger = logging.getLogger("ceptic.endpoint")
+tracing_logger = logging.getLogger("ceptic.tracing")
+# every frame sent and received is logged here at DEBUG, rate limited
+frame_logger = logging.getLogger("ceptic.stream.frames")
+
+
+class RateLimitedLogger(object):
+    """
+    Logs at most rate messages per interval (seconds); once messages were dropped, next message logged is preceded
+    by count of dropped messages. For high volume events, check is_enabled before building arguments.
+    """
+
+    def __init__(self, logger: logging.Logger, rate: int = 20, interval: float = 1.0) -> None:
+        self.logger = logger
+        self.rate = rate
+        self.interval = interval
+        self.window_start = monotonic()
+        self.count = 0
+        self.suppressed = 0
+        self.lock = Lock()
+
+    def is_enabled(self, level: int = logging.DEBUG) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level: int, msg: str, *args, **kwargs) -> None:
+        suppressed = 0
+        with self.lock:
+            now = monotonic()
+            if now - self.window_start >= self.interval:
+                self.window_start = now
+                self.count = 0
+                suppressed = self.suppressed
+                self.suppressed = 0
+            if self.count >= self.rate:
+                self.suppressed += 1
+                return
+            self.count += 1
+        if suppressed:
+            self.logger.log(level, "%d messages dropped by rate limit", suppressed)
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg: str, *args, **kwargs) -> None:
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def warning(self, msg: str, *args, **kwargs) -> None:
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+
+frame_log = RateLimitedLogger(frame_logger)
+
+
+class QueueLogging(object):
+    """
+    Passes records of a logger to handlers through a queue, so that threads logging never block on handler I/O;
+    handlers run on listener's own thread. Stopping flushes queued records and detaches queue from logger.
+    """
+
+    def __init__(self, handlers: list[logging.Handler], logger_name: str = "ceptic") -> None:
+        self.logger = logging.getLogger(logger_name)
+        self.queue = SimpleQueue()
+        self.queue_handler = QueueHandler(self.queue)
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.started = False
+
+    def start(self) -> 'QueueLogging':
+        if not self.started:
+            self.started = True
+            self.listener.start()
+            self.logger.addHandler(self.queue_handler)
+        return self
+
+    def stop(self) -> None:
+        if self.started:
+            self.started = False
+            self.logger.removeHandler(self.queue_handler)
+            self.listener.stop()
+
+
+_verbose_logging: Union[QueueLogging, None] = None
+_verbose_lock = Lock()
+
+
+def enable_verbose_logging() -> None:
+    """
+    Log ceptic records at DEBUG and above to stdout, through a queue. Frames are not logged unless frame logger is
+    given a level of its own. Done at most once per process.
+    """
+    global _verbose_logging
+    with _verbose_lock:
+        if _verbose_logging is not None:
+            return
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s: %(message)s"))
+        _verbose_logging = QueueLogging([handler]).start()
+        atexit.register(_verbose_logging.stop)
+        if logger.level == logging.NOTSET or logger.level > logging.DEBUG:
+            logger.setLevel(logging.DEBUG)
+        if frame_logger.level == logging.NOTSET:
+            frame_logger.setLevel(logging.INFO)
@@ -0,0 +1,234 @@
+from bisect import bisect_left
+from threading import Lock
+from typing import Iterable, Union, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ceptic.stream import StreamFrame, StreamManager
+
+
+class Counter(object):
+    """
+    Counter that may be incremented from any thread.
+    """
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = Lock()
+
+    def increment(self, value: int = 1) -> None:
+        with self._lock:
+            self.value += value
+
+
+class Histogram(object):
+    """
+    Count of observed values per bucket, along with their sum and max. Buckets are fixed when created, so observing
+    a value is a bisect and a few increments under a lock.
+    """
+    __slots__ = ("bounds", "counts", "count", "sum", "max", "_lock")
+
+    # seconds, from 100 us to 10 s
+    DEFAULT_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                      5.0, 10.0)
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BOUNDS) -> None:
+        self.bounds = bounds
+        # last bucket holds values above every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def merge(self, other: 'Histogram') -> None:
+        with other._lock:
+            counts, count, total, maximum = list(other.counts), other.count, other.sum, other.max
+        with self._lock:
+            for index, value in enumerate(counts):
+                self.counts[index] += value
+            self.count += count
+            self.sum += total
+            self.max = max(self.max, maximum)
+
+    def get_cumulative_counts(self) -> list[int]:
+        """
+        Returns count of values at or below each bound, followed by count of all values.
+        """
+        cumulative = []
+        total = 0
+        for value in self.counts:
+            total += value
+            cumulative.append(total)
+        return cumulative
+
+    def get_percentile(self, fraction: float) -> float:
+        """
+        Returns upper bound of bucket holding given fraction of values, or max for values above every bound.
+        """
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        for index, cumulative in enumerate(self.get_cumulative_counts()):
+            if cumulative >= target and cumulative:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def get_stats(self) -> dict[str, Union[int, float]]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.get_percentile(0.5),
+            "p99": self.get_percentile(0.99),
+        }
+
+
+class FrameCounters(object):
+    """
+    Frames and data bytes per frame type. Only one thread may add frames; reading from other threads is fine.
+    """
+    __slots__ = ("type_names", "frames", "bytes")
+
+    def __init__(self, type_names: tuple[str, ...]) -> None:
+        self.type_names = type_names
+        self.frames = [0] * len(type_names)
+        self.bytes = [0] * len(type_names)
+
+    def add(self, frame: 'StreamFrame') -> None:
+        index = frame.type.value
+        self.frames[index] += 1
+        self.bytes[index] += len(frame.data)
+
+    def merge(self, other: 'FrameCounters') -> None:
+        for index in range(len(self.type_names)):
+            self.frames[index] += other.frames[index]
+            self.bytes[index] += other.bytes[index]
+
+    def get_total_frames(self) -> int:
+        return sum(self.frames)
+
+    def get_total_bytes(self) -> int:
+        return sum(self.bytes)
+
+    def get_stats(self) -> dict[str, dict[str, int]]:
+        return {name: {"frames": self.frames[index], "bytes": self.bytes[index]}
+                for index, name in enumerate(self.type_names)}
+
+
+class ManagerMetrics(object):
+    """
+    Metrics of a single manager. Frames sent and received are counted by manager's sending and receiving threads;
+    waits and encoding are timed by handlers, only when they wait or use an encoding.
+    """
+
+    def __init__(self, frame_type_names: tuple[str, ...]) -> None:
+        self.sent = FrameCounters(frame_type_names)
+        self.received = FrameCounters(frame_type_names)
+        self.handlers_created = 0
+        self.buffer_waits = Histogram()
+        self.flow_control_waits = Histogram()
+        self.encode_time = Histogram()
+        self.decode_time = Histogram()
+
+    def merge(self, other: 'ManagerMetrics') -> None:
+        self.sent.merge(other.sent)
+        self.received.merge(other.received)
+        self.handlers_created += other.handlers_created
+        self.buffer_waits.merge(other.buffer_waits)
+        self.flow_control_waits.merge(other.flow_control_waits)
+        self.encode_time.merge(other.encode_time)
+        self.decode_time.merge(other.decode_time)
+
+    def get_stats(self) -> dict:
+        return {
+            "frames_sent": self.sent.get_stats(),
+            "frames_received": self.received.get_stats(),
+            "handlers_created": self.handlers_created,
+            "buffer_waits": self.buffer_waits.get_stats(),
+            "flow_control_waits": self.flow_control_waits.get_stats(),
+            "encode_time": self.encode_time.get_stats(),
+            "decode_time": self.decode_time.get_stats(),
+        }
+
+
+class CepticMetrics(object):
+    """
+    Metrics of a CepticServer or CepticClient: connections, handshake durations and request latency per route, along
+    with metrics of managers that were already removed.
+    """
+
+    def __init__(self, frame_type_names: tuple[str, ...]) -> None:
+        self.frame_type_names = frame_type_names
+        self.connections_opened = Counter()
+        self.connections_rejected = Counter()
+        # streams rejected by admission control, by reason
+        self.streams_rejected: dict[str, Counter] = dict()
+        self.streams_rejected_lock = Lock()
+        self.handshake_time = Histogram()
+        self.request_latency: dict[str, Histogram] = dict()
+        self.request_latency_lock = Lock()
+        # managers are removed over time; their metrics are kept here so totals never go down
+        self.retired = ManagerMetrics(frame_type_names)
+        self.retired_count = 0
+        self.retired_lock = Lock()
+
+    def observe_request(self, key: str, duration: float) -> None:
+        histogram = self.request_latency.get(key)
+        if histogram is None:
+            with self.request_latency_lock:
+                histogram = self.request_latency.setdefault(key, Histogram())
+        histogram.observe(duration)
+
+    def reject_stream(self, reason: str) -> None:
+        counter = self.streams_rejected.get(reason)
+        if counter is None:
+            with self.streams_rejected_lock:
+                counter = self.streams_rejected.setdefault(reason, Counter())
+        counter.increment()
+
+    def retire(self, metrics: ManagerMetrics) -> None:
+        with self.retired_lock:
+            self.retired.merge(metrics)
+            self.retired_count += 1
+
+    def get_manager_totals(self, managers: Iterable['StreamManager']) -> ManagerMetrics:
+        """
+        Returns metrics of retired and given managers combined.
+        """
+        totals = ManagerMetrics(self.frame_type_names)
+        with self.retired_lock:
+            totals.merge(self.retired)
+        for manager in managers:
+            totals.merge(manager.metrics)
+        return totals
+
+    def get_stats(self, managers: Iterable['StreamManager'], per_manager: bool = False) -> dict:
+        managers = list(managers)
+        stats = self.get_manager_totals(managers).get_stats()
+        stats.update({
+            "connections": {
+                "opened": self.connections_opened.value,
+                "rejected": self.connections_rejected.value,
+                "active": sum(1 for manager in managers if not manager.is_stopped()),
+                "closed": self.retired_count,
+            },
+            "streams_rejected": {reason: counter.value for reason, counter in list(self.streams_rejected.items())},
+            "handlers_active": sum(manager.get_handler_count() for manager in managers),
+            "send_queue_depth": sum(manager.send_buffer.qsize() for manager in managers),
+            "send_queue_peak": max((manager.send_buffer.peak_size for manager in managers), default=0),
+            "handshake_time": self.handshake_time.get_stats(),
+            "request_latency": {key: histogram.get_stats() for key, histogram in list(self.request_latency.items())},
+        })
+        if per_manager:
+            stats["managers"] = [manager.get_stats() for manager in managers]
+        return stats
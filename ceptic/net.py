@@ -1,8 +1,9 @@
 from ceptic.common import CepticException
 from select import select as vanilla_select
-from socket import socket
+from socket import socket, timeout as SocketTimeoutError, SHUT_RDWR
+from time import monotonic
 
-from typing import Union, Iterable, Tuple, List
+from typing import Union, Iterable, Tuple
 
 
 class SocketCepticException(CepticException):
@@ -84,6 +85,34 @@ class SocketCeptic(object):
             raise SocketCepticException("No data received (EOF).") from e
         return byte_array
 
+    def recv_raw_by_deadline(self, length: int, deadline: float) -> bytes:
+        """
+        Receive exactly the length specified, giving up once time.monotonic() passes deadline no matter how slowly
+        the sender trickles in bytes. Leaves the socket with a timeout set.
+        :param length: length of byte array to receive
+        :param deadline: time.monotonic() value by which all bytes must be received
+        :raises SocketCepticException: when socket is unexpectedly closed, EOF, or deadline passes
+        """
+        byte_array = bytearray()
+        try:
+            while len(byte_array) < length:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise SocketCepticException(f"Deadline passed after receiving {len(byte_array)} of {length} bytes.")
+                self.s.settimeout(remaining)
+                part = self.s.recv(length - len(byte_array))
+                if not part:
+                    raise SocketCepticException("No data received (EOF).")
+                byte_array += part
+        except SocketTimeoutError as e:
+            raise SocketCepticException(f"Deadline passed after receiving {len(byte_array)} of {length} bytes.") \
+                from e
+        except ConnectionResetError as e:
+            raise SocketCepticException("Connection was closed: {}".format(str(e))) from e
+        except (EOFError, OSError) as e:
+            raise SocketCepticException("No data received (EOF).") from e
+        return byte_array
+
     def recv_raw_str(self, length: int) -> str:
         """
         Receive string up to the length specified.
@@ -115,6 +144,22 @@ class SocketCeptic(object):
         return self.recv_bytes(max_length).decode()
     # endregion
 
+    def settimeout(self, timeout: Union[float, None]) -> None:
+        """
+        Set timeout of wrapped socket; None means blocking with no timeout.
+        """
+        self.s.settimeout(timeout)
+
+    def shutdown(self) -> None:
+        """
+        Shut down both directions of wrapped socket, waking any thread blocked receiving on it. Shuts down underlying
+        socket directly, so that an ssl socket is not unwrapped while another thread is still using it.
+        """
+        try:
+            socket.shutdown(self.s, SHUT_RDWR)
+        except OSError:
+            pass
+
     def close(self) -> None:
         """
         Close wrapped socket.
@@ -0,0 +1,169 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Callable, Iterable, Union, TYPE_CHECKING
+
+from ceptic.metrics import CepticMetrics, Histogram
+
+if TYPE_CHECKING:
+    from ceptic.stream import StreamManager
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def format_value(value: Union[int, float]) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class OpenMetricsBuilder(object):
+    """
+    Builds OpenMetrics text exposition, one metric family at a time.
+    """
+
+    def __init__(self, prefix: str = "ceptic") -> None:
+        self.prefix = prefix
+        self.lines: list[str] = []
+
+    def add_family(self, name: str, metric_type: str, help_text: str, unit: str = None) -> str:
+        name = f"{self.prefix}_{name}"
+        self.lines.append(f"# TYPE {name} {metric_type}")
+        if unit:
+            self.lines.append(f"# UNIT {name} {unit}")
+        self.lines.append(f"# HELP {name} {help_text}")
+        return name
+
+    def add_sample(self, name: str, value: Union[int, float], labels: dict[str, str] = None) -> None:
+        self.lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+    def add_counter(self, name: str, help_text: str, value: Union[int, float], unit: str = None) -> None:
+        name = self.add_family(name, "counter", help_text, unit)
+        self.add_sample(f"{name}_total", value)
+
+    def add_gauge(self, name: str, help_text: str, value: Union[int, float]) -> None:
+        name = self.add_family(name, "gauge", help_text)
+        self.add_sample(name, value)
+
+    def add_histogram_samples(self, name: str, histogram: Histogram, labels: dict[str, str] = None) -> None:
+        labels = labels if labels else {}
+        cumulative = histogram.get_cumulative_counts()
+        for bound, count in zip(histogram.bounds, cumulative):
+            self.add_sample(f"{name}_bucket", count, {**labels, "le": repr(float(bound))})
+        self.add_sample(f"{name}_bucket", cumulative[-1], {**labels, "le": "+Inf"})
+        self.add_sample(f"{name}_count", cumulative[-1], labels)
+        self.add_sample(f"{name}_sum", histogram.sum, labels)
+
+    def add_histogram(self, name: str, help_text: str, histogram: Histogram) -> None:
+        name = self.add_family(name, "histogram", help_text, "seconds")
+        self.add_histogram_samples(name, histogram)
+
+    def build(self) -> str:
+        return "\n".join(self.lines + ["# EOF"]) + "\n"
+
+
+def render_openmetrics(metrics: CepticMetrics, managers: Iterable['StreamManager'],
+                       tls_stats: dict[str, Union[int, float]] = None) -> str:
+    """
+    Render metrics of given managers, along with those of already removed managers, as OpenMetrics text.
+    """
+    managers = list(managers)
+    totals = metrics.get_manager_totals(managers)
+    builder = OpenMetricsBuilder()
+    # connections and streams
+    builder.add_counter("connections_opened", "Connections that completed handshake.", metrics.connections_opened.value)
+    builder.add_counter("connections_rejected", "Connections dropped or rejected before or during handshake.",
+                        metrics.connections_rejected.value)
+    builder.add_counter("connections_closed", "Connections removed after being opened.", metrics.retired_count)
+    builder.add_gauge("connections_active", "Connections currently open.",
+                      sum(1 for manager in managers if not manager.is_stopped()))
+    builder.add_counter("streams_created", "Streams created on all connections.", totals.handlers_created)
+    builder.add_gauge("streams_active", "Streams currently open.",
+                      sum(manager.get_handler_count() for manager in managers))
+    rejected_name = builder.add_family("streams_rejected", "counter",
+                                      "Streams rejected by admission control, by reason.")
+    for reason, counter in sorted(list(metrics.streams_rejected.items())):
+        builder.add_sample(f"{rejected_name}_total", counter.value, {"reason": reason})
+    builder.add_gauge("send_queue_depth", "Frames waiting to be sent on all connections.",
+                      sum(manager.send_buffer.qsize() for manager in managers))
+    # frames and bytes per direction and frame type
+    frames_name = builder.add_family("frames", "counter", "Frames sent and received, by frame type.")
+    for direction, counters in (("sent", totals.sent), ("received", totals.received)):
+        for index, frame_type in enumerate(counters.type_names):
+            builder.add_sample(f"{frames_name}_total", counters.frames[index],
+                               {"direction": direction, "type": frame_type})
+    bytes_name = builder.add_family("frame_data_bytes", "counter", "Frame data bytes sent and received, by frame type.",
+                                    "bytes")
+    for direction, counters in (("sent", totals.sent), ("received", totals.received)):
+        for index, frame_type in enumerate(counters.type_names):
+            builder.add_sample(f"{bytes_name}_total", counters.bytes[index],
+                               {"direction": direction, "type": frame_type})
+    # latency
+    request_name = builder.add_family("request_duration_seconds", "histogram", "Request duration, by route.",
+                                      "seconds")
+    for key, histogram in sorted(list(metrics.request_latency.items())):
+        command, _, route = key.partition(" ")
+        labels = {"command": command, "route": route} if route else {"command": command}
+        builder.add_histogram_samples(request_name, histogram, labels)
+    builder.add_histogram("handshake_duration_seconds", "Duration of handshakes, including tls.",
+                          metrics.handshake_time)
+    builder.add_histogram("buffer_wait_seconds", "Time spent waiting for room in stream buffers.",
+                          totals.buffer_waits)
+    builder.add_histogram("flow_control_wait_seconds", "Time spent waiting for flow control credit.",
+                          totals.flow_control_waits)
+    builder.add_histogram("encode_duration_seconds", "Time spent encoding frame data.", totals.encode_time)
+    builder.add_histogram("decode_duration_seconds", "Time spent decoding frame data.", totals.decode_time)
+    if tls_stats is not None:
+        builder.add_counter("tls_handshakes", "TLS handshakes done.", tls_stats["handshakes"])
+        builder.add_counter("tls_resumed", "TLS handshakes that resumed a previous session.", tls_stats["resumed"])
+    return builder.build()
+
+
+class MetricsExporter(object):
+    """
+    HTTP listener serving OpenMetrics text on GET /metrics, for monitoring to scrape. Uses only the standard library.
+    """
+
+    def __init__(self, render: Callable[[], str], host: str, port: int) -> None:
+        self.render = render
+
+        exporter = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                # scrapes are frequent; do not print every one
+                pass
+
+        self.http_server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self.http_server.daemon_threads = True
+        self.thread = Thread(target=self.http_server.serve_forever, name="CepticMetricsExporter", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.http_server.server_address[1]
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.thread.is_alive():
+            self.http_server.shutdown()
+        self.http_server.server_close()
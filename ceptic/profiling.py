@@ -0,0 +1,147 @@
+import cProfile
+import pstats
+from io import StringIO
+from random import random
+from threading import Lock
+from time import perf_counter, thread_time
+from typing import Union
+
+
+class RequestProfile(object):
+    """
+    Time breakdown of a single sampled request, in seconds. Phases overlap: endpoint includes any reads and sends done
+    by endpoint entry, and read and send include decoding and encoding.
+    """
+    __slots__ = ("phases", "start", "cpu_start", "cprofile")
+
+    PHASES = ("parse", "read", "decode", "endpoint", "send", "encode")
+
+    def __init__(self, cprofile: Union[cProfile.Profile, None] = None) -> None:
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.start = perf_counter()
+        self.cpu_start = thread_time()
+        self.cprofile = cprofile
+
+    def add(self, phase: str, duration: float) -> None:
+        self.phases[phase] += duration
+
+
+class RouteProfile(object):
+    """
+    Sampled requests of a single route combined.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.wall_time = 0.0
+        self.wall_time_max = 0.0
+        self.cpu_time = 0.0
+        self.phases = dict.fromkeys(RequestProfile.PHASES, 0.0)
+        self.stats: Union[pstats.Stats, None] = None
+
+    def add(self, profile: RequestProfile, wall_time: float, cpu_time: float) -> None:
+        self.count += 1
+        self.wall_time += wall_time
+        self.wall_time_max = max(self.wall_time_max, wall_time)
+        self.cpu_time += cpu_time
+        for phase, duration in profile.phases.items():
+            self.phases[phase] += duration
+        if profile.cprofile:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile.cprofile)
+            else:
+                self.stats.add(profile.cprofile)
+
+    def get_stats(self) -> dict:
+        return {
+            "count": self.count,
+            "wall_time": self.wall_time,
+            "wall_time_max": self.wall_time_max,
+            "cpu_time": self.cpu_time,
+            "phases": dict(self.phases),
+            "profiled": self.stats is not None,
+        }
+
+
+class Profiler(object):
+    """
+    Profiles a sampled fraction of requests and combines them per route. Each sampled request gets a time breakdown;
+    with cprofile, functions called by request's thread are also profiled, one request at a time, since profiling
+    concurrent requests would mix their calls. Manager threads that send and receive frames are not profiled by
+    cprofile; time handlers spend waiting on them shows up in read and send phases.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, use_cprofile: bool = False) -> None:
+        self.sample_rate = 0.0
+        self.use_cprofile = False
+        self.configure(sample_rate, use_cprofile)
+        self.routes: dict[str, RouteProfile] = dict()
+        self.lock = Lock()
+        self.cprofile_lock = Lock()
+
+    def configure(self, sample_rate: float, use_cprofile: bool = False) -> None:
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0.0 and 1.0; was {}.".format(sample_rate))
+        self.sample_rate = sample_rate
+        self.use_cprofile = use_cprofile
+
+    def start(self) -> Union[RequestProfile, None]:
+        """
+        Returns a profile if request is sampled, otherwise None.
+        """
+        if not self.sample_rate or random() >= self.sample_rate:
+            return None
+        cprofile = None
+        if self.use_cprofile and self.cprofile_lock.acquire(blocking=False):
+            cprofile = cProfile.Profile()
+            try:
+                cprofile.enable()
+            except ValueError:
+                # another profiler is already active in this process
+                cprofile = None
+                self.cprofile_lock.release()
+        return RequestProfile(cprofile)
+
+    def finish(self, profile: RequestProfile, route: Union[str, None]) -> None:
+        """
+        Add profile to its route; requests matching no route are dropped.
+        """
+        wall_time = perf_counter() - profile.start
+        cpu_time = thread_time() - profile.cpu_start
+        if profile.cprofile:
+            profile.cprofile.disable()
+            self.cprofile_lock.release()
+        if route is None:
+            return
+        with self.lock:
+            route_profile = self.routes.get(route)
+            if route_profile is None:
+                route_profile = self.routes[route] = RouteProfile()
+            route_profile.add(profile, wall_time, cpu_time)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.routes.clear()
+
+    def get_stats(self) -> dict[str, dict]:
+        with self.lock:
+            return {route: route_profile.get_stats() for route, route_profile in self.routes.items()}
+
+    def dump(self, sort: str = "cumulative", limit: int = 30) -> str:
+        """
+        Returns time breakdown per route, with mean durations in milliseconds, followed by cprofile stats of route,
+        if any, sorted by given key and limited to given number of functions.
+        """
+        output = StringIO()
+        with self.lock:
+            for route, route_profile in sorted(self.routes.items()):
+                count = route_profile.count
+                output.write(f"{route}: {count} sampled, wall {route_profile.wall_time / count * 1000:.3f} ms, "
+                             f"cpu {route_profile.cpu_time / count * 1000:.3f} ms, "
+                             f"max wall {route_profile.wall_time_max * 1000:.3f} ms\n")
+                for phase, duration in route_profile.phases.items():
+                    output.write(f"    {phase:>8}: {duration / count * 1000:.3f} ms\n")
+                if route_profile.stats is not None:
+                    route_profile.stats.stream = output
+                    route_profile.stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
@@ -34,6 +34,8 @@ class SecuritySettings(object):
         self.remote_certs_path: Union[str, None] = None
         self.verify_remote: bool = True
         self.secure: bool = True
+        self.session_resumption: bool = True
+        self.session_ticket_count: int = 2
         self._key_password: Union[str, None] = None
         self.ssl_context: Union[SSLContext, None] = ssl_context
 
@@ -81,6 +83,14 @@ class SecuritySettings(object):
         return settings
 
 
+def get_tls_session_stats(handshake_count: int, resumed_count: int) -> dict[str, Union[int, float]]:
+    return {
+        "handshakes": handshake_count,
+        "resumed": resumed_count,
+        "reuse_rate": resumed_count / handshake_count if handshake_count else 0.0
+    }
+
+
 class CertificateHelper(object):
     PRIVATE_KEY_REGEX = re.compile(r"-----BEGIN ([A-Z ]+)-----([\s\S]*?)-----END [A-Z ]+-----")
 
@@ -1,22 +1,33 @@
-import traceback
+import os
+import subprocess
 import uuid
 
 import select
 import ssl
 import socket
-from threading import Thread
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Thread
+from time import monotonic, perf_counter
+from typing import Callable, Union
 from uuid import UUID
 
-from ceptic.common import Constants, CepticException, CepticStatusCode
+from ceptic.admission import AdmissionController
+from ceptic.common import Constants, CepticException, CepticStatusCode, CepticCapability
 from ceptic.encode import EncodeGetter, UnknownEncodingException
+from ceptic.handoff import spawn_with_listen_socket
 from ceptic.endpoint import EndpointManager, CommandSettings, EndpointEntry, EndpointValue, EndpointManagerException, \
     ServerSettings
+from ceptic.handshake import ClientHandshake, ServerHandshake
 from ceptic.interfaces import IRemovableManagers
+from ceptic.log import endpoint_logger, server_logger, enable_verbose_logging
+from ceptic.metrics import CepticMetrics
+from ceptic.openmetrics import MetricsExporter, render_openmetrics
+from ceptic.profiling import Profiler
 from ceptic.net import SocketCeptic
-from ceptic.security import SecuritySettings
-from ceptic.stream import StreamFrame, StreamHandlerInternal, StreamManager, CepticRequest, StreamSettings, \
-    CepticResponse, StreamTotalDataSizeException, StreamException, StreamHandler
+from ceptic.security import SecuritySettings, get_tls_session_stats
+from ceptic.tracing import CepticHooks, HookRegistry
+from ceptic.stream import StreamHandlerInternal, StreamManager, CepticRequest, StreamSettings, \
+    CepticResponse, StreamTotalDataSizeException, StreamException, StreamHandler, SafeCounter, Reaper
 
 
 class SettingsBoundedResult(object):
@@ -48,7 +59,13 @@ def check_if_settings_bounded(client_min: int, client_max: int, server_min: int,
 
 
 class CepticServer(IRemovableManagers):
-    def __init__(self, security: SecuritySettings, settings: ServerSettings = None):
+    def __init__(self, security: SecuritySettings, settings: ServerSettings = None,
+                 listen_socket: Union[socket.socket, int, None] = None):
+        """
+        :param listen_socket: already bound socket, or its fd, to accept connections on instead of binding to port in
+        settings; used to take over listening socket of a previous process, see ceptic.handoff. Server owns given socket
+        and closes it once stopped
+        """
         super()
         self.managers: dict[UUID, StreamManager] = dict()
         self.settings = settings if settings else ServerSettings()
@@ -60,7 +77,42 @@ class CepticServer(IRemovableManagers):
         self.run_thread.daemon = self.settings.daemon
         self.should_stop = False
         self.stopped = False
-        self.delay = 0.5
+        # seconds given to in-flight streams to finish once stopped
+        self.drain_timeout = 0.0
+        # set whenever a manager is added, stops or runs out of streams while going away, to wake draining
+        self.drain_event = Event()
+        # bound in start, unless given
+        if isinstance(listen_socket, int):
+            listen_socket = socket.socket(fileno=listen_socket)
+        self.server_socket: Union[socket.socket, None] = listen_socket
+        # stop writes to this pair to wake accept loop, which otherwise waits without timeout
+        self.wakeup_receiver, self.wakeup_sender = socket.socketpair()
+        # handshakes are done on a bounded pool, off of the accept loop
+        self.handshake_executor = ThreadPoolExecutor(max_workers=self.settings.handshake_max_count,
+                                                     thread_name_prefix="CepticServerHandshake")
+        self.handshake_counter = SafeCounter()
+        # streams are handled on a bounded pool, if set; streams wait in its queue while all workers are busy
+        self.worker_executor: Union[ThreadPoolExecutor, None] = None
+        if self.settings.worker_max_count:
+            self.worker_executor = ThreadPoolExecutor(max_workers=self.settings.worker_max_count,
+                                                      thread_name_prefix="CepticServerWorker")
+        # tls handshakes done and how many of them resumed a previous session
+        self.tls_handshake_counter = SafeCounter()
+        self.tls_resumed_counter = SafeCounter()
+        # expires idle handlers and managers, and keeps healthy managers alive
+        self.reaper = Reaper()
+        self.metrics = CepticMetrics(StreamManager.FRAME_TYPE_NAMES)
+        self.metrics_exporter: Union[MetricsExporter, None] = None
+        # tracing hooks, shared with managers
+        self.hooks = HookRegistry()
+        # profiles sampled requests per route
+        self.profiler = Profiler(self.settings.profile_sample_rate, self.settings.profile_cprofile)
+        # server-wide stream and byte limits, and load shedding
+        self.admission = AdmissionController(self.settings.stream_max_count, self.settings.inflight_bytes_max,
+                                             self.settings.shed_target, self.settings.shed_interval)
+        # verbose servers log to stdout; otherwise logging is left to application
+        if self.settings.verbose:
+            enable_verbose_logging()
 
     # region Security
     def setup_security(self) -> None:
@@ -83,17 +135,88 @@ class CepticServer(IRemovableManagers):
         if self.security.local_cert:
             ssl_context.load_cert_chain(certfile=self.security.local_cert, keyfile=self.security.local_key,
                                         password=self.security.key_password)
-        # if remote_cert present, attempt to load client cert
+        # if remote_cert present, attempt to load client cert and require clients to present a matching cert
         if self.security.remote_cert or self.security.remote_certs_path:
             ssl_context.load_verify_locations(cafile=self.security.remote_cert,
                                               capath=self.security.remote_certs_path)
-        ssl_context.check_hostname = self.security.verify_remote
+            if self.security.verify_remote:
+                ssl_context.verify_mode = ssl.CERT_REQUIRED
+        # clients have no hostname to check
+        ssl_context.check_hostname = False
+        # issue session tickets so that reconnecting clients can skip full handshake
+        if self.security.session_resumption:
+            ssl_context.options &= ~ssl.OP_NO_TICKET
+            ssl_context.num_tickets = self.security.session_ticket_count
+        else:
+            ssl_context.options |= ssl.OP_NO_TICKET
+            ssl_context.num_tickets = 0
         self.ssl_context = ssl_context
 
     @property
     def secure(self) -> bool:
         return self.security.secure
 
+    def get_tls_session_stats(self) -> dict[str, Union[int, float]]:
+        return get_tls_session_stats(self.tls_handshake_counter.value, self.tls_resumed_counter.value)
+
+    # endregion
+
+    # region Stats
+    def get_stats(self, per_manager: bool = False) -> dict:
+        """
+        Returns counters and histograms of all managers, current and removed, along with connection, handshake, request
+        latency per route, and tls stats. Durations are in seconds.
+        :param per_manager: if true, also include stats of each current manager
+        """
+        stats = self.metrics.get_stats(list(self.managers.values()), per_manager)
+        stats["tls"] = self.get_tls_session_stats()
+        stats["admission"] = self.admission.get_stats()
+        return stats
+
+    def get_openmetrics(self) -> str:
+        """
+        Returns stats in OpenMetrics text format, as served by metrics exporter.
+        """
+        return render_openmetrics(self.metrics, list(self.managers.values()), self.get_tls_session_stats())
+
+    # endregion
+
+    # region Hooks
+    def add_hooks(self, hooks: CepticHooks) -> None:
+        """
+        Register hooks to be called on connections, streams, frames and endpoints of this server.
+        """
+        self.hooks.add(hooks)
+
+    def remove_hooks(self, hooks: CepticHooks) -> bool:
+        return self.hooks.remove(hooks)
+
+    # endregion
+
+    # region Profiling
+    def set_profiling(self, sample_rate: float, use_cprofile: bool = False) -> None:
+        """
+        Profile given fraction of requests from now on; 0.0 stops profiling. Profiles gathered so far are kept.
+        :param use_cprofile: if true, also profile functions called while handling sampled requests
+        """
+        self.profiler.configure(sample_rate, use_cprofile)
+
+    def get_profile_stats(self) -> dict[str, dict]:
+        """
+        Returns count of sampled requests, wall and cpu time, and time per phase, summed per route. Durations are in
+        seconds.
+        """
+        return self.profiler.get_stats()
+
+    def dump_profile(self, sort: str = "cumulative", limit: int = 30) -> str:
+        """
+        Returns readable time breakdown per route, along with cprofile stats if enabled.
+        """
+        return self.profiler.dump(sort, limit)
+
+    def reset_profile(self) -> None:
+        self.profiler.reset()
+
     # endregion
 
     # region Add Commands and Routes
@@ -107,188 +230,351 @@ class CepticServer(IRemovableManagers):
 
     # region Start
     def start(self) -> None:
+        """
+        Bind server socket, unless one was given, and start accepting connections on own thread. Raises if socket
+        cannot be bound, so server is accepting once this returns.
+        """
+        # bind exporter before anything else, so that a taken metrics port is raised to caller
+        if self.settings.metrics_port >= 0:
+            self.metrics_exporter = MetricsExporter(self.get_openmetrics, self.settings.metrics_host,
+                                                    self.settings.metrics_port)
+            self.metrics_exporter.start()
+        try:
+            self.setup_server_socket()
+        except Exception:
+            if self.metrics_exporter:
+                self.metrics_exporter.stop()
+            raise
         self.run_thread.start()
 
-    def run(self) -> None:
-        server_socket: Union[socket.socket, None] = None
-        try:
-            if self.settings.verbose:
-                print(f"ceptic server started - version {self.settings.version} on port {self.settings.port} "
-                      f"(secure: {self.security.secure})")
-            # create tcp socket
+    def setup_server_socket(self) -> None:
+        if self.server_socket is None:
             server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            server_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-            server_socket.settimeout(5)
-            # bind to port
             try:
+                # allow binding while connections of a previous server on port are in TIME_WAIT
+                if os.name != "nt":
+                    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                server_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                 server_socket.bind(("", self.settings.port))
             except Exception as e:
-                if self.settings.verbose:
-                    print(f"Issue while binding server_socket: {str(e)}")
-                self.should_stop = True
-                return
-            # queue up to request queue size
-            server_socket.listen(self.settings.request_queue_size)
-            socket_list = [server_socket]
+                server_logger.error("issue while binding server socket to port %d: %s", self.settings.port, e)
+                server_socket.close()
+                raise
+            self.server_socket = server_socket
+        # processes sharing socket during a hand off are all woken by a connection, but only one gets it
+        self.server_socket.setblocking(False)
+        # queue up to request queue size; listening again on a given socket only updates its queue size
+        self.server_socket.listen(self.settings.request_queue_size)
+
+    @property
+    def port(self) -> int:
+        """
+        Port server socket is bound to; differs from port in settings if socket was given or port 0 was used.
+        """
+        if self.server_socket is None:
+            return self.settings.port
+        return self.server_socket.getsockname()[1]
+
+    def run(self) -> None:
+        server_socket = self.server_socket
+        try:
+            server_logger.info("ceptic server started - version %s on port %d (secure: %s)", self.settings.version,
+                               self.port, self.security.secure)
+            socket_list = [server_socket, self.wakeup_receiver]
             # repeatedly accept client sockets
             while not self.should_stop:
-                ready_to_read, ready_to_write, in_error = select.select(socket_list, [], [], self.delay)
-                for sock in ready_to_read:
-                    # server socket is only one in list, so assume it's the one
-                    # establish a connection
+                ready_to_read, ready_to_write, in_error = select.select(socket_list, [], [])
+                # if woken up by stop, loop condition will end loop
+                if server_socket not in ready_to_read:
+                    continue
+                # establish a connection
+                try:
                     raw_s, addr = server_socket.accept()
-                    # enable socket blocking and no delay
-                    raw_s.setblocking(True)
-                    raw_s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-                    client_thread = Thread(target=self.create_new_manager, args=(raw_s, addr))
-                    client_thread.daemon = True
-                    client_thread.start()
-        except Exception as e:
-            raise
+                except BlockingIOError:
+                    continue
+                raw_s.setblocking(True)
+                # if too many handshakes are already in progress, drop connection
+                if self.handshake_counter.value >= self.settings.handshake_max_count:
+                    server_logger.warning("handshake limit of %d reached, dropping connection from %s",
+                                          self.settings.handshake_max_count, addr, extra={"address": addr})
+                    raw_s.close()
+                    self.metrics.connections_rejected.increment()
+                    continue
+                # if server-wide connection limit is reached, drop connection
+                if self.settings.connection_max_count and \
+                        len(self.managers) + self.handshake_counter.value >= self.settings.connection_max_count:
+                    server_logger.warning("connection limit of %d reached, dropping connection from %s",
+                                          self.settings.connection_max_count, addr, extra={"address": addr})
+                    raw_s.close()
+                    self.metrics.connections_rejected.increment()
+                    continue
+                # enable no delay and perform handshake on handshake pool
+                raw_s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.handshake_counter.increment()
+                self.handshake_executor.submit(self.handle_handshake, raw_s, addr)
         finally:
             # server is closing
             self.should_stop = True
-            # shut down server socket
-            if server_socket:
-                try:
-                    server_socket.shutdown(socket.SHUT_RDWR)
-                except IOError as e:
-                    if self.settings.verbose:
-                        print(f"Issue while shutting down server_socket: {type(e)},{str(e)}")
-                try:
-                    server_socket.close()
-                except Exception as e:
-                    if self.settings.verbose:
-                        print(f"Issue while closing server_socket: {type(e)},{str(e)}")
-            # shut down managers
+            # close server socket; not shut down, since a process it was handed off to may still be accepting on it
+            try:
+                server_socket.close()
+            except Exception as e:
+                server_logger.warning("issue while closing server socket: %s: %s", type(e).__name__, e)
+            for wakeup_socket in (self.wakeup_receiver, self.wakeup_sender):
+                wakeup_socket.close()
+            # stop handshake pool; in-progress handshakes end by their deadline
+            self.handshake_executor.shutdown(wait=False, cancel_futures=True)
+            # let in-flight streams finish; reaper keeps expiring streams meanwhile
+            if self.drain_timeout > 0:
+                self.drain_managers(self.drain_timeout)
+            self.reaper.stop()
+            if self.metrics_exporter:
+                self.metrics_exporter.stop()
+            # shut down managers, then worker pool; streams still queued were closed along with their managers
             self.remove_all_managers()
+            if self.worker_executor:
+                self.worker_executor.shutdown(wait=False, cancel_futures=True)
             self.stopped = True
 
     # endregion
 
     # region Stop
-    def stop(self):
+    def stop(self, drain_timeout: float = 0.0) -> None:
+        """
+        Stop accepting connections and shut down. Does not block; server is done once is_stopped returns True.
+        :param drain_timeout: if positive, connections are told to go away and streams already started get up to this
+        many seconds to finish before connections are closed; otherwise connections are closed right away
+        """
+        self.drain_timeout = drain_timeout
         self.should_stop = True
+        # wake accept loop
+        try:
+            self.wakeup_sender.send(b"\0")
+        except OSError:
+            pass
 
     def is_stopped(self):
         return self.stopped
+
+    def hand_off(self, args: list[str] = None, drain_timeout: float = 30.0) -> subprocess.Popen:
+        """
+        Start a new process that takes over server socket, then stop while draining. New process should pass
+        ceptic.handoff.inherit_listen_socket() to its CepticServer; it can accept connections before this server is
+        done draining, so no connection is refused during a restart.
+        :param args: command to run; defaults to command this process was started with
+        """
+        if self.server_socket is None or self.should_stop:
+            raise CepticException("server must be running to hand off its socket")
+        process = spawn_with_listen_socket(self.server_socket, args)
+        self.stop(drain_timeout)
+        return process
     # endregion
 
     # region Connection
+    def start_new_connection(self, run: Callable[[StreamHandlerInternal], None],
+                             handler: StreamHandlerInternal) -> None:
+        if self.worker_executor is None:
+            super().start_new_connection(run, handler)
+            return
+        self.worker_executor.submit(run, handler)
+
     def handle_new_connection(self, stream: StreamHandlerInternal) -> None:
-        # store errors in request
-        errors = []
-        # get request from request data
-        request = CepticRequest.from_data(stream.read_header_data().data)
-        # begin checking validity of request
-        # check that command and endpoint are of valid length
-        if len(request.command) > Constants.COMMAND_LENGTH:
-            errors.append(f"command too long; should be no more than {Constants.COMMAND_LENGTH} but was "
-                          f"{len(request.command)}")
-        if len(request.endpoint) > Constants.ENDPOINT_LENGTH:
-            errors.append(f"endpoint too long; should be no more than {Constants.ENDPOINT_LENGTH} but was "
-                          f"{len(request.endpoint)}")
-        # if no errors yet, get endpoint from endpoint manager
-        endpoint_value: Union[EndpointValue, None] = None
-        if not errors:
-            try:
-                # get endpoint value from endpoint manager
-                endpoint_value = self.endpoint_manager.get_endpoint(request.command, request.endpoint)
-                # check that headers are valid
-                errors.extend(self.check_new_connection_headers(request))
-            except EndpointManagerException as e:
-                errors.append(str(e))
-        # if errors or no endpoint value found, send CepticResponse with BadRequest
-        if errors or endpoint_value is None:
-            stream.send_response(CepticResponse(CepticStatusCode.BAD_REQUEST, errors=errors))
-            stream.send_close()
+        # stream may have timed out or been closed while waiting for a worker
+        if stream.is_stopped():
             return
-        # otherwise send positive response and continue with endpoint function
-        stream.send_response(CepticResponse(CepticStatusCode.OK))
-        # set stream encoding, based on request header
-        try:
-            stream.set_encode(request.encoding)
-        except UnknownEncodingException as e:
-            stream.send_close(str(e))
+        # shed or limit stream before doing any work for it; request is not read. Delay is time since peer started
+        # stream, which is mostly time spent waiting in worker queue
+        rejection = self.admission.admit_stream(monotonic() - stream.created_time)
+        if rejection:
+            self.reject_stream(stream, rejection)
             return
-        # get body if content length header is present
-        if request.content_length:
+        try:
+            self.handle_admitted_stream(stream)
+        finally:
+            self.admission.release_stream()
+
+    def reject_stream(self, stream: StreamHandlerInternal, reason: str) -> None:
+        self.metrics.reject_stream(reason)
+        error = self.admission.get_error(reason)
+        endpoint_logger.debug("rejected stream: %s", error)
+        stream.send_response(CepticResponse(CepticStatusCode.SERVICE_UNAVAILABLE, errors=[error]))
+        stream.send_close(error)
+
+    def handle_admitted_stream(self, stream: StreamHandlerInternal) -> None:
+        # time requests per route; requests matching no route are not timed
+        start = perf_counter()
+        route: Union[str, None] = None
+        # request body bytes counted against in-flight limit
+        admitted_bytes = 0
+        # sampled requests are profiled per route
+        profile = self.profiler.start()
+        stream.profile = profile
+        try:
+            # store errors in request
+            errors = []
+            # get request from request data
+            data = stream.read_header_data().data
+            parse_start = perf_counter()
+            request = CepticRequest.from_data(data)
+            if profile:
+                profile.add("parse", perf_counter() - parse_start)
+            if request.trace_id is None and self.settings.trace_ids:
+                request.trace_id = uuid.uuid4().hex
+            # begin checking validity of request
+            # check that command and endpoint are of valid length
+            if len(request.command) > Constants.COMMAND_LENGTH:
+                errors.append(f"command too long; should be no more than {Constants.COMMAND_LENGTH} but was "
+                              f"{len(request.command)}")
+            if len(request.endpoint) > Constants.ENDPOINT_LENGTH:
+                errors.append(f"endpoint too long; should be no more than {Constants.ENDPOINT_LENGTH} but was "
+                              f"{len(request.endpoint)}")
+            # if no errors yet, get endpoint from endpoint manager
+            endpoint_value: Union[EndpointValue, None] = None
+            if not errors:
+                try:
+                    # get endpoint value from endpoint manager
+                    endpoint_value = self.endpoint_manager.get_endpoint(request.command, request.endpoint)
+                    # check that headers are valid
+                    errors.extend(self.check_new_connection_headers(request))
+                except EndpointManagerException as e:
+                    errors.append(str(e))
+            if endpoint_value is not None:
+                route = f"{request.command} {endpoint_value.route}"
+            # if errors or no endpoint value found, send CepticResponse with BadRequest;
+            # with eager body, any body frames already sent by client are discarded along with the handler
+            if errors or endpoint_value is None:
+                endpoint_logger.debug("bad request %s %s: %s", request.command, request.endpoint, errors)
+                stream.send_response(CepticResponse(CepticStatusCode.BAD_REQUEST, errors=errors))
+                stream.send_close()
+                return
+            # body of request counts against in-flight limit until request is done
+            rejection = self.admission.admit_bytes(request.content_length)
+            if rejection:
+                self.reject_stream(stream, rejection)
+                return
+            admitted_bytes = request.content_length
+            # set bounds of frames sent by endpoint
+            stream.stream_frame_gen.set_frame_size_bounds(endpoint_value.settings.send_frame_min_size,
+                                                          endpoint_value.settings.send_frame_max_size)
+            # set stream priority, based on request header, before anything else is sent
+            if request.priority is not None:
+                stream.set_priority(request.priority)
+            # otherwise send positive response and continue with endpoint function;
+            # with eager body, client does not wait for this response, so skip it
+            if not stream.settings.eager_body:
+                stream.send_response(CepticResponse(CepticStatusCode.OK))
+            # set stream encoding, based on request header
+            try:
+                stream.set_encode(request.encoding)
+            except UnknownEncodingException as e:
+                stream.send_close(str(e))
+                return
+            # get body if content length header is present
+            if request.content_length:
+                try:
+                    request.body = stream.read_raw(request.content_length)
+                except StreamTotalDataSizeException:
+                    stream.send_close("body received is greater than reported Content-Length")
+                    return
+            # set request stream
+            request.stream = StreamHandler(stream)
+            # perform endpoint function and get back response
+            hooks = self.hooks
+            if hooks.endpoint_start:
+                hooks.call(hooks.endpoint_start, request)
+            response: Union[CepticResponse, None] = None
+            execute_start = perf_counter()
             try:
-                request.body = stream.read_raw(request.content_length)
-            except StreamTotalDataSizeException:
-                stream.send_close("body received is greater than reported Content-Length")
+                response = endpoint_value.execute(request)
+            except Exception:
+                endpoint_logger.error("endpoint %s raised", route, exc_info=True)
+                stream.send_close("Server endpoint raised an exception")
                 return
-        # set request stream
-        request.stream = StreamHandler(stream)
-        # perform endpoint function and get back response
-        response = endpoint_value.execute(request)
-        # send response
-        stream.send_response(response)
-        # send body if content length header present
-        if response.content_length:
+            finally:
+                execute_time = perf_counter() - execute_start
+                if hooks.endpoint_end:
+                    hooks.call(hooks.endpoint_end, request, response, execute_time)
+                if profile:
+                    profile.add("endpoint", execute_time)
+            # echo trace id, so that client can correlate response
+            if request.trace_id is not None and response.trace_id is None:
+                response.trace_id = request.trace_id
+            # send response, and body if content length header present;
+            # stream may have been closed by client or timed out while endpoint was running
             try:
-                stream.send_data(response.body)
+                stream.send_response(response)
+                if response.content_length:
+                    stream.send_data(response.body)
             except StreamException as e:
                 stream.send_close("Server stream exception occurred")
-                if self.settings.verbose:
-                    print(f"StreamException type {type(e)} raised while sending response body: {str(e)}")
+                server_logger.warning("%s raised while sending response to %s: %s", type(e).__name__, route, e)
                 return
-        # close connection
-        stream.send_close("Server command complete")
+            # close connection
+            stream.send_close("Server command complete")
+        finally:
+            self.admission.release_bytes(admitted_bytes)
+            if route:
+                self.metrics.observe_request(route, perf_counter() - start)
+            if profile:
+                self.profiler.finish(profile, route)
     # endregion
 
     # region Managers
+    def handle_handshake(self, raw_s: socket.socket, addr: any) -> None:
+        try:
+            if self.hooks.connection_accepted:
+                self.hooks.call(self.hooks.connection_accepted, addr)
+            self.create_new_manager(raw_s, addr)
+        finally:
+            self.handshake_counter.decrement()
+
     def create_new_manager(self, raw_s: socket.socket, addr: any) -> None:
+        # entire handshake, including tls, must be done by deadline
+        start = monotonic()
+        deadline = start + self.settings.handshake_timeout
+        s: Union[SocketCeptic, None] = None
         try:
-            if self.settings.verbose:
-                print(f"Got a connection from {addr}")
+            server_logger.debug("got a connection from %s", addr, extra={"address": addr})
             # wrap with SSL
-            s: Union[SocketCeptic, None] = None
             if self.security.secure:
                 try:
-                    ssl_s: ssl.SSLSocket = self.ssl_context.wrap_socket(raw_s, server_side=True)
+                    ssl_s: ssl.SSLSocket = self.ssl_context.wrap_socket(raw_s, server_side=True,
+                                                                        do_handshake_on_connect=False)
                     # wrap as SocketCeptic
                     s = SocketCeptic(ssl_s)
+                    self.do_tls_handshake(ssl_s, deadline)
+                    self.tls_handshake_counter.increment()
+                    if ssl_s.session_reused:
+                        self.tls_resumed_counter.increment()
                 except ssl.SSLError as e:
                     raise CepticException(f"Could not authenticate client: {e}") from e
             else:
                 # wrap as SocketCeptic
                 s = SocketCeptic(raw_s)
 
-            # get client version
-            client_version = s.recv_raw_str(16).strip()
-            # get client frame min size
-            client_frame_min_size_str = s.recv_raw_str(16).strip()
-            # get client frame max size
-            client_frame_max_size_str = s.recv_raw_str(16).strip()
-            # get client headers min size
-            client_headers_min_size_str = s.recv_raw_str(16).strip()
-            # get client headers max size
-            client_headers_max_size_str = s.recv_raw_str(16).strip()
-            # get client stream min timeout
-            client_stream_min_timeout_str = s.recv_raw_str(4).strip()
-            # get client stream timeout
-            client_stream_timeout_str = s.recv_raw_str(4).strip()
+            # get all client settings at once; compact or legacy format is detected by first byte
+            client_data = ClientHandshake.recv_bytes_by_deadline(s, deadline)
+            is_compact = ClientHandshake.is_compact(client_data)
+            # legacy clients that requested capabilities expect them in response
+            send_capabilities = not is_compact and ClientHandshake.requested_capabilities_legacy(client_data)
 
             errors = []
             stream_settings: Union[StreamSettings, None] = None
             # see if values are acceptable
             try:
-                client_frame_min_size = int(client_frame_min_size_str)
-                client_frame_max_size = int(client_frame_max_size_str)
-                client_headers_min_size = int(client_headers_min_size_str)
-                client_headers_max_size = int(client_headers_max_size_str)
-                client_stream_min_timeout = int(client_stream_min_timeout_str)
-                client_stream_timeout = int(client_stream_timeout_str)
+                if is_compact:
+                    client = ClientHandshake.from_bytes(client_data)
+                else:
+                    client = ClientHandshake.from_legacy_bytes(client_data)
                 # check value bounds
-                frame_max_size = check_if_settings_bounded(client_frame_min_size, client_frame_max_size,
+                frame_max_size = check_if_settings_bounded(client.frame_min_size, client.frame_max_size,
                                                            self.settings.frame_min_size, self.settings.frame_max_size,
                                                            "frame size")
-                headers_max_size = check_if_settings_bounded(client_headers_min_size, client_headers_max_size,
+                headers_max_size = check_if_settings_bounded(client.headers_min_size, client.headers_max_size,
                                                              self.settings.headers_min_size,
                                                              self.settings.headers_max_size,
                                                              "header size")
-                stream_timeout = check_if_settings_bounded(client_stream_min_timeout, client_stream_timeout,
+                stream_timeout = check_if_settings_bounded(client.stream_min_timeout, client.stream_timeout,
                                                            self.settings.stream_min_timeout,
                                                            self.settings.stream_timeout,
                                                            "frame size")
@@ -299,56 +585,144 @@ class CepticServer(IRemovableManagers):
                     errors.append(headers_max_size.error)
                 if stream_timeout.has_error():
                     errors.append(stream_timeout.error)
+                capabilities = client.capabilities & self.settings.capabilities
+                # flow control needs windows, which only compact handshake carries;
+                # a peer advertising a window too small to fit a frame could never be sent to
+                if not is_compact or min(client.stream_window_size, client.connection_window_size) < \
+                        frame_max_size.value:
+                    capabilities &= ~CepticCapability.FLOW_CONTROL
                 # create stream settings
                 stream_settings = StreamSettings(self.settings.send_buffer_size, self.settings.read_buffer_size,
                                                  frame_max_size.value, headers_max_size.value, stream_timeout.value,
-                                                 self.settings.handler_max_count)
+                                                 self.settings.handler_max_count, capabilities,
+                                                 self.settings.stream_window_size,
+                                                 self.settings.connection_window_size,
+                                                 client.stream_window_size, client.connection_window_size)
                 stream_settings.verbose = self.settings.verbose
-            except ValueError:
-                errors.append(f"Client's thresholds were not all integers:"
-                              f"{client_frame_min_size_str},{client_frame_max_size_str},"
-                              f"{client_headers_min_size_str},{client_headers_max_size_str},"
-                              f"{client_stream_min_timeout_str},{client_stream_timeout_str}")
-            # send response
+            except ValueError as e:
+                errors.append(f"Client's settings could not be parsed: {e}")
             # if errors present, send negative response with explanation
             if len(errors) > 0 or not stream_settings:
-                s.send_raw_str("n")
-                error_string = ", ".join(errors)[0:1024]  # limit error str to max 1024 characters
-                s.send_str(error_string)
-                if self.settings.verbose:
-                    print("Client not compatible with server settings, connection terminated.")
+                response = ServerHandshake.rejected(", ".join(errors))
+            # otherwise send positive response along with decided values
+            else:
+                response = ServerHandshake(stream_settings.frame_max_size, stream_settings.headers_max_size,
+                                           stream_settings.stream_timeout, stream_settings.handler_max_count,
+                                           stream_settings.capabilities, stream_settings.stream_window_size,
+                                           stream_settings.connection_window_size)
+            if is_compact:
+                response.send(s)
+            else:
+                response.send_legacy(s, send_capabilities)
+            if not response.accepted:
+                server_logger.info("client %s not compatible with server settings, connection terminated: %s", addr,
+                                   response.error, extra={"address": addr})
                 s.close()
+                self.metrics.connections_rejected.increment()
                 return
-            # otherwise send positive response along with decided values
-            s.send_raw_str("y")
-            s.send_raw_str(f"{stream_settings.frame_max_size:>16}")
-            s.send_raw_str(f"{stream_settings.headers_max_size:>16}")
-            s.send_raw_str(f"{stream_settings.stream_timeout:>4}")
-            s.send_raw_str(f"{stream_settings.handler_max_count:>4}")
+            # handshake complete; manager's socket blocks with no timeout
+            s.settimeout(None)
             # create manager
-            manager = StreamManager(s, uuid.uuid4(), "manager", stream_settings, removable=self, is_server=True)
+            manager = StreamManager(s, uuid.uuid4(), "manager", stream_settings, removable=self, is_server=True,
+                                    hooks=self.hooks)
             self.add_manager(manager)
+            duration = monotonic() - start
+            # call hooks before manager starts, so that they come before any of its streams
+            if self.hooks.handshake_done:
+                self.hooks.call(self.hooks.handshake_done, manager, duration)
             manager.start()
+            self.metrics.connections_opened.increment()
+            self.metrics.handshake_time.observe(duration)
         except CepticException as e:
-            if self.settings.verbose:
-                print(f"Issue with create_new_manager: {type(e)},{str(e)}")
-        except Exception as e:
-            if self.settings.verbose:
-                print(f"Unexpected issue with create_new_manager {type(e)},{str(e)}")
-                raise
+            server_logger.info("handshake with %s failed: %s: %s", addr, type(e).__name__, e, extra={"address": addr})
+            self.close_handshake_socket(s, raw_s)
+            self.metrics.connections_rejected.increment()
+        except Exception:
+            server_logger.error("unexpected issue during handshake with %s", addr, exc_info=True,
+                                extra={"address": addr})
+            self.close_handshake_socket(s, raw_s)
+            self.metrics.connections_rejected.increment()
+            raise
+
+    @staticmethod
+    def do_tls_handshake(ssl_s: ssl.SSLSocket, deadline: float) -> None:
+        """
+        Perform non-blocking tls handshake, raising CepticException if not done by deadline.
+        """
+        ssl_s.setblocking(False)
+        while True:
+            try:
+                ssl_s.do_handshake()
+                break
+            except ssl.SSLWantReadError:
+                read_list, write_list = [ssl_s], []
+            except ssl.SSLWantWriteError:
+                read_list, write_list = [], [ssl_s]
+            remaining = deadline - monotonic()
+            if remaining <= 0 or not any(select.select(read_list, write_list, [], remaining)[0:2]):
+                raise CepticException("TLS handshake was not completed before deadline")
+
+    @staticmethod
+    def close_handshake_socket(s: Union[SocketCeptic, None], raw_s: socket.socket) -> None:
+        try:
+            if s:
+                s.close()
+            else:
+                raw_s.close()
+        except OSError:
+            pass
 
     def add_manager(self, manager: StreamManager) -> None:
         # add manager to dict
         self.managers[manager.manager_id] = manager
+        self.reaper.add_manager(manager)
+        self.drain_event.set()
+
+    def handle_stopped_manager(self, manager: StreamManager) -> None:
+        # stopped managers are forgotten right away, so that dead connections hold no handlers or buffers
+        self.forget_manager(manager)
+        self.drain_event.set()
+
+    def handle_drained_manager(self, manager: StreamManager) -> None:
+        self.drain_event.set()
 
     def remove_manager(self, manager_id: UUID) -> Union[StreamManager, None]:
-        # remove manager from dict and stop it
-        try:
-            manager = self.managers.pop(manager_id)
-            manager.stop("removed by CepticServer")
-            return manager
-        except KeyError:
+        # stop manager and remove it from dict
+        manager = self.managers.get(manager_id)
+        if manager is None:
             return None
+        manager.stop("removed by CepticServer")
+        self.forget_manager(manager)
+        return manager
+
+    def forget_manager(self, manager: StreamManager) -> None:
+        # whichever of stopping and removing pops manager first retires it, so that it is only counted once
+        if self.managers.pop(manager.manager_id, None) is None:
+            return
+        self.reaper.remove_manager(manager)
+        self.metrics.retire(manager.metrics)
+
+    def drain_managers(self, timeout: float) -> None:
+        """
+        Tell managers to go away, then wait up to timeout for them to be done with streams already started.
+        """
+        deadline = monotonic() + timeout
+        server_logger.info("draining %d connections for up to %.1f seconds", len(self.managers), timeout)
+        while True:
+            # cleared before checking, so that a manager finishing after check still wakes wait below
+            self.drain_event.clear()
+            # handshakes that were in progress may still add managers
+            managers = list(self.managers.values())
+            for manager in managers:
+                manager.go_away()
+            if all(manager.is_drained() for manager in managers):
+                break
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                server_logger.warning("drain timed out with %d streams still open",
+                                      sum(manager.get_handler_count() for manager in managers))
+                break
+            self.drain_event.wait(remaining)
 
     def remove_all_managers(self) -> list[StreamManager]:
         # remove all managers
@@ -374,5 +748,11 @@ class CepticServer(IRemovableManagers):
                 EncodeGetter.get(request.encoding)
             except UnknownEncodingException as e:
                 errors.append(str(e))
+        # check that priority is an integer; out of range values are clamped
+        if request.priority is not None and (not isinstance(request.priority, int) or
+                                             isinstance(request.priority, bool)):
+            errors.append(f"Priority must be an integer, not {request.priority}")
+        if request.trace_id is not None and not isinstance(request.trace_id, str):
+            errors.append(f"Trace-Id must be a string, not {request.trace_id}")
         return errors
     # endregion
@@ -1,18 +1,23 @@
 import json
+import struct
 import traceback
-import uuid
 from collections import deque
 
-from time import time, sleep
+from math import ceil
+from time import time, monotonic, perf_counter
 from enum import Enum
 from uuid import UUID
-from threading import Lock, Event, Thread
-from queue import SimpleQueue, Empty as QueueEmptyError
-from typing import IO, Generator, Iterable, Union, List
+from threading import Lock, Event, Thread, Condition
+from typing import IO, Generator, Iterable, Union, List, Callable
 
 from ceptic.interfaces import IRemovableManagers
-from ceptic.common import CepticException, Constants, CepticHeaders, CepticRequestVerifyException, CepticStatusCode
+from ceptic.common import CepticException, Constants, CepticHeaders, CepticRequestVerifyException, CepticStatusCode, \
+    CepticCapability
 from ceptic.encode import EncodeHandler, EncodeNone, EncodeGetter
+from ceptic.log import frame_log, stream_logger
+from ceptic.metrics import Histogram, ManagerMetrics
+from ceptic.profiling import RequestProfile
+from ceptic.tracing import HookRegistry
 from ceptic.net import SocketCeptic, SocketCepticException
 
 
@@ -39,10 +44,25 @@ class StreamHandlerStoppedException(StreamException):
     pass
 
 
+class StreamRefusedException(StreamClosedException):
+    """
+    Stream exception caused by peer refusing stream because its connection is going away; stream was not processed,
+    so it is safe to retry on another connection.
+    """
+    pass
+
+
 class StreamTotalDataSizeException(StreamException):
     pass
 
 
+class StreamFlowControlException(StreamException):
+    """
+    Stream exception caused by peer sending more than its flow control window allowed.
+    """
+    pass
+
+
 # endregion
 
 
@@ -53,6 +73,8 @@ class StreamFrameType(Enum):
     KEEP_ALIVE = 3
     CLOSE = 4
     CLOSE_ALL = 5
+    WINDOW_UPDATE = 6
+    GOAWAY = 7
 
     __slots__ = ("byte_value",)
 
@@ -80,19 +102,49 @@ class StreamFrame(object):
     """
     Stores data for a frame in a specific stream.
     """
-    __slots__ = ("stream_id", "type", "info", "data")
+    __slots__ = ("stream_id", "type", "info", "data", "pooled")
 
-    NULL_ID = uuid.UUID(int=0)
+    # stream ids are ints; legacy format sends them as UUID strings, where NULL_ID is the nil UUID
+    NULL_ID = 0
     ZERO_DATA_LENGTH = "0000000000000000".encode()
     PREFIX_SIZE = 38
+    # compact format, if negotiated: stream id, type, info, data length
+    COMPACT_HEADER = struct.Struct("!QBBI")
 
-    def __init__(self, stream_id: uuid.UUID, frame_type: StreamFrameType, frame_info: StreamFrameInfo,
+    def __init__(self, stream_id: int, frame_type: StreamFrameType, frame_info: StreamFrameInfo,
                  data: bytes = bytearray()) \
             -> None:
         self.stream_id = stream_id
         self.type = frame_type
         self.info = frame_info
         self.data = data
+        # if frame may be released to a pool once done with
+        self.pooled = False
+
+    @classmethod
+    def from_pool(cls, pool: 'FreeList', stream_id: int, frame_type: 'StreamFrameType',
+                  frame_info: 'StreamFrameInfo', data: bytes) -> 'StreamFrame':
+        """
+        Reuse frame from pool, or create one that can be released to pool once nothing refers to it anymore.
+        """
+        frame = pool.get()
+        if frame is None:
+            frame = cls(stream_id, frame_type, frame_info, data)
+            frame.pooled = True
+            return frame
+        frame.stream_id = stream_id
+        frame.type = frame_type
+        frame.info = frame_info
+        frame.data = data
+        return frame
+
+    def release(self, pool: 'FreeList') -> None:
+        """
+        Return frame to pool, if it came from one; frame must not be used afterwards.
+        """
+        if self.pooled:
+            self.data = b""
+            pool.put(self)
 
     @property
     def size(self) -> int:
@@ -107,12 +159,16 @@ class StreamFrame(object):
     def decode_data(self, encoder: EncodeHandler) -> None:
         self.data = encoder.decode(self.data)
 
-    def send(self, s: SocketCeptic) -> None:
+    def send(self, s: SocketCeptic, compact: bool = False) -> None:
         """
-        Send frame through SocketCeptic instance.
+        Send frame through SocketCeptic instance, as one compact message if compact frames were negotiated.
         """
+        if compact:
+            s.send_raw(self.COMPACT_HEADER.pack(self.stream_id, self.type.value, self.info.value, len(self.data))
+                       + self.data)
+            return
         # send stream id
-        s.send_raw(str(self.stream_id).encode())  # TODO: replace with raw bytes
+        s.send_raw(str(UUID(int=self.stream_id)).encode())
         # send type
         s.send_raw(bytes(self.type))
         # send info
@@ -124,12 +180,15 @@ class StreamFrame(object):
             s.send_raw(self.ZERO_DATA_LENGTH)
 
     @classmethod
-    def from_socket(cls, s: SocketCeptic, max_data_length: int) -> 'StreamFrame':
+    def from_socket(cls, s: SocketCeptic, max_data_length: int, pool: 'FreeList' = None,
+                    compact: bool = False) -> 'StreamFrame':
+        if compact:
+            return cls.from_socket_compact(s, max_data_length, pool)
         # get stream id
         raw_string_id = None
         try:
             raw_string_id = s.recv_raw(36).decode()
-            stream_id = uuid.UUID(raw_string_id)
+            stream_id = UUID(raw_string_id).int
         except ValueError as e:
             raise StreamFrameSizeException(f"Received stream id could not be parsed to UUID: {raw_string_id}") from e
         # get type
@@ -161,6 +220,31 @@ class StreamFrame(object):
         data = bytearray()
         if data_length > 0:
             data = s.recv_raw(data_length)
+        if pool is not None:
+            return cls.from_pool(pool, stream_id, frame_type, frame_info, data)
+        return cls(stream_id, frame_type, frame_info, data)
+
+    @classmethod
+    def from_socket_compact(cls, s: SocketCeptic, max_data_length: int, pool: 'FreeList' = None) -> 'StreamFrame':
+        raw_header = s.recv_raw(cls.COMPACT_HEADER.size)
+        try:
+            stream_id, raw_frame_type, raw_frame_info, data_length = cls.COMPACT_HEADER.unpack(raw_header)
+        except struct.error as e:
+            raise StreamFrameSizeException(f"Received frame header could not be unpacked: {e}") from e
+        try:
+            frame_type = StreamFrameType(raw_frame_type)
+            frame_info = StreamFrameInfo(raw_frame_info)
+        except ValueError as e:
+            raise StreamFrameSizeException(f"Received type or info could not be parsed: {raw_frame_type},"
+                                           f"{raw_frame_info}") from e
+        if data_length > max_data_length:
+            raise StreamFrameSizeException(f"Data length {data_length} greater than allowed max length of "
+                                           f"{max_data_length}")
+        data = bytearray()
+        if data_length > 0:
+            data = s.recv_raw(data_length)
+        if pool is not None:
+            return cls.from_pool(pool, stream_id, frame_type, frame_info, data)
         return cls(stream_id, frame_type, frame_info, data)
 
     # region Checks
@@ -182,6 +266,15 @@ class StreamFrame(object):
     def is_close_all(self) -> bool:
         return self.type == StreamFrameType.CLOSE_ALL
 
+    def is_window_update(self) -> bool:
+        return self.type == StreamFrameType.WINDOW_UPDATE
+
+    def is_goaway(self) -> bool:
+        return self.type == StreamFrameType.GOAWAY
+
+    def is_flow_controlled(self) -> bool:
+        return self.type in (StreamFrameType.DATA, StreamFrameType.HEADER, StreamFrameType.RESPONSE)
+
     def is_last(self) -> bool:
         return self.info == StreamFrameInfo.END
 
@@ -199,72 +292,98 @@ class StreamFrame(object):
     # region Frame Creation
     # Header Frames
     @classmethod
-    def create_header(cls, stream_id: uuid.UUID, data: bytes, info: StreamFrameInfo) -> 'StreamFrame':
+    def create_header(cls, stream_id: int, data: bytes, info: StreamFrameInfo) -> 'StreamFrame':
         return cls(stream_id, StreamFrameType.HEADER, info, data)
 
     @classmethod
-    def create_header_last(cls, stream_id: uuid.UUID, data: bytes) -> 'StreamFrame':
+    def create_header_last(cls, stream_id: int, data: bytes) -> 'StreamFrame':
         return cls.create_header(stream_id, data, StreamFrameInfo.END)
 
     @classmethod
-    def create_header_continued(cls, stream_id: uuid.UUID, data: bytes) -> 'StreamFrame':
+    def create_header_continued(cls, stream_id: int, data: bytes) -> 'StreamFrame':
         return cls.create_header(stream_id, data, StreamFrameInfo.CONTINUE)
 
     # Response Frames
     @classmethod
-    def create_response(cls, stream_id: uuid.UUID, data: bytes, info: StreamFrameInfo) -> 'StreamFrame':
+    def create_response(cls, stream_id: int, data: bytes, info: StreamFrameInfo) -> 'StreamFrame':
         return cls(stream_id, StreamFrameType.RESPONSE, info, data)
 
     @classmethod
-    def create_response_last(cls, stream_id: uuid.UUID, data: bytes) -> 'StreamFrame':
+    def create_response_last(cls, stream_id: int, data: bytes) -> 'StreamFrame':
         return cls.create_response(stream_id, data, StreamFrameInfo.END)
 
     @classmethod
-    def create_response_continued(cls, stream_id: uuid.UUID, data: bytes) -> 'StreamFrame':
+    def create_response_continued(cls, stream_id: int, data: bytes) -> 'StreamFrame':
         return cls.create_response(stream_id, data, StreamFrameInfo.CONTINUE)
 
     # Data Frames
     @classmethod
-    def create_data(cls, stream_id: uuid.UUID, data: bytes, info: StreamFrameInfo) -> 'StreamFrame':
+    def create_data(cls, stream_id: int, data: bytes, info: StreamFrameInfo) -> 'StreamFrame':
         return cls(stream_id, StreamFrameType.DATA, info, data)
 
     @classmethod
-    def create_data_last(cls, stream_id: uuid.UUID, data: bytes) -> 'StreamFrame':
+    def create_data_last(cls, stream_id: int, data: bytes) -> 'StreamFrame':
         return cls.create_data(stream_id, data, StreamFrameInfo.END)
 
     @classmethod
-    def create_data_continued(cls, stream_id: uuid.UUID, data: bytes) -> 'StreamFrame':
+    def create_data_continued(cls, stream_id: int, data: bytes) -> 'StreamFrame':
         return cls.create_data(stream_id, data, StreamFrameInfo.CONTINUE)
 
     # Keep Alive Frames
     @classmethod
-    def create_keep_alive(cls, stream_id: uuid.UUID) -> 'StreamFrame':
+    def create_keep_alive(cls, stream_id: int) -> 'StreamFrame':
         return cls(stream_id, StreamFrameType.KEEP_ALIVE, StreamFrameInfo.END, bytearray())
 
     # Close Frames
     @classmethod
-    def create_close(cls, stream_id: uuid.UUID, data: bytes = bytearray()) -> 'StreamFrame':
+    def create_close(cls, stream_id: int, data: bytes = bytearray()) -> 'StreamFrame':
         return cls(stream_id, StreamFrameType.CLOSE, StreamFrameInfo.END, data)
 
     # Close All Frames
     @classmethod
-    def create_close_all(cls, stream_id: uuid.UUID) -> 'StreamFrame':
+    def create_close_all(cls, stream_id: int) -> 'StreamFrame':
         return cls(stream_id, StreamFrameType.CLOSE_ALL, StreamFrameInfo.END, bytearray())
+
+    # Window Update Frames
+    @classmethod
+    def create_window_update(cls, stream_id: int, amount: int) -> 'StreamFrame':
+        """
+        Grant peer amount more bytes of credit; NULL_ID as stream_id applies to whole connection.
+        """
+        return cls(stream_id, StreamFrameType.WINDOW_UPDATE, StreamFrameInfo.END, str(amount).encode())
+
+    # Go Away Frames
+    @classmethod
+    def create_goaway(cls) -> 'StreamFrame':
+        """
+        Tell peer that connection takes no new streams; streams already started are finished.
+        """
+        return cls(cls.NULL_ID, StreamFrameType.GOAWAY, StreamFrameInfo.END, bytearray())
     # endregion
 
 
 class StreamSettings(object):
     __slots__ = ("_send_buffer_size", "_read_buffer_size", "_frame_max_size", "_headers_max_size", "_stream_timeout",
-                 "_handler_max_count", "verbose")
+                 "_handler_max_count", "_capabilities", "_stream_window_size", "_connection_window_size",
+                 "_peer_stream_window_size", "_peer_connection_window_size", "verbose")
 
     def __init__(self, send_buffer_size: int, read_buffer_size: int, frame_max_size: int, headers_max_size: int,
-                 stream_timeout: int, handler_max_count: int) -> None:
+                 stream_timeout: int, handler_max_count: int,
+                 capabilities: CepticCapability = CepticCapability.NONE,
+                 stream_window_size: int = 0, connection_window_size: int = 0,
+                 peer_stream_window_size: int = 0, peer_connection_window_size: int = 0) -> None:
         self._send_buffer_size = send_buffer_size
         self._read_buffer_size = read_buffer_size
         self._frame_max_size = frame_max_size
         self._headers_max_size = headers_max_size
         self._stream_timeout = stream_timeout
         self._handler_max_count = handler_max_count
+        self._capabilities = capabilities
+        # windows this side advertised for receiving, and windows peer advertised for this side to send into
+        self._stream_window_size = stream_window_size
+        self._connection_window_size = connection_window_size
+        self._peer_stream_window_size = peer_stream_window_size
+        self._peer_connection_window_size = peer_connection_window_size
         self.verbose = False
 
     @property
@@ -291,6 +410,42 @@ class StreamSettings(object):
     def handler_max_count(self) -> int:
         return self._handler_max_count
 
+    @property
+    def capabilities(self) -> CepticCapability:
+        return self._capabilities
+
+    @property
+    def eager_body(self) -> bool:
+        return CepticCapability.EAGER_BODY in self._capabilities
+
+    @property
+    def flow_control(self) -> bool:
+        return CepticCapability.FLOW_CONTROL in self._capabilities
+
+    @property
+    def compact_frames(self) -> bool:
+        return CepticCapability.COMPACT_FRAMES in self._capabilities
+
+    @property
+    def goaway(self) -> bool:
+        return CepticCapability.GOAWAY in self._capabilities
+
+    @property
+    def stream_window_size(self) -> int:
+        return self._stream_window_size
+
+    @property
+    def connection_window_size(self) -> int:
+        return self._connection_window_size
+
+    @property
+    def peer_stream_window_size(self) -> int:
+        return self._peer_stream_window_size
+
+    @property
+    def peer_connection_window_size(self) -> int:
+        return self._peer_connection_window_size
+
 
 class StreamData(object):
     __slots__ = ("response", "data")
@@ -309,43 +464,182 @@ class StreamData(object):
         return self.response is None and self.data is None
 
 
+class SendScheduler(object):
+    """
+    Send queue shared by all handlers of a manager. Each stream gets its own queue, served by deficit round-robin
+    weighted by stream priority, so a large transfer on one stream cannot hold back small responses on others.
+    Window updates and keep alives go out ahead of all stream frames.
+    """
+    MIN_PRIORITY = 1
+    DEFAULT_PRIORITY = 16
+    MAX_PRIORITY = 256
+
+    def __init__(self, frame_max_size: int) -> None:
+        # bytes a stream of default priority may send per round; one full frame
+        self.quantum = frame_max_size + StreamFrame.PREFIX_SIZE
+        self._control = deque()
+        self._queues: dict[int, deque] = {}
+        self._deficits: dict[int, int] = {}
+        self._priorities: dict[int, int] = {}
+        # streams with frames waiting, in round-robin order
+        self._active = deque()
+        self._size = 0
+        # most frames ever waiting at once
+        self.peak_size = 0
+        self._stopped = False
+        self._condition = Condition()
+
+    @staticmethod
+    def is_control(frame: StreamFrame) -> bool:
+        return frame.is_window_update() or frame.is_keep_alive() or frame.is_goaway()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def get_active_count(self, exclude: int = None) -> int:
+        """
+        Returns count of streams with frames waiting to be sent, not counting excluded stream.
+        """
+        count = len(self._active)
+        if exclude in self._queues:
+            count -= 1
+        return count
+
+    def set_priority(self, stream_id: int, priority: int) -> None:
+        """
+        Set share of connection given to stream, relative to other streams; clamped to MIN_PRIORITY and MAX_PRIORITY.
+        """
+        with self._condition:
+            self._priorities[stream_id] = max(self.MIN_PRIORITY, min(priority, self.MAX_PRIORITY))
+
+    def get_priority(self, stream_id: int) -> int:
+        return self._priorities.get(stream_id, self.DEFAULT_PRIORITY)
+
+    def forget(self, stream_id: int) -> None:
+        """
+        Remove stored priority of stream; any frames still queued for stream are sent with default priority.
+        """
+        with self._condition:
+            self._priorities.pop(stream_id, None)
+
+    def stop(self) -> None:
+        """
+        Wake sender waiting in get, so that it can notice that it should stop.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def put(self, frame: StreamFrame) -> None:
+        with self._condition:
+            if self.is_control(frame):
+                self._control.append(frame)
+            else:
+                queue = self._queues.get(frame.stream_id)
+                if queue is None:
+                    queue = self._queues[frame.stream_id] = deque()
+                    self._deficits[frame.stream_id] = 0
+                    self._active.append(frame.stream_id)
+                queue.append(frame)
+            self._size += 1
+            if self._size > self.peak_size:
+                self.peak_size = self._size
+            self._condition.notify()
+
+    def get(self, timeout: float = None) -> Union[StreamFrame, None]:
+        """
+        Return next frame to send, waiting up to timeout (forever if None) for one to be put. Returns None if none were
+        put in time or scheduler was stopped.
+        """
+        with self._condition:
+            if not self._size and not self._stopped:
+                self._condition.wait(timeout)
+            if self._control:
+                self._size -= 1
+                return self._control.popleft()
+            return self._get_next_stream_frame()
+
+    def _get_next_stream_frame(self) -> Union[StreamFrame, None]:
+        while self._active:
+            stream_id = self._active[0]
+            queue = self._queues[stream_id]
+            frame = queue[0]
+            deficit = self._deficits[stream_id]
+            # if not enough credit left this round, top up and let next stream go
+            if deficit < frame.size:
+                self._deficits[stream_id] = deficit + max(1, self.get_priority(stream_id) * self.quantum
+                                                          // self.DEFAULT_PRIORITY)
+                self._active.rotate(-1)
+                continue
+            self._deficits[stream_id] = deficit - frame.size
+            queue.popleft()
+            # drop emptied queue; credit does not carry over idle periods
+            if not queue:
+                self._active.popleft()
+                del self._queues[stream_id]
+                del self._deficits[stream_id]
+            self._size -= 1
+            return frame
+        return None
+
+
 class StreamManager(object):
     """
     Manages streams of data to and from a socket.
     """
+    HANDLER_POOL_SIZE = 64
+    FRAME_POOL_SIZE = 256
+    FRAME_TYPE_NAMES = tuple(frame_type.name.lower() for frame_type in StreamFrameType)
+    # close reason of streams refused after connection started going away
+    REFUSED_REASON = "stream refused; connection is going away"
 
     def __init__(self, s: SocketCeptic, manager_id: UUID, destination: str, settings: StreamSettings,
-                 removable: IRemovableManagers, is_server: bool) -> None:
+                 removable: IRemovableManagers, is_server: bool, hooks: HookRegistry = None) -> None:
         self.s = s
         self.manager_id = manager_id
         self.destination = destination
         self.settings = settings
         self.removable = removable
         self.is_server = is_server
-        # send queue - shared by all handlers
-        self.send_buffer = SimpleQueue()
+        # send queue - shared by all handlers, scheduled by stream priority
+        self.send_buffer = SendScheduler(settings.frame_max_size)
+        self.metrics = ManagerMetrics(self.FRAME_TYPE_NAMES)
+        # hooks of owning server or client; callbacks are only checked for, so empty registry costs nothing
+        self.hooks = hooks if hooks is not None else HookRegistry()
+        # flow control - credit to send into peer's connection window, and this side's connection window
+        self.send_window = FlowWindow(settings.peer_connection_window_size, self.metrics.flow_control_waits)
+        self.receive_window = ReceiveWindow(settings.connection_window_size, settings.frame_max_size)
         # control vars
         self.should_stop_event = Event()
         self.stop_reason = ""
-        self.send_event = Event()
-        self.keep_alive_timer = Timer()
-        self.existence_timer = Timer()
+        # this side refuses new streams from peer once going away, and stops starting new streams once peer is
+        self.going_away = False
+        self.peer_going_away = False
+        # monotonic times of last frame received and sent; expiry is checked on reaper's timer wheel, if any
+        self.created_time = monotonic()
+        self.last_received_time = self.created_time
+        self.last_sent_time = self.created_time
+        self.reaper: Union['Reaper', None] = None
+        self.reaper_entry: Union['TimerWheelEntry', None] = None
         self.is_done_running_event = Event()
         self.handler_counter = SafeCounter(0)
-        # timeouts/delays
-        self.send_event_timeout = 0.1
-        self.select_timeout = 0.1
         # threads
         self.send_thread = Thread(target=self.process_sent_frames)
         self.send_thread.daemon = True
         self.receive_thread = Thread(target=self.process_received_frames)
         self.receive_thread.daemon = True
         # dict
-        self.streams: dict[uuid.UUID, StreamHandlerInternal] = {}
+        self.streams: dict[int, StreamHandlerInternal] = {}
+        # released handlers and frames kept for reuse; handlers are reused under lock, so that nothing that looks up a
+        # handler under lock can see it change streams
+        self.handler_pool = FreeList(self.HANDLER_POOL_SIZE)
+        self.released_handlers = deque()
+        self.frame_pool = FreeList(self.FRAME_POOL_SIZE)
+        self.handlers_lock = Lock()
+        # streams started by client get odd ids, and streams started by server get even ids
+        self.next_stream_id = 2 if is_server else 1
 
     def start(self) -> None:
-        # start timers
-        self.start_timers()
         # start threads
         self.send_thread.start()
         self.receive_thread.start()
@@ -355,16 +649,82 @@ class StreamManager(object):
             if not self.stop_reason:
                 self.stop_reason = reason
             self.should_stop_event.set()
+            stream_logger.debug("manager %s to %s stopping: %s", self.manager_id, self.destination, self.stop_reason)
+            # wake sender and receiver instead of waiting for them to poll; socket is closed once both have exited
+            self.send_buffer.stop()
+            self.send_window.stop()
+            self.s.shutdown()
+            for handler in list(self.streams.values()):
+                handler.stop()
+            self.removable.handle_stopped_manager(self)
+
+    def wait_until_done(self, timeout: float = None) -> bool:
+        """
+        Wait for sending and receiving threads to exit and socket to close. Returns False if timeout passed first.
+        """
+        return self.is_done_running_event.wait(timeout)
+
+    def close_when_done(self) -> None:
+        # receiver is last to exit; sender was woken by stop, so it will not take long
+        self.send_thread.join()
+        try:
+            self.s.close()
+        except OSError:
+            pass
+        self.is_done_running_event.set()
 
     def is_stopped(self) -> bool:
         return self.should_stop_event.is_set()
 
-    def start_timers(self) -> None:
-        self.existence_timer.start()
-        self.keep_alive_timer.start()
+    def go_away(self) -> None:
+        """
+        Refuse new streams from peer, letting streams already started finish. If peer negotiated GOAWAY, it is told
+        to start new streams on other connections and to close this one once its streams are done.
+        """
+        if self.going_away:
+            return
+        # queue frame first, so that peer gets it before any stream is refused
+        if self.settings.goaway:
+            self.send_buffer.put(StreamFrame.create_goaway())
+        with self.handlers_lock:
+            self.going_away = True
+
+    def handle_peer_going_away(self) -> None:
+        """
+        Stop starting new streams, and stop once streams already started are done.
+        """
+        with self.handlers_lock:
+            self.peer_going_away = True
+            drained = not self.streams
+        stream_logger.debug("manager %s to %s is going away", self.manager_id, self.destination)
+        self.removable.handle_going_away_manager(self)
+        if drained:
+            self.stop("drained after peer went away")
+
+    def is_going_away(self) -> bool:
+        return self.going_away or self.peer_going_away
+
+    def is_drained(self) -> bool:
+        """
+        Returns if manager is done after going away: stopped, or with a peer that will not close it, out of streams.
+        """
+        return self.is_stopped() or (not self.settings.goaway and not self.streams)
 
     def update_keep_alive(self) -> None:
-        self.keep_alive_timer.update()
+        self.last_received_time = monotonic()
+
+    def update_send(self) -> None:
+        self.last_sent_time = monotonic()
+
+    def get_receive_idle_time(self) -> float:
+        return monotonic() - self.last_received_time
+
+    def is_timed_out(self) -> bool:
+        # if nothing received for longer than stream_timeout, peer is gone
+        return self.get_receive_idle_time() > self.settings.stream_timeout
+
+    def is_send_idle(self, delay: float) -> bool:
+        return monotonic() - self.last_sent_time > delay
 
     # region Handler Management
     def is_handler_limit_reached(self) -> bool:
@@ -372,16 +732,142 @@ class StreamManager(object):
             return len(self.streams) >= self.settings.handler_max_count
         return False
 
-    def create_handler(self, stream_id: uuid.UUID = None) -> Union['StreamHandlerInternal', None]:
-        if self.streams.get(stream_id):
-            return None
-        handler = StreamHandlerInternal(stream_id if stream_id else uuid.uuid4(), self.settings, self.send_buffer)
-        self.streams[handler.stream_id] = handler
+    def get_handler_count(self) -> int:
+        return len(self.streams)
+
+    def get_load(self) -> tuple[int, int]:
+        """
+        Returns handler count and count of frames waiting to be sent, in that order of importance.
+        """
+        return len(self.streams), self.send_buffer.qsize()
+
+    def get_stats(self) -> dict:
+        stats = self.metrics.get_stats()
+        stats.update({
+            "manager_id": str(self.manager_id),
+            "destination": self.destination,
+            "stopped": self.is_stopped(),
+            "age": monotonic() - self.created_time,
+            "handlers_active": len(self.streams),
+            "send_queue_depth": self.send_buffer.qsize(),
+            "send_queue_peak": self.send_buffer.peak_size,
+        })
+        return stats
+
+    def create_handler(self, stream_id: int = None) -> Union['StreamHandlerInternal', None]:
+        with self.handlers_lock:
+            if stream_id is None:
+                stream_id = self.next_stream_id
+                self.next_stream_id += 2
+            if self.streams.get(stream_id):
+                return None
+            handler = self.handler_pool.get()
+            if handler:
+                handler.reset(stream_id)
+            else:
+                handler = StreamHandlerInternal(stream_id, self.settings, self.send_buffer, self)
+            self.streams[handler.stream_id] = handler
+            self.metrics.handlers_created += 1
+        if self.reaper:
+            self.reaper.add_handler(self, handler)
+        if self.hooks.stream_opened:
+            self.hooks.call(self.hooks.stream_opened, self, handler)
         return handler
 
-    def remove_handler(self, handler: 'StreamHandlerInternal') -> None:
-        handler.stop()
-        self.streams.pop(handler.stream_id, None)
+    def remove_handler(self, handler: 'StreamHandlerInternal', stream_id: int = None) -> None:
+        """
+        Stop and remove handler. If stream_id is given, handler is only removed if it is still used for that stream.
+        """
+        with self.handlers_lock:
+            if stream_id is not None and handler.stream_id != stream_id:
+                return
+            handler.stop()
+            # if already removed, handler may even be released; rest was done by whatever removed it
+            if self.streams.get(handler.stream_id) is not handler:
+                return
+            self.streams.pop(handler.stream_id, None)
+            drained = self.peer_going_away and not self.streams
+            emptied = self.going_away and not self.streams
+        if handler.timeout_entry:
+            handler.timeout_entry.cancel()
+            handler.timeout_entry = None
+        self.send_buffer.forget(handler.stream_id)
+        if self.settings.flow_control:
+            handler.settle_connection_window()
+        # handler may be reused once released
+        if self.hooks.stream_closed:
+            self.hooks.call(self.hooks.stream_closed, self, handler)
+        self.release_handler(handler)
+        if drained:
+            self.stop("drained after peer went away")
+        elif emptied:
+            self.removable.handle_drained_manager(self)
+
+    def log_frame(self, direction: str, frame: StreamFrame) -> None:
+        frame_log.debug("%s %s frame on stream %d of manager %s, %d bytes", direction, frame.type.name.lower(),
+                        frame.stream_id, self.manager_id, len(frame.data),
+                        extra={"manager_id": str(self.manager_id), "stream_id": frame.stream_id})
+
+    def is_peer_stream_id(self, stream_id: int) -> bool:
+        """
+        Returns if stream id is one that peer may start a stream with. Legacy peers choose random ids, so any non-null
+        id is allowed unless compact frames were negotiated.
+        """
+        if stream_id == StreamFrame.NULL_ID:
+            return False
+        if not self.settings.compact_frames:
+            return True
+        return stream_id % 2 == (1 if self.is_server else 0)
+
+    def release_handler(self, handler: 'StreamHandlerInternal') -> None:
+        """
+        Drop one of two references to handler: one held by manager until handler is removed, and one held by thread
+        that owns handler until it is done with it. Once both are dropped, handler can be reused.
+        """
+        if handler.release():
+            self.released_handlers.append(handler)
+
+    def recycle_released_handlers(self) -> None:
+        # called by receiving thread between frames, while it holds no handler, so that a handler it looked up is never
+        # reused for another stream while it is passing a frame to it
+        while self.released_handlers:
+            handler = self.released_handlers.popleft()
+            if not self.is_stopped():
+                self.handler_pool.put(handler)
+
+    def refuse_stream(self, handler: 'StreamHandlerInternal', frame: StreamFrame, reason: str) -> None:
+        """
+        Close stream that peer just started without running it. Handler is removed by sending thread once close frame
+        is sent; removing it here would drop close frame.
+        """
+        handler.send_close(reason)
+        self.release_handler(handler)
+        self.release_dropped_frame(frame)
+
+    def run_new_connection(self, handler: 'StreamHandlerInternal') -> None:
+        try:
+            self.removable.handle_new_connection(handler)
+        finally:
+            self.release_handler(handler)
+
+    # endregion
+
+    # region Flow Control
+    def release_connection_window(self, amount: int) -> None:
+        """
+        Mark bytes received on connection as consumed, sending credit back to peer once enough has built up.
+        """
+        credit = self.receive_window.consume(amount)
+        if credit:
+            self.send_buffer.put(StreamFrame.create_window_update(StreamFrame.NULL_ID, credit))
+
+    def release_dropped_frame(self, frame: StreamFrame) -> None:
+        """
+        Return connection credit for a frame that was not given to any handler.
+        """
+        if self.settings.flow_control and frame.is_flow_controlled():
+            self.release_connection_window(len(frame.data))
+        frame.release(self.frame_pool)
 
     # endregion
 
@@ -389,91 +875,155 @@ class StreamManager(object):
         try:
             while not self.should_stop_event.is_set():
                 # iterate through sent frames
-                try:
-                    frame: Union[StreamFrame, None] = self.send_buffer.get(block=True, timeout=self.send_event_timeout)
-                except QueueEmptyError as e:
-                    frame = None
+                frame = self.send_buffer.get()
                 if frame:
                     # if close all frame, send and then immediately stop manager
                     if frame.is_close_all():
-                        # update keep alive; close_all frame about to be sent, so stream must be active
-                        self.update_keep_alive()
+                        self.update_send()
                         try:
-                            frame.send(self.s)
+                            frame.send(self.s, self.settings.compact_frames)
                         except SocketCepticException as e:
                             self.stop("{},{}".format(type(e), str(e)))
                             break
+                        self.metrics.sent.add(frame)
+                        if self.hooks.frame_sent:
+                            self.hooks.call(self.hooks.frame_sent, self, frame)
+                        if frame_log.is_enabled():
+                            self.log_frame("sent", frame)
                         self.stop("sending close_all from handler {}".format(frame.stream_id))
                         break
-                    # get requesting handler
-                    handler = self.streams.get(frame.stream_id)
+                    # window updates, keep alives and go aways are not counted in handler buffers,
+                    # and may be addressed to connection itself
+                    if SendScheduler.is_control(frame):
+                        self.update_send()
+                        try:
+                            frame.send(self.s, self.settings.compact_frames)
+                        except SocketCepticException as e:
+                            self.stop("exception while sending frame: {}".format(e))
+                            break
+                        self.metrics.sent.add(frame)
+                        if self.hooks.frame_sent:
+                            self.hooks.call(self.hooks.frame_sent, self, frame)
+                        if frame_log.is_enabled():
+                            self.log_frame("sent", frame)
+                        frame.release(self.frame_pool)
+                        continue
+                    # get requesting handler, and decrement size of its send buffer
+                    with self.handlers_lock:
+                        handler = self.streams.get(frame.stream_id)
+                        if handler:
+                            handler.decrement_send_buffer(frame)
                     if handler:
-                        # update keep alive; frame about to be sent from valid handler, so stream must be active
-                        self.update_keep_alive()
-                        # decrement sie of handler's send buffer
-                        handler.decrement_send_buffer(frame)
+                        self.update_send()
                         # try to send frame
                         try:
-                            frame.send(self.s)
+                            frame.send(self.s, self.settings.compact_frames)
                         except SocketCepticException as e:
                             # trigger manager to stop if problem with socket
                             self.stop("exception while sending frame: {}".format(e))
                             break
+                        self.metrics.sent.add(frame)
+                        if self.hooks.frame_sent:
+                            self.hooks.call(self.hooks.frame_sent, self, frame)
+                        if frame_log.is_enabled():
+                            self.log_frame("sent", frame)
                         # if sent close frame, close handler
                         if frame.is_close():
-                            self.remove_handler(handler)
+                            self.remove_handler(handler, frame.stream_id)
+                    # frame will never reach peer, so connection credit it took is available again
+                    elif self.settings.flow_control and frame.is_flow_controlled():
+                        self.send_window.grant(len(frame.data))
+                    frame.release(self.frame_pool)
         except Exception as e:
+            stream_logger.error("manager %s failed while sending frames", self.manager_id, exc_info=True)
             self.stop(f"Exception occurred in process_sent_frames: {type(e)}:\n{traceback.format_exception(e)}")
 
     def process_received_frames(self) -> None:
         try:
             while not self.should_stop_event.is_set():
+                self.recycle_released_handlers()
                 # try to get frame from socket
                 try:
-                    frame = StreamFrame.from_socket(self.s, self.settings.frame_max_size)
+                    frame = StreamFrame.from_socket(self.s, self.settings.frame_max_size, self.frame_pool,
+                                                   self.settings.compact_frames)
                 except (StreamFrameSizeException, SocketCepticException) as e:
                     self.stop("exception while receiving frame: {}".format(e))
                     break
                 # update keep alive timer; just received frame, so connection must be alive
                 self.update_keep_alive()
+                self.metrics.received.add(frame)
+                if self.hooks.frame_received:
+                    self.hooks.call(self.hooks.frame_received, self, frame)
+                if frame_log.is_enabled():
+                    self.log_frame("received", frame)
+                # count flow controlled frames against connection window
+                if self.settings.flow_control and frame.is_flow_controlled():
+                    if not self.receive_window.receive(len(frame.data)):
+                        self.stop(f"peer exceeded connection flow control window of {self.receive_window.size}")
+                        break
+                # if window update, give credit to connection or handler
+                if frame.is_window_update():
+                    try:
+                        amount = int(frame.data)
+                    except ValueError:
+                        amount = -1
+                    if amount < 0:
+                        self.stop(f"received invalid window update addressed to handler {frame.stream_id}")
+                        break
+                    if frame.stream_id == StreamFrame.NULL_ID:
+                        self.send_window.grant(amount)
+                    else:
+                        handler = self.streams.get(frame.stream_id)
+                        if handler:
+                            handler.send_window.grant(amount)
+                    frame.release(self.frame_pool)
                 # if keep alive frame, update keep alive on handler and keep processing;
                 # just there to keep connection alive
-                if frame.is_keep_alive():
+                elif frame.is_keep_alive():
                     handler = self.streams.get(frame.stream_id)
                     if handler:
                         handler.update_keep_alive()
+                    frame.release(self.frame_pool)
                 # if handler is to be closed, add frame and remove handler
                 elif frame.is_close():
                     handler = self.streams.get(frame.stream_id)
                     try:
                         if handler:
                             handler.add_to_read(frame)
-                            self.remove_handler(handler)
+                            self.remove_handler(handler, frame.stream_id)
                     except StreamHandlerStoppedException:
                         continue
                 # if close all, stop manager
                 elif frame.is_close_all():
                     self.stop("received close_all addressed to handler {}".format(frame.stream_id))
                     break
+                # if go away, start no new streams and stop once started streams are done
+                elif frame.is_goaway():
+                    frame.release(self.frame_pool)
+                    self.handle_peer_going_away()
                 # if server and header frame, create new handler and pass frame
                 elif self.is_server and frame.is_header():
+                    if not self.is_peer_stream_id(frame.stream_id):
+                        self.stop(f"peer started stream with id it may not use: {frame.stream_id}")
+                        break
                     handler = self.create_handler(frame.stream_id)
                     # if handler couldn't be created, something is wrong and should stop manager
                     if not handler:
                         self.stop("couldn't create handler - possible duplicate for handler {}".format(frame.stream_id))
                         break
+                    # once going away, peer is expected to retry refused streams on another connection
+                    if self.going_away:
+                        self.refuse_stream(handler, frame, self.REFUSED_REASON)
+                        continue
                     if self.is_handler_limit_reached():
-                        handler.send_close("Handler limit reached")
-                        self.remove_handler(handler)
+                        self.refuse_stream(handler, frame, "Handler limit reached")
                         continue
                     try:
                         handler.add_to_read(frame)
                     except StreamHandlerStoppedException:
                         continue
-                    # let new thread run removable.handle_new_connection to continue comms with handler
-                    handler_thread = Thread(target=self.removable.handle_new_connection, args=(handler,))
-                    handler_thread.daemon = True
-                    handler_thread.start()
+                    # let removable run handle_new_connection off of this thread to continue comms with handler
+                    self.removable.start_new_connection(self.run_new_connection, handler)
                 else:
                     # otherwise try to pass frame to appropriate handler
                     handler = self.streams.get(frame.stream_id)
@@ -482,45 +1032,82 @@ class StreamManager(object):
                             handler.add_to_read(frame)
                         except StreamHandlerStoppedException:
                             pass
+                    else:
+                        self.release_dropped_frame(frame)
+        except StreamFlowControlException as e:
+            self.stop(f"exception while receiving frame: {e}")
         except Exception as e:
+            stream_logger.error("manager %s failed while receiving frames", self.manager_id, exc_info=True)
             self.stop(f"Exception occurred in process_received_frames: {type(e)}:\n{traceback.format_exception(e)}")
+        finally:
+            self.close_when_done()
 
 
 class StreamHandler(object):
+    """
+    Stream given to code outside of ceptic. Handlers are reused once released, so a StreamHandler only works with the
+    stream it was created for; afterwards it acts as stopped.
+    """
+
     def __init__(self, wrapped: 'StreamHandlerInternal') -> None:
         self.wrapped = wrapped
+        self.generation = wrapped.generation
+        self._stream_id = wrapped.stream_id
+
+    def get_wrapped(self) -> 'StreamHandlerInternal':
+        if self.wrapped.generation != self.generation:
+            raise StreamHandlerStoppedException("Handler is stopped; stream has ended and its handler was released.")
+        return self.wrapped
 
     @property
     def settings(self) -> StreamSettings:
         return self.wrapped.settings
 
     @property
-    def stream_id(self) -> uuid.UUID:
-        return self.wrapped.stream_id
+    def stream_id(self) -> int:
+        return self._stream_id
 
     def is_stopped(self) -> bool:
-        return self.wrapped.is_stopped()
+        return self.wrapped.generation != self.generation or self.wrapped.is_stopped()
 
     def send(self, data: bytes) -> None:
-        self.wrapped.send_data(data)
+        self.get_wrapped().send_data(data)
 
     def send_response(self, response: 'CepticResponse') -> None:
-        self.wrapped.send_response(response)
+        self.get_wrapped().send_response(response)
 
     def send_close(self, data: Union[bytes, str] = bytearray()):
-        self.wrapped.send_close(data)
+        try:
+            wrapped = self.get_wrapped()
+        except StreamHandlerStoppedException:
+            return
+        wrapped.send_close(data)
+
+    @property
+    def priority(self) -> int:
+        return self.get_wrapped().priority
+
+    def set_priority(self, priority: int) -> None:
+        self.get_wrapped().set_priority(priority)
 
     def read(self, max_length: int, timeout: float = None) -> StreamData:
-        return self.wrapped.read(max_length=max_length, timeout=timeout)
+        return self.get_wrapped().read(max_length=max_length, timeout=timeout)
 
     def read_raw(self, max_length: int, timeout: float = None) -> bytes:
-        return self.wrapped.read_raw(max_length=max_length, timeout=timeout)
+        return self.get_wrapped().read_raw(max_length=max_length, timeout=timeout)
+
+    def get_stats(self) -> dict:
+        return self.get_wrapped().get_stats()
 
 
 class StreamHandlerInternal(object):
-    def __init__(self, stream_id: uuid.UUID, settings: StreamSettings, send_buffer: SimpleQueue) -> None:
+    DEFAULT_ENCODER = EncodeHandler([EncodeNone])
+
+    def __init__(self, stream_id: int, settings: StreamSettings, send_buffer: SendScheduler,
+                 manager: StreamManager) -> None:
         self.stream_id = stream_id
         self.settings = settings
+        self.manager = manager
         # event for stopping stream
         self.should_stop_event = Event()
         # event for received frame
@@ -528,23 +1115,70 @@ class StreamHandlerInternal(object):
         # deques to store frames
         self.frames_to_send = send_buffer
         self.frames_to_read = deque()
-        # buffer sizes
-        self.send_buffer_counter = SafeCounter()
-        self.read_buffer_counter = SafeCounter()
-        # events for awaiting decrease of buffer size
-        self.send_buffer_ready_or_stop = Event()
-        self.read_buffer_ready_or_stop = Event()
-        self.buffer_wait_timeout = 0.1
-        # handler existence timer
-        self.existence_timer = Timer()
-        self.existence_timer.start()
-        # keep alive timer
-        self.keep_alive_timer = Timer()
-        self.keep_alive_timer.start()
+        # bytes buffered to send and to read; without flow control, these bound how much can be buffered
+        self.send_buffer_gate = CreditGate(settings.send_buffer_size, manager.metrics.buffer_waits)
+        self.read_buffer_gate = CreditGate(settings.read_buffer_size, manager.metrics.buffer_waits)
+        # flow control windows for this stream
+        self.send_window = FlowWindow(settings.peer_stream_window_size, manager.metrics.flow_control_waits)
+        self.receive_window = ReceiveWindow(settings.stream_window_size, settings.frame_max_size)
+        # bytes received but not yet consumed; returned to connection window once consumed or handler is removed
+        self.connection_unread = 0
+        self.connection_settled = False
+        self.connection_lock = Lock()
+        # monotonic time of last frame sent or received; expiry entry is scheduled by manager's reaper, if any
+        self.created_time = monotonic()
+        self.last_active_time = self.created_time
+        self.timeout_entry: Union['TimerWheelEntry', None] = None
+        # frames and data bytes sent, counted by manager's sending thread, and received, counted by its receiving thread
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_received = 0
+        self.bytes_received = 0
         # encoding
-        self._encoder = EncodeHandler([EncodeNone])
+        self._encoder = self.DEFAULT_ENCODER
+        # time breakdown of request, if sampled by server's profiler
+        self.profile: Union[RequestProfile, None] = None
         # stream frame generation
         self.stream_frame_gen = StreamFrameGen(self)
+        # references held by manager and by owning thread; handler is reused by manager once both are released
+        self.generation = 0
+        self.references = 2
+        self.references_lock = Lock()
+
+    def reset(self, stream_id: int) -> None:
+        """
+        Prepare released handler to be reused for a new stream.
+        """
+        self.stream_id = stream_id
+        self.should_stop_event.clear()
+        self.read_or_stop_event.clear()
+        self.frames_to_read.clear()
+        self.send_buffer_gate.reset()
+        self.read_buffer_gate.reset()
+        self.send_window.reset(self.settings.peer_stream_window_size)
+        self.receive_window.reset()
+        self.connection_unread = 0
+        self.connection_settled = False
+        self.created_time = monotonic()
+        self.last_active_time = self.created_time
+        self.timeout_entry = None
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.frames_received = 0
+        self.bytes_received = 0
+        self._encoder = self.DEFAULT_ENCODER
+        self.profile = None
+        self.stream_frame_gen.reset()
+        self.generation += 1
+        self.references = 2
+
+    def release(self) -> bool:
+        """
+        Drop a reference to handler. Returns True if it was the last one.
+        """
+        with self.references_lock:
+            self.references -= 1
+            return self.references == 0
 
     @property
     def encoder(self) -> EncodeHandler:
@@ -556,9 +1190,12 @@ class StreamHandlerInternal(object):
 
     def stop(self):
         self.read_or_stop_event.set()
-        self.send_buffer_ready_or_stop.set()
-        self.read_buffer_ready_or_stop.set()
         self.should_stop_event.set()
+        self.send_buffer_gate.stop()
+        self.read_buffer_gate.stop()
+        # wake anything waiting for flow control credit
+        self.send_window.stop()
+        self.manager.send_window.wake()
 
     def set_encode(self, encoding_str: str):
         self.encoder = EncodeGetter.get(encoding_str)
@@ -568,21 +1205,47 @@ class StreamHandlerInternal(object):
             self.read_or_stop_event.set()
         return self.should_stop_event.is_set()
 
+    def get_idle_time(self) -> float:
+        return monotonic() - self.last_active_time
+
     def is_timed_out(self):
         # if timeout past stream_timeout setting, stop handler
-        if self.keep_alive_timer.get_time_current() > self.settings.stream_timeout:
-            return True
-        return False
+        return self.get_idle_time() > self.settings.stream_timeout
 
     def update_keep_alive(self):
-        self.keep_alive_timer.update()
+        self.last_active_time = monotonic()
+
+    def get_stats(self) -> dict:
+        now = monotonic()
+        return {
+            "stream_id": self.stream_id,
+            "age": now - self.created_time,
+            "idle_time": now - self.last_active_time,
+            "priority": self.priority,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "frames_received": self.frames_received,
+            "bytes_received": self.bytes_received,
+            "send_buffered": self.send_buffer_gate.used,
+            "read_buffered": self.read_buffer_gate.used,
+        }
+
+    @property
+    def priority(self) -> int:
+        return self.frames_to_send.get_priority(self.stream_id)
+
+    def set_priority(self, priority: int) -> None:
+        """
+        Set share of connection this stream's frames get, relative to other streams; higher sends more.
+        """
+        self.frames_to_send.set_priority(self.stream_id, priority)
 
     # region Buffer Checks
     def is_send_buffer_full(self) -> bool:
-        return self.send_buffer_counter.value > self.settings.send_buffer_size
+        return self.send_buffer_gate.is_full()
 
     def is_read_buffer_full(self) -> bool:
-        return self.read_buffer_counter.value > self.settings.read_buffer_size
+        return self.read_buffer_gate.is_full()
 
     def is_ready_to_read(self) -> bool:
         """
@@ -594,36 +1257,73 @@ class StreamHandlerInternal(object):
         return ready
 
     def increment_send_buffer(self, frame: StreamFrame) -> None:
-        self.send_buffer_counter.increment(frame.size)
+        self.send_buffer_gate.add(frame.size)
 
     def decrement_send_buffer(self, frame: StreamFrame) -> None:
-        self.send_buffer_counter.decrement(frame.size)
-        # potentially flag that send buffer is not full, if currently awaiting event
-        if not self.is_send_buffer_full() and not self.send_buffer_ready_or_stop.is_set():
-            self.send_buffer_ready_or_stop.set()
+        # only called once frame is about to be sent
+        self.frames_sent += 1
+        self.bytes_sent += len(frame.data)
+        self.send_buffer_gate.release(frame.size)
 
     def increment_read_buffer(self, frame: StreamFrame) -> None:
-        self.read_buffer_counter.increment(frame.size)
+        self.read_buffer_gate.add(frame.size)
 
     def decrement_read_buffer(self, frame: StreamFrame) -> None:
-        self.read_buffer_counter.decrement(frame.size)
-        # potentially flag that read buffer is not full, if currently awaiting event
-        if not self.is_read_buffer_full() and not self.read_buffer_ready_or_stop.is_set():
-            self.read_buffer_ready_or_stop.set()
+        self.read_buffer_gate.release(frame.size)
 
     # endregion
 
-    def send_close(self, data: Union[bytes, str] = bytearray()) -> None:
+    # region Flow Control
+    def handle_consumed(self, amount: int) -> None:
+        """
+        Return credit for consumed bytes to peer, for both stream and connection windows.
+        """
+        credit = self.receive_window.consume(amount)
+        if credit and not self.is_stopped():
+            self.frames_to_send.put(StreamFrame.create_window_update(self.stream_id, credit))
+        with self.connection_lock:
+            settled = self.connection_settled
+            if not settled:
+                self.connection_unread -= amount
+        if not settled:
+            self.manager.release_connection_window(amount)
+
+    def settle_connection_window(self) -> None:
+        """
+        Return all unconsumed bytes to connection window, so that frames left unread in a removed handler do not hold
+        connection credit forever.
+        """
+        with self.connection_lock:
+            if self.connection_settled:
+                return
+            self.connection_settled = True
+            amount = self.connection_unread
+            self.connection_unread = 0
+        if amount:
+            self.manager.release_connection_window(amount)
+
+    # endregion
+
+    def send_close(self, data: Union[bytes, str] = bytearray(), block: bool = True) -> None:
         """
         Send a close frame with optional data content (not to exceed half of frame size) and stop handler.
         Does not block unless queue full.
+        :param block: if False, never wait for room in send buffer; close frame may take buffer over capacity, which is
+        bounded since nothing is sent on stream after it. For threads shared by many streams, such as reaper's
         """
         if isinstance(data, str):
             data = data.encode()
-        try:
-            self.send_frame(StreamFrame.create_close(self.stream_id, data))
-        except StreamHandlerStoppedException:
-            pass
+        if block:
+            try:
+                self.send_frame(StreamFrame.create_close(self.stream_id, data))
+            except StreamHandlerStoppedException:
+                pass
+        elif not self.is_stopped():
+            frame = StreamFrame.create_close(self.stream_id, data)
+            if self._encoder is not self.DEFAULT_ENCODER:
+                frame.encode_data(self._encoder)
+            self.increment_send_buffer(frame)
+            self.frames_to_send.put(frame)
         self.stop()
 
     def send_frame(self, frame: StreamFrame) -> None:
@@ -632,25 +1332,43 @@ class StreamHandlerInternal(object):
         """
         if self.is_stopped():
             raise StreamHandlerStoppedException("Handler is stopped; cannot send frames through a stopped handler.")
-        self.keep_alive_timer.update()
-        frame.encode_data(self.encoder)
-        # check if enough room in buffer
-        self.increment_send_buffer(frame)
-        if self.is_send_buffer_full():
-            # wait until buffer is decreased enough to fit new frame
-            self.send_buffer_ready_or_stop.clear()
-            while self.is_send_buffer_full() and not self.is_stopped():
-                ready = self.send_buffer_ready_or_stop.wait(self.buffer_wait_timeout)
-                if ready:
-                    break
+        self.last_active_time = monotonic()
+        # data is left as is without an encoding, so only time actual encoding
+        if self._encoder is not self.DEFAULT_ENCODER:
+            start = perf_counter()
+            frame.encode_data(self._encoder)
+            duration = perf_counter() - start
+            self.manager.metrics.encode_time.observe(duration)
+            if self.profile:
+                self.profile.add("encode", duration)
+        if self.settings.flow_control:
+            # wait for credit in peer's stream and connection windows
+            if frame.is_flow_controlled():
+                amount = len(frame.data)
+                if not self.send_window.consume(amount, self.is_stopped) or \
+                        not self.manager.send_window.consume(amount, self.is_stopped):
+                    raise StreamHandlerStoppedException("Handler stopped while waiting for flow control window.")
+            self.increment_send_buffer(frame)
+            self.frames_to_send.put(frame)
+            return
+        # wait until there is enough room in buffer for frame
+        if not self.send_buffer_gate.acquire(frame.size):
+            raise StreamHandlerStoppedException("Handler stopped while waiting for room in send buffer.")
         self.frames_to_send.put(frame)
 
     def send_frames(self, frames: Iterable) -> None:
         """
         Send all frames in iterable. Should typically be used with a generator. Does not block unless queue full.
         """
+        profile = self.profile
+        if not profile:
+            for frame in frames:
+                self.send_frame(frame)
+            return
+        start = perf_counter()
         for frame in frames:
             self.send_frame(frame)
+        profile.add("send", perf_counter() - start)
 
     def send_data(self, data: bytes) -> None:
         """
@@ -687,18 +1405,34 @@ class StreamHandlerInternal(object):
 
     def add_to_read(self, frame: StreamFrame) -> None:
         """
-        Adds frame to receive queue.
-        """
-        self.keep_alive_timer.update()
-        # check if enough room in buffer
-        self.increment_read_buffer(frame)  # TODO: review this order of actions
-        if self.is_read_buffer_full():
-            # wait until buffer is decreased enough to fit new frame
-            self.read_buffer_ready_or_stop.clear()
-            while self.is_read_buffer_full() and not self.is_stopped():
-                ready = self.read_buffer_ready_or_stop.wait(self.buffer_wait_timeout)
-                if ready:
-                    break
+        Adds frame to receive queue. With flow control, never blocks; peer cannot send more than window allows.
+        """
+        # handler may have been released and reused for another stream since manager looked it up
+        if frame.stream_id != self.stream_id:
+            raise StreamHandlerStoppedException("Handler is stopped; it was reused for another stream.")
+        self.last_active_time = monotonic()
+        self.frames_received += 1
+        self.bytes_received += len(frame.data)
+        if self.settings.flow_control:
+            if frame.is_flow_controlled():
+                amount = len(frame.data)
+                if not self.receive_window.receive(amount):
+                    raise StreamFlowControlException(f"Peer exceeded stream flow control window of "
+                                                     f"{self.receive_window.size}")
+                with self.connection_lock:
+                    settled = self.connection_settled
+                    if not settled:
+                        self.connection_unread += amount
+                # handler already removed, so nothing will return this credit later
+                if settled:
+                    self.manager.release_connection_window(amount)
+            self.increment_read_buffer(frame)
+            self.frames_to_read.append(frame)
+            self.read_or_stop_event.set()
+            return
+        # wait until there is enough room in buffer for frame
+        if not self.read_buffer_gate.acquire(frame.size):
+            raise StreamHandlerStoppedException("Handler stopped while waiting for room in read buffer.")
         self.frames_to_read.append(frame)
         self.read_or_stop_event.set()
 
@@ -729,10 +1463,19 @@ class StreamHandlerInternal(object):
         if not frame:
             return frame
         # decode frame data
-        frame.decode_data(self.encoder)
+        if self._encoder is not self.DEFAULT_ENCODER:
+            start = perf_counter()
+            frame.decode_data(self._encoder)
+            duration = perf_counter() - start
+            self.manager.metrics.decode_time.observe(duration)
+            if self.profile:
+                self.profile.add("decode", duration)
         # if a close frame, raise exception
         if frame.is_close():
-            raise StreamClosedException(frame.data.decode())
+            reason = frame.data.decode()
+            if reason == StreamManager.REFUSED_REASON:
+                raise StreamRefusedException(reason)
+            raise StreamClosedException(reason)
         return frame
 
     def read_full_data(self, timeout: float, max_length: int, convert_response: bool) -> StreamData:
@@ -746,6 +1489,8 @@ class StreamHandlerInternal(object):
         """
         if timeout is None:
             timeout = self.settings.stream_timeout
+        profile = self.profile
+        start = perf_counter() if profile else 0.0
         frames = []
         total_length = 0
         frame_generator = self.generate_next_frame(timeout)
@@ -760,10 +1505,15 @@ class StreamHandlerInternal(object):
                 raise StreamTotalDataSizeException(f"Total data received has surpassed max length of {max_length}")
             if frame.is_response():
                 is_response = True
-            if frame.is_last():
+            is_last = frame.is_last()
+            # only data is kept, so frame can be reused
+            frame.release(self.manager.frame_pool)
+            if is_last:
                 break
         # combine data
         full_data = bytes().join(frames)
+        if profile:
+            profile.add("read", perf_counter() - start)
         if convert_response and is_response:
             return StreamData(response=CepticResponse.from_data(full_data))
         return StreamData(data=full_data)
@@ -872,26 +1622,64 @@ class StreamHandlerInternal(object):
             # if frame was taken from queue, decrement deque size
             if frame:
                 self.decrement_read_buffer(frame)
+                if self.settings.flow_control and frame.is_flow_controlled():
+                    self.handle_consumed(len(frame.data))
 
 
 class StreamFrameGen(object):
-    __slots__ = ("stream", "_frame_size")
+    __slots__ = ("stream", "_frame_min_size", "_frame_max_size")
+
+    # default min size is this fraction of max size
+    MIN_SIZE_DIVISOR = 16
 
     def __init__(self, stream: StreamHandlerInternal):
         self.stream = stream
-        self._frame_size = 0
-        self.frame_size = self.stream.settings.frame_max_size // 2
+        self.reset()
+
+    def reset(self) -> None:
+        self._frame_max_size = self.get_frame_size_limit()
+        self._frame_min_size = max(1, self._frame_max_size // self.MIN_SIZE_DIVISOR)
+
+    def get_frame_size_limit(self) -> int:
+        # leave room for encodings that expand data
+        return self.stream.settings.frame_max_size // 2
 
     @property
     def frame_size(self) -> int:
-        return self._frame_size
+        """
+        Size of next frame. A stream alone on its manager gets max size; while other streams have frames waiting to be
+        sent, size is split between them (down to min size) so that their frames are interleaved at a finer grain.
+        """
+        competing = self.stream.frames_to_send.get_active_count(self.stream_id)
+        return max(self._frame_min_size, self._frame_max_size // (1 + competing))
 
     @frame_size.setter
     def frame_size(self, size: int) -> None:
-        self._frame_size = size
+        """
+        Use a fixed frame size.
+        """
+        self.set_frame_size_bounds(size, size)
+
+    @property
+    def frame_min_size(self) -> int:
+        return self._frame_min_size
+
+    @property
+    def frame_max_size(self) -> int:
+        return self._frame_max_size
+
+    def set_frame_size_bounds(self, frame_min_size: int, frame_max_size: int) -> None:
+        """
+        Set bounds of adaptive frame size, limited to half of frame_max_size; negative values keep current bound.
+        """
+        if frame_max_size >= 0:
+            self._frame_max_size = max(1, min(frame_max_size, self.get_frame_size_limit()))
+        if frame_min_size >= 0:
+            self._frame_min_size = max(1, frame_min_size)
+        self._frame_min_size = min(self._frame_min_size, self._frame_max_size)
 
     @property
-    def stream_id(self) -> uuid.UUID:
+    def stream_id(self) -> int:
         return self.stream.stream_id
 
     def from_data(self, data: bytes, is_first_header: bool = False, is_response: bool = False) \
@@ -901,34 +1689,27 @@ class StreamFrameGen(object):
         """
         if not data:
             return
+        pool = self.stream.manager.frame_pool
+        # only first frame is a header or response; any frames after it are data
+        frame_type = StreamFrameType.DATA
+        if is_first_header:
+            frame_type = StreamFrameType.HEADER
+        elif is_response:
+            frame_type = StreamFrameType.RESPONSE
         i = 0
         while True:
-            # get chunk of data
-            chunk = data[i:i + self.frame_size]
+            # get chunk of data; frame size may change between chunks
+            frame_size = self.frame_size
+            chunk = data[i:i + frame_size]
             # iterate chunk's starting index
-            i += self.frame_size
+            i += frame_size
             # if next chunk will be out of bounds, yield final frame
             if i >= len(data):
-                if is_first_header:
-                    is_first_header = False
-                    yield StreamFrame.create_header_last(self.stream_id, chunk)
-                else:
-                    if is_response:
-                        is_response = False
-                        yield StreamFrame.create_response_last(self.stream_id, chunk)
-                    else:
-                        yield StreamFrame.create_data_last(self.stream_id, chunk)
+                yield StreamFrame.from_pool(pool, self.stream_id, frame_type, StreamFrameInfo.END, chunk)
                 return
             # otherwise yield continued frame
-            if is_first_header:
-                is_first_header = False
-                yield StreamFrame.create_header_continued(self.stream_id, chunk)
-            else:
-                if is_response:
-                    is_response = False
-                    yield StreamFrame.create_response_continued(self.stream_id, chunk)
-                else:
-                    yield StreamFrame.create_data_continued(self.stream_id, chunk)
+            yield StreamFrame.from_pool(pool, self.stream_id, frame_type, StreamFrameInfo.CONTINUE, chunk)
+            frame_type = StreamFrameType.DATA
 
     def from_file(self, file_object: IO) -> Generator[StreamFrame, None, None]:
         """
@@ -991,6 +1772,9 @@ class CepticRequest(CepticHeaders):
         # check that url isn't empty
         if not self.url:
             raise CepticRequestVerifyException("Url cannot be empty.")
+        # check that priority, if present, is an integer
+        if self.priority is not None and (not isinstance(self.priority, int) or isinstance(self.priority, bool)):
+            raise CepticRequestVerifyException(f"Priority must be an integer, not {self.priority}.")
         # don't redo verification is already satisfied
         if self.host and self.endpoint:
             return
@@ -1025,13 +1809,12 @@ class CepticRequest(CepticHeaders):
             try:
                 if not self.exchange:
                     self.stream.send_response(CepticResponse(CepticStatusCode.MISSING_EXCHANGE))
-                    if self.stream.settings.verbose:
-                        print("Request did not have required Exchange header")
+                    stream_logger.info("request %s %s did not have required Exchange header", self.command,
+                                       self.endpoint)
                     return None
                 self.stream.send_response(response)
             except StreamException as e:
-                if self.stream.settings.verbose:
-                    print(f"StreamException {type(e)} while trying to begin_exchange: {e}")
+                stream_logger.warning("%s while trying to begin exchange: %s", type(e).__name__, e)
                 return None
             return self.stream
         return None
@@ -1112,3 +1895,398 @@ class SafeCounter(object):
     def decrement(self, value=1) -> None:
         with self._lock:
             self.value -= value
+
+
+class FreeList(object):
+    """
+    Bounded pool of released objects kept for reuse, cutting allocation and garbage collection of short-lived objects.
+    Objects released while pool is full are left to garbage collector.
+    """
+    __slots__ = ("max_size", "_items")
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._items = deque()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self) -> Union[object, None]:
+        try:
+            return self._items.pop()
+        except IndexError:
+            return None
+
+    def put(self, item: object) -> bool:
+        # deque appends and pops are atomic; pool may go a few items over max size if put concurrently
+        if len(self._items) >= self.max_size:
+            return False
+        self._items.append(item)
+        return True
+
+
+class CreditGate(object):
+    """
+    Budget of bytes that may be buffered at once. Acquiring waits on a condition until enough bytes are released, and
+    releasing wakes waiters right away, so buffer accounting takes one lock per frame instead of counters and events.
+    """
+    __slots__ = ("capacity", "wait_histogram", "_used", "_waiting", "_lock", "_condition", "_stopped")
+
+    def __init__(self, capacity: int, wait_histogram: Histogram = None) -> None:
+        self.capacity = capacity
+        # durations of waits for room, if given; nothing is timed unless acquiring has to wait
+        self.wait_histogram = wait_histogram
+        self._used = 0
+        # count of waiters, so that releasing only notifies when someone is waiting
+        self._waiting = 0
+        self._lock = Lock()
+        self._condition = Condition(self._lock)
+        self._stopped = False
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def is_full(self) -> bool:
+        return self._used > self.capacity
+
+    def acquire(self, amount: int) -> bool:
+        """
+        Wait until amount fits in budget and take it. An empty budget always admits amount, so a single amount larger
+        than capacity cannot wait forever. Returns False if stopped while waiting for room.
+        """
+        with self._lock:
+            if self._used and self._used + amount > self.capacity:
+                start = perf_counter()
+                while self._used and self._used + amount > self.capacity:
+                    if self._stopped:
+                        return False
+                    self._waiting += 1
+                    self._condition.wait()
+                    self._waiting -= 1
+                if self.wait_histogram:
+                    self.wait_histogram.observe(perf_counter() - start)
+            self._used += amount
+            return True
+
+    def reset(self) -> None:
+        with self._lock:
+            self._used = 0
+            self._stopped = False
+
+    def add(self, amount: int) -> None:
+        """
+        Take amount without waiting, for bytes already bounded elsewhere (such as by flow control).
+        """
+        with self._lock:
+            self._used += amount
+
+    def release(self, amount: int) -> None:
+        with self._lock:
+            self._used -= amount
+            if self._waiting:
+                self._condition.notify_all()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+
+class FlowWindow(object):
+    """
+    Credit, in bytes, that peer has granted for sending. Senders wait for credit instead of polling buffer sizes.
+    """
+    __slots__ = ("wait_histogram", "_value", "_condition", "_stopped")
+
+    # windows are advertised as unsigned 32-bit values; stay clear of sign issues on any peer
+    MAX_SIZE = 2 ** 31 - 1
+
+    def __init__(self, value: int, wait_histogram: Histogram = None) -> None:
+        # durations of waits for credit, if given; nothing is timed unless consuming has to wait
+        self.wait_histogram = wait_histogram
+        self._value = value
+        self._condition = Condition()
+        self._stopped = False
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def reset(self, value: int) -> None:
+        with self._condition:
+            self._value = value
+            self._stopped = False
+
+    def consume(self, amount: int, is_stopped: Callable[[], bool]) -> bool:
+        """
+        Wait until amount of credit is available and take it. Returns False if stopped before credit was available.
+        """
+        with self._condition:
+            if self._value < amount:
+                start = perf_counter()
+                while self._value < amount:
+                    if self._stopped or is_stopped():
+                        return False
+                    self._condition.wait()
+                if self.wait_histogram:
+                    self.wait_histogram.observe(perf_counter() - start)
+            self._value -= amount
+            return True
+
+    def grant(self, amount: int) -> None:
+        with self._condition:
+            self._value += amount
+            self._condition.notify_all()
+
+    def wake(self) -> None:
+        """
+        Wake all waiters so that they can recheck if they were stopped.
+        """
+        with self._condition:
+            self._condition.notify_all()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+
+class ReceiveWindow(object):
+    """
+    Counts bytes received against advertised window and batches consumed bytes into credit to return to peer.
+    """
+    __slots__ = ("size", "threshold", "_used", "_pending", "_lock")
+
+    def __init__(self, size: int, frame_max_size: int) -> None:
+        self.size = size
+        # credit must be returned before sender could be left without room for a full frame
+        self.threshold = max(1, min(size // 2, size - frame_max_size))
+        self._used = 0
+        self._pending = 0
+        self._lock = Lock()
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def reset(self) -> None:
+        with self._lock:
+            self._used = 0
+            self._pending = 0
+
+    def receive(self, amount: int) -> bool:
+        """
+        Count received bytes. Returns False if peer exceeded window.
+        """
+        with self._lock:
+            self._used += amount
+            return self._used <= self.size
+
+    def consume(self, amount: int) -> int:
+        """
+        Mark received bytes as consumed. Returns credit to send to peer, or 0 if not enough has built up yet.
+        """
+        with self._lock:
+            self._pending += amount
+            if self._pending < self.threshold:
+                return 0
+            credit = self._pending
+            self._pending = 0
+            self._used -= credit
+            return credit
+
+
+class TimerWheelEntry(object):
+    __slots__ = ("wheel", "expire_tick", "callback", "slot")
+
+    def __init__(self, wheel: 'TimerWheel', expire_tick: int, callback: Callable[[], None]) -> None:
+        self.wheel = wheel
+        self.expire_tick = expire_tick
+        self.callback = callback
+        # set of entries this entry is currently stored in; None once expired or cancelled
+        self.slot: Union[set, None] = None
+
+    def cancel(self) -> None:
+        self.wheel.cancel(self)
+
+
+class TimerWheel(object):
+    """
+    Hierarchical hashed timer wheel on monotonic time: scheduling and cancelling are O(1), and expired entries are
+    found by visiting one slot per tick instead of scanning everything that was scheduled. Each level's slot spans a
+    whole revolution of the level below; entries far in the future wait in coarse upper levels and are cascaded down
+    as their time approaches.
+    """
+
+    def __init__(self, tick: float, slot_count: int = 64, level_count: int = 4) -> None:
+        self.tick = tick
+        self.slot_count = slot_count
+        self.levels: list[list[set[TimerWheelEntry]]] = [[set() for _ in range(slot_count)]
+                                                         for _ in range(level_count)]
+        # ticks spanned by one slot of each level
+        self.level_spans = [slot_count ** level for level in range(level_count)]
+        self.max_ticks = slot_count ** level_count - 1
+        self.start_time = monotonic()
+        self.current_tick = 0
+        self._lock = Lock()
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> TimerWheelEntry:
+        """
+        Run callback once at least delay seconds have passed, rounded up to next tick.
+        """
+        expire_tick = ceil((monotonic() + max(0.0, delay) - self.start_time) / self.tick)
+        with self._lock:
+            entry = TimerWheelEntry(self, expire_tick, callback)
+            self._insert(entry)
+        return entry
+
+    def cancel(self, entry: TimerWheelEntry) -> None:
+        with self._lock:
+            if entry.slot is not None:
+                entry.slot.discard(entry)
+                entry.slot = None
+
+    def _insert(self, entry: TimerWheelEntry) -> None:
+        remaining = entry.expire_tick - self.current_tick
+        if remaining <= 0:
+            # already due; run on next tick
+            entry.slot = self.levels[0][(self.current_tick + 1) % self.slot_count]
+            entry.slot.add(entry)
+            return
+        # entries beyond range of top level wait in furthest slot, then get placed again when cascaded
+        target_tick = self.current_tick + min(remaining, self.max_ticks)
+        level = 0
+        while level < len(self.levels) - 1 and min(remaining, self.max_ticks) >= self.level_spans[level + 1]:
+            level += 1
+        entry.slot = self.levels[level][(target_tick // self.level_spans[level]) % self.slot_count]
+        entry.slot.add(entry)
+
+    def advance(self) -> None:
+        """
+        Visit all slots whose time has come, running expired callbacks outside of lock.
+        """
+        now_tick = int((monotonic() - self.start_time) / self.tick)
+        expired = []
+        with self._lock:
+            while self.current_tick < now_tick:
+                self.current_tick += 1
+                # move entries from upper levels whose slot has come down to finer levels, top first
+                for level in range(len(self.levels) - 1, 0, -1):
+                    span = self.level_spans[level]
+                    if self.current_tick % span == 0:
+                        self._cascade(self.levels[level][(self.current_tick // span) % self.slot_count])
+                slot = self.levels[0][self.current_tick % self.slot_count]
+                for entry in list(slot):
+                    if entry.expire_tick <= self.current_tick:
+                        slot.discard(entry)
+                        entry.slot = None
+                        expired.append(entry)
+        for entry in expired:
+            entry.callback()
+
+    def _cascade(self, slot: set[TimerWheelEntry]) -> None:
+        entries = list(slot)
+        slot.clear()
+        for entry in entries:
+            self._insert(entry)
+
+    def get_entry_count(self) -> int:
+        with self._lock:
+            return sum(len(slot) for level in self.levels for slot in level)
+
+
+class Reaper(object):
+    """
+    Expires idle streams and managers by stream_timeout, and sends keep alives on idle but healthy managers so that
+    peer does not expire them. One per server or client; each manager and handler has its own deadline on a shared
+    timer wheel, so nothing is scanned to find what expired.
+    """
+
+    def __init__(self, tick: float = 0.1, slot_count: int = 64, level_count: int = 4) -> None:
+        self.wheel = TimerWheel(tick, slot_count, level_count)
+        self.should_stop_event = Event()
+        self.thread: Union[Thread, None] = None
+        self._lock = Lock()
+
+    @staticmethod
+    def get_check_delay(manager: StreamManager) -> float:
+        # keep alives must be sent a few times per stream_timeout so that one late frame does not expire manager
+        return manager.settings.stream_timeout / 3
+
+    def add_manager(self, manager: StreamManager) -> None:
+        with self._lock:
+            # start reaping on first manager; if stopped before, start again
+            if not self.thread:
+                self.should_stop_event = Event()
+                self.thread = Thread(target=self.run, args=(self.should_stop_event,), daemon=True)
+                self.thread.start()
+        # handlers created from now on get their own deadlines
+        manager.reaper = self
+        manager.reaper_entry = self.wheel.schedule(self.get_check_delay(manager), lambda: self.check_manager(manager))
+
+    def remove_manager(self, manager: StreamManager) -> None:
+        """
+        Cancel entries of manager and its handlers, so that wheel does not keep a removed manager until they expire.
+        """
+        manager.reaper = None
+        if manager.reaper_entry:
+            manager.reaper_entry.cancel()
+            manager.reaper_entry = None
+        for handler in list(manager.streams.values()):
+            if handler.timeout_entry:
+                handler.timeout_entry.cancel()
+
+    def add_handler(self, manager: StreamManager, handler: 'StreamHandlerInternal') -> None:
+        self.schedule_handler(manager, handler, manager.settings.stream_timeout)
+
+    def schedule_handler(self, manager: StreamManager, handler: 'StreamHandlerInternal', delay: float) -> None:
+        # handler may be reused for another stream by the time entry expires
+        stream_id = handler.stream_id
+        handler.timeout_entry = self.wheel.schedule(delay, lambda: self.check_handler(manager, handler, stream_id))
+
+    def check_manager(self, manager: StreamManager) -> None:
+        if manager.is_stopped():
+            return
+        if manager.is_timed_out():
+            manager.stop("manager timed out")
+            return
+        # if nothing was sent recently, let peer know connection is still alive
+        delay = self.get_check_delay(manager)
+        if manager.is_send_idle(delay):
+            manager.send_buffer.put(StreamFrame.create_keep_alive(StreamFrame.NULL_ID))
+        manager.reaper_entry = self.wheel.schedule(delay, lambda: self.check_manager(manager))
+
+    def check_handler(self, manager: StreamManager, handler: 'StreamHandlerInternal', stream_id: int) -> None:
+        # handler is checked and closed under handlers_lock, since otherwise it could be released and reused for
+        # another stream in between, and that stream would be closed instead
+        with manager.handlers_lock:
+            if manager.is_stopped() or manager.streams.get(stream_id) is not handler:
+                return
+            # activity only records a time; deadline is pushed back here, once per timeout, instead of on every frame
+            idle_time = handler.get_idle_time()
+            if idle_time <= manager.settings.stream_timeout:
+                self.schedule_handler(manager, handler, manager.settings.stream_timeout - idle_time)
+                return
+            # close handler that has been idle too long, possibly abandoned
+            if not handler.is_stopped():
+                # reaper is shared by all managers, so it must not wait for room in a full send buffer
+                handler.send_close("handler timed out", block=False)
+                # give handler's owner one more timeout to notice close before removing it
+                handler.update_keep_alive()
+                self.schedule_handler(manager, handler, manager.settings.stream_timeout)
+                return
+        # remove_handler checks stream_id again under lock
+        manager.remove_handler(handler, stream_id)
+
+    def run(self, should_stop_event: Event) -> None:
+        while not should_stop_event.wait(self.wheel.tick):
+            try:
+                self.wheel.advance()
+            except Exception:
+                stream_logger.error("exception occurred in reaper", exc_info=True)
+
+    def stop(self) -> None:
+        with self._lock:
+            self.should_stop_event.set()
+            self.thread = None
@@ -0,0 +1,138 @@
+from threading import Lock
+from typing import Callable, Union, TYPE_CHECKING
+
+from ceptic.log import RateLimitedLogger, tracing_logger
+
+if TYPE_CHECKING:
+    from ceptic.stream import CepticRequest, CepticResponse, StreamFrame, StreamHandlerInternal, StreamManager
+
+# a broken hook may raise on every frame
+hook_log = RateLimitedLogger(tracing_logger)
+
+
+class CepticHooks(object):
+    """
+    Observer of connections, streams, frames and requests. Override only methods of interest; methods that are not
+    overridden are never called, so unused hooks cost nothing. Hooks are called on ceptic's own threads, including
+    each manager's sending and receiving threads, so they should return quickly. Exceptions raised by hooks are ignored,
+    so that a broken hook cannot stop a connection.
+    """
+
+    def on_connection_accepted(self, address: any) -> None:
+        """
+        Server accepted a connection, before its handshake.
+        """
+        pass
+
+    def on_handshake_done(self, manager: 'StreamManager', duration: float) -> None:
+        """
+        Handshake completed and manager is about to start; duration is in seconds.
+        """
+        pass
+
+    def on_stream_opened(self, manager: 'StreamManager', handler: 'StreamHandlerInternal') -> None:
+        pass
+
+    def on_stream_closed(self, manager: 'StreamManager', handler: 'StreamHandlerInternal') -> None:
+        pass
+
+    def on_frame_sent(self, manager: 'StreamManager', frame: 'StreamFrame') -> None:
+        """
+        Frame was written to socket. Frames are reused once this returns, so do not keep them.
+        """
+        pass
+
+    def on_frame_received(self, manager: 'StreamManager', frame: 'StreamFrame') -> None:
+        """
+        Frame was read from socket, before it is passed to its handler. Frames are reused, so do not keep them.
+        """
+        pass
+
+    def on_endpoint_start(self, request: 'CepticRequest') -> None:
+        """
+        Server is about to run endpoint entry for request.
+        """
+        pass
+
+    def on_endpoint_end(self, request: 'CepticRequest', response: Union['CepticResponse', None],
+                        duration: float) -> None:
+        """
+        Endpoint entry returned, or raised if response is None; duration is in seconds.
+        """
+        pass
+
+    def on_request_start(self, request: 'CepticRequest') -> None:
+        """
+        Client is about to send request.
+        """
+        pass
+
+    def on_request_end(self, request: 'CepticRequest', response: Union['CepticResponse', None],
+                       duration: float) -> None:
+        """
+        Client got response to request, or failed if response is None; duration is in seconds.
+        """
+        pass
+
+
+class HookRegistry(object):
+    """
+    Hooks registered on a CepticServer or CepticClient, shared with its managers. For each event, keeps a tuple of
+    callbacks of hooks that override it, so checking for callbacks on hot paths is a single truth test.
+    """
+
+    def __init__(self) -> None:
+        self._hooks: list[CepticHooks] = []
+        self._lock = Lock()
+        self.connection_accepted: tuple[Callable, ...] = ()
+        self.handshake_done: tuple[Callable, ...] = ()
+        self.stream_opened: tuple[Callable, ...] = ()
+        self.stream_closed: tuple[Callable, ...] = ()
+        self.frame_sent: tuple[Callable, ...] = ()
+        self.frame_received: tuple[Callable, ...] = ()
+        self.endpoint_start: tuple[Callable, ...] = ()
+        self.endpoint_end: tuple[Callable, ...] = ()
+        self.request_start: tuple[Callable, ...] = ()
+        self.request_end: tuple[Callable, ...] = ()
+
+    def __len__(self) -> int:
+        return len(self._hooks)
+
+    def add(self, hooks: CepticHooks) -> None:
+        with self._lock:
+            self._hooks.append(hooks)
+            self._update_callbacks()
+
+    def remove(self, hooks: CepticHooks) -> bool:
+        with self._lock:
+            if hooks not in self._hooks:
+                return False
+            self._hooks.remove(hooks)
+            self._update_callbacks()
+            return True
+
+    def _get_callbacks(self, method_name: str) -> tuple[Callable, ...]:
+        base_method = getattr(CepticHooks, method_name)
+        return tuple(getattr(hooks, method_name) for hooks in self._hooks
+                     if getattr(type(hooks), method_name, base_method) is not base_method)
+
+    def _update_callbacks(self) -> None:
+        # tuples are replaced whole, so threads calling them never see a partial update
+        self.connection_accepted = self._get_callbacks("on_connection_accepted")
+        self.handshake_done = self._get_callbacks("on_handshake_done")
+        self.stream_opened = self._get_callbacks("on_stream_opened")
+        self.stream_closed = self._get_callbacks("on_stream_closed")
+        self.frame_sent = self._get_callbacks("on_frame_sent")
+        self.frame_received = self._get_callbacks("on_frame_received")
+        self.endpoint_start = self._get_callbacks("on_endpoint_start")
+        self.endpoint_end = self._get_callbacks("on_endpoint_end")
+        self.request_start = self._get_callbacks("on_request_start")
+        self.request_end = self._get_callbacks("on_request_end")
+
+    @staticmethod
+    def call(callbacks: tuple[Callable, ...], *args) -> None:
+        for callback in callbacks:
+            try:
+                callback(*args)
+            except Exception:
+                hook_log.warning("hook %r raised", callback, exc_info=True)
@@ -1,7 +1,13 @@
+import os
+
 from ceptic.client import CepticClient, ClientSettings
 from ceptic.security import SecuritySettings
 from ceptic.server import ServerSettings, CepticServer
 
+TESTS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+SERVER_CERTS = os.path.join(TESTS_DIR, "server_certs")
+CLIENT_CERTS = os.path.join(TESTS_DIR, "client_certs")
+
 
 def create_unsecure_server(settings: ServerSettings = None, verbose: bool = None) -> CepticServer:
     settings = settings if settings else ServerSettings(verbose=verbose is True)
@@ -14,9 +20,14 @@ def create_unsecure_client(settings: ClientSettings = None) -> CepticClient:
 
 
 def create_secure_server(settings: ServerSettings = None, verbose: bool = None) -> CepticServer:
-    pass
+    settings = settings if settings else ServerSettings(verbose=verbose is True)
+    security = SecuritySettings.server(local_cert=os.path.join(SERVER_CERTS, "cert_server.pem"),
+                                       local_key=os.path.join(SERVER_CERTS, "key_server.pem"))
+    return CepticServer(security=security, settings=settings)
 
 
 def create_secure_client(settings: ClientSettings = None) -> CepticClient:
-    pass
+    settings = settings if settings else ClientSettings()
+    security = SecuritySettings.client(remote_cert=os.path.join(CLIENT_CERTS, "cert_server.pem"), verify_remote=False)
+    return CepticClient(settings=settings, security=security)
 
@@ -0,0 +1,17 @@
+from time import sleep
+from typing import Callable
+
+from ceptic.stream import Timer
+
+
+def wait_until(condition: Callable[[], bool], timeout: float = 2.0) -> bool:
+    """
+    Check condition every 10 ms until it is true or timeout passes; returns if it became true.
+    """
+    timer = Timer()
+    timer.start()
+    while not condition():
+        if timer.get_time_current() > timeout:
+            return False
+        sleep(0.01)
+    return True
@@ -1,10 +1,15 @@
+import logging
 import uuid
 from time import sleep
 
-from ceptic.common import CepticStatusCode, CommandType
+import pytest
+
+from ceptic.client import ClientSettings
+from ceptic.common import CepticStatusCode, CommandType, CepticRequestVerifyException
+from ceptic.server import ServerSettings
 from ceptic.stream import CepticRequest, CepticResponse, Timer, StreamException
-from tests.helpers.cepticinitializers import create_unsecure_client, create_unsecure_server
-from tests.helpers.fixtures import context
+from tests.helpers.cepticinitializers import create_unsecure_client, create_unsecure_server, create_secure_client, \
+    create_secure_server
 
 
 def test_command_unsecure_success(context):
@@ -183,3 +188,388 @@ def test_command_unsecure_echo_queryparams_success(context):
 
     assert request.content_length == len(expected_body)
     assert response.content_length == len(expected_body)
+
+
+def test_command_unsecure_eager_body_echo_success(context):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(eager_body=True))
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+    endpoint = "/"
+
+    expected_body = "Hello world!".encode()
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    server.add_command(command)
+    server.add_route(command, endpoint, entry)
+
+    request = CepticRequest(CommandType.GET, f"localhost{endpoint}", body=expected_body)
+    # Act
+    server.start()
+    response = client.connect(request)
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert response.body == expected_body
+    assert not response.exchange
+    manager = next(iter(client.managers.values()))
+    assert manager.settings.eager_body is True
+
+
+def test_command_unsecure_eager_body_rejected_discards_body(context):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(eager_body=True))
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    server.add_command(command)
+    server.add_route(command, "/", entry)
+
+    # Act
+    server.start()
+    rejected = client.connect(CepticRequest(CommandType.GET, "localhost/missing", body=bytes(100000)))
+    accepted = client.connect(CepticRequest(CommandType.GET, "localhost/", body="Hello world!".encode()))
+    # Assert
+    assert rejected.status == CepticStatusCode.BAD_REQUEST
+    assert accepted.status == CepticStatusCode.OK
+    assert accepted.body == "Hello world!".encode()
+
+
+@pytest.mark.parametrize("flow_control", [True, False])
+def test_command_unsecure_eager_body_rejected_while_sending(context, flow_control):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(eager_body=True, flow_control=flow_control, legacy_handshake=False))
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    server.add_command(command)
+    server.add_route(command, "/", entry)
+
+    # Act
+    server.start()
+    # body spans many frames, so server rejects request and closes stream while client is still sending it
+    rejected = client.connect(CepticRequest(CommandType.GET, "localhost/missing", body=bytes(50000000)))
+    accepted = client.connect(CepticRequest(CommandType.GET, "localhost/", body="Hello world!".encode()))
+    # Assert
+    assert rejected.status == CepticStatusCode.BAD_REQUEST
+    assert accepted.status == CepticStatusCode.OK
+    assert accepted.body == "Hello world!".encode()
+
+
+def test_command_unsecure_eager_body_not_negotiated_success(context):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(eager_body=True))
+    server = create_unsecure_server(ServerSettings(verbose=True, eager_body=False))
+    context.server = server
+
+    command = CommandType.GET
+    endpoint = "/"
+
+    expected_body = "Hello world!".encode()
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    server.add_command(command)
+    server.add_route(command, endpoint, entry)
+
+    request = CepticRequest(CommandType.GET, f"localhost{endpoint}", body=expected_body)
+    # Act
+    server.start()
+    response = client.connect(request)
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert response.body == expected_body
+    manager = next(iter(client.managers.values()))
+    assert manager.settings.eager_body is False
+
+
+def test_command_unsecure_connect_async_success(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+    endpoint = "/"
+
+    expected_body = "Hello world!".encode()
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    server.add_command(command)
+    server.add_route(command, endpoint, entry)
+
+    request = CepticRequest(CommandType.GET, f"localhost{endpoint}", body=expected_body)
+    # Act
+    server.start()
+    future = client.connect_async(request)
+    response = future.result(timeout=5)
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert response.body == expected_body
+
+
+def test_command_unsecure_connect_many_success(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+    endpoint = "/"
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    server.add_command(command)
+    server.add_route(command, endpoint, entry)
+
+    requests = [CepticRequest(CommandType.GET, f"localhost{endpoint}", body=f"{i}".encode()) for i in range(200)]
+    # Act
+    server.start()
+    results = list(client.connect_many(requests, max_concurrency=16))
+    # Assert
+    assert len(results) == len(requests)
+    for result in results:
+        assert not result.has_error()
+        assert result.response.status == CepticStatusCode.OK
+        assert result.response.body == result.request.body
+    # all requests should have shared one manager
+    assert len(client.destination_map["localhost:9000"]) == 1
+
+
+def test_command_unsecure_manager_pool_min_count_success(context):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(manager_min_count=3))
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+    endpoint = "/"
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(command)
+    server.add_route(command, endpoint, entry)
+
+    # Act
+    server.start()
+    for i in range(10):
+        response = client.connect(CepticRequest(CommandType.GET, f"localhost{endpoint}"))
+        assert response.status == CepticStatusCode.OK
+    # Assert
+    assert len(client.destination_map["localhost:9000"]) == 3
+
+
+def test_command_unsecure_manager_pool_threshold_success(context):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(manager_max_count=4, manager_handler_threshold=2))
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+    endpoint = "/"
+
+    def entry(request: CepticRequest):
+        sleep(0.05)
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(command)
+    server.add_route(command, endpoint, entry)
+
+    requests = [CepticRequest(CommandType.GET, f"localhost{endpoint}") for _ in range(40)]
+    # Act
+    server.start()
+    results = list(client.connect_many(requests, max_concurrency=16))
+    # Assert
+    assert all(not result.has_error() for result in results)
+    assert len(client.destination_map["localhost:9000"]) == 4
+
+
+def test_command_unsecure_prewarm_success(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+    endpoint = "/"
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(command)
+    server.add_route(command, endpoint, entry)
+
+    # Act
+    server.start()
+    created = client.prewarm("localhost", 2)
+    response = client.connect(CepticRequest(CommandType.GET, f"localhost{endpoint}"))
+    # Assert
+    assert len(created) == 2
+    assert response.status == CepticStatusCode.OK
+    assert len(client.destination_map["localhost:9000"]) == 2
+
+
+def test_command_unsecure_maintain_reconnects_success(context):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(maintain_delay=0.05))
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+    endpoint = "/"
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(command)
+    server.add_route(command, endpoint, entry)
+
+    def wait_for_active_managers(count: int) -> list:
+        timer = Timer()
+        timer.start()
+        while timer.get_time_current() < 2.0:
+            active = client.destination_map["localhost:9000"].get_active_managers() \
+                if "localhost:9000" in client.destination_map else []
+            if len(active) == count:
+                return active
+            sleep(0.01)
+        raise AssertionError(f"did not reach {count} active managers")
+
+    # Act
+    server.start()
+    client.maintain("localhost", 2)
+    first_managers = wait_for_active_managers(2)
+    first_managers[0].stop("stopped by test")
+    second_managers = wait_for_active_managers(2)
+    response = client.connect(CepticRequest(CommandType.GET, f"localhost{endpoint}"))
+    client.stop()
+    # Assert
+    assert first_managers[0] not in second_managers
+    assert response.status == CepticStatusCode.OK
+
+
+def test_command_secure_echo_body_success(context):
+    # Arrange
+    client = create_secure_client()
+    server = create_secure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+    endpoint = "/"
+
+    expected_body = "Hello world!".encode()
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    server.add_command(command)
+    server.add_route(command, endpoint, entry)
+
+    request = CepticRequest(CommandType.GET, f"localhost{endpoint}", body=expected_body)
+    # Act
+    server.start()
+    response = client.connect(request)
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert response.body == expected_body
+
+
+def test_command_secure_standalone_session_resumed_success(context):
+    # Arrange
+    client = create_secure_client()
+    server = create_secure_server(verbose=True)
+    context.server = server
+
+    command = CommandType.GET
+    endpoint = "/"
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(command)
+    server.add_route(command, endpoint, entry)
+
+    # Act
+    server.start()
+    for i in range(5):
+        response = client.connect_standalone(CepticRequest(CommandType.GET, f"localhost{endpoint}"))
+        assert response.status == CepticStatusCode.OK
+    # Assert
+    client_stats = client.get_tls_session_stats()
+    server_stats = server.get_tls_session_stats()
+    assert client_stats["handshakes"] == 5
+    assert client_stats["resumed"] == 4
+    assert server_stats["resumed"] == 4
+    assert client_stats["reuse_rate"] == 0.8
+
+
+def test_command_unsecure_priority_header_success(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=str(request.stream.priority).encode())
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+
+    request = CepticRequest(CommandType.GET, "localhost/")
+    request.priority = 64
+    invalid_request = CepticRequest(CommandType.GET, "localhost/")
+    invalid_request.priority = "high"
+
+    # Act
+    response = client.connect(request)
+
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert response.body == b"64"
+    with pytest.raises(CepticRequestVerifyException):
+        client.connect(invalid_request)
+
+
+def test_command_unsecure_endpoint_exception_logged_and_closed(context, caplog):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server()
+    context.server = server
+
+    def entry(request: CepticRequest):
+        raise ValueError("broken endpoint")
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    caplog.set_level(logging.DEBUG, logger="ceptic.stream.frames")
+
+    # Act
+    server.start()
+    with pytest.raises(StreamException):
+        client.connect(CepticRequest(CommandType.GET, "localhost/"))
+
+    # Assert
+    records = [record for record in caplog.records if record.name == "ceptic.endpoint"]
+    assert records[-1].levelno == logging.ERROR
+    assert records[-1].exc_info[0] is ValueError
+    frames = [record for record in caplog.records if record.name == "ceptic.stream.frames"]
+    assert any(record.getMessage().startswith("sent header frame") for record in frames)
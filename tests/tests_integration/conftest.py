@@ -0,0 +1,4 @@
+# fixtures shared by integration tests; listed in __all__ so that test modules need not import them
+from tests.helpers.fixtures import context
+
+__all__ = ["context"]
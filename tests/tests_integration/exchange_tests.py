@@ -2,12 +2,12 @@ from time import sleep
 
 import pytest
 
-from ceptic.client import CepticClient
+from ceptic.client import CepticClient, ClientSettings
 from ceptic.common import CommandType, CepticStatusCode
 from ceptic.security import SecuritySettings
+from ceptic.server import ServerSettings
 from ceptic.stream import CepticRequest, CepticResponse, Timer, StreamException, StreamClosedException
 from tests.helpers.cepticinitializers import create_unsecure_client, create_unsecure_server
-from tests.helpers.fixtures import context
 
 
 def test_exchange_unsecure_success(context):
@@ -158,3 +158,94 @@ def test_exchange_unsecure_echo1000_success(context):
 #         stream.send_close()
 #
 #     client.stop()
+
+
+def test_exchange_unsecure_unread_stream_does_not_block_connection(context):
+    # Arrange
+    # small windows so that flooded stream fills its window quickly
+    client = create_unsecure_client(ClientSettings(frame_min_size=1000, frame_max_size=10000,
+                                                   read_buffer_size=20000, send_buffer_size=20000,
+                                                   legacy_handshake=False))
+    server = create_unsecure_server(ServerSettings(frame_min_size=1000, frame_max_size=10000,
+                                                   read_buffer_size=20000, send_buffer_size=20000, verbose=True))
+    context.server = server
+    flood_size = 200000
+
+    def flood_entry(r: CepticRequest):
+        stream = r.begin_exchange()
+        if not stream:
+            return CepticResponse(CepticStatusCode.UNEXPECTED_END)
+        try:
+            stream.send(b"x" * flood_size)
+            return CepticResponse(CepticStatusCode.EXCHANGE_END)
+        except StreamException:
+            return CepticResponse(CepticStatusCode.UNEXPECTED_END)
+
+    def echo_entry(r: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=r.body)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/flood", flood_entry)
+    server.add_route(CommandType.GET, "/", echo_entry)
+    server.start()
+
+    flood_request = CepticRequest(CommandType.GET, "localhost/flood")
+    flood_request.exchange = True
+
+    # Act
+    flood_response = client.connect(flood_request)
+    # give server time to fill flooded stream's window
+    sleep(0.2)
+    timer = Timer()
+    timer.start()
+    echo_response = client.connect(CepticRequest(CommandType.GET, "localhost/", body=b"hi"))
+    elapsed = timer.stop()
+    data = flood_response.stream.read(flood_size)
+    last_data = flood_response.stream.read(1000)
+
+    # Assert
+    assert echo_response.status == CepticStatusCode.OK
+    assert echo_response.body == b"hi"
+    assert elapsed < 1.0
+    assert data.is_data() is True
+    assert len(data.data) == flood_size
+    assert last_data.is_response() is True
+    assert last_data.response.status == CepticStatusCode.EXCHANGE_END
+    assert len(client.destination_map["localhost:9000"]) == 1
+
+
+def test_exchange_unsecure_echo_without_flow_control_success(context):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(flow_control=False))
+    server = create_unsecure_server(verbose=True)
+    context.server = server
+
+    def entry(r: CepticRequest):
+        stream = r.begin_exchange()
+        if not stream:
+            return CepticResponse(CepticStatusCode.UNEXPECTED_END)
+        try:
+            data = stream.read(1000)
+            stream.send(data.data)
+            return CepticResponse(CepticStatusCode.EXCHANGE_END)
+        except StreamException:
+            return CepticResponse(CepticStatusCode.UNEXPECTED_END)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+
+    request = CepticRequest(CommandType.GET, "localhost/")
+    request.exchange = True
+
+    # Act
+    response = client.connect(request)
+    stream = response.stream
+    stream.send(b"echo")
+    data = stream.read(1000)
+    last_data = stream.read(1000)
+
+    # Assert
+    assert stream.settings.flow_control is False
+    assert data.data == b"echo"
+    assert last_data.response.status == CepticStatusCode.EXCHANGE_END
@@ -0,0 +1,228 @@
+import socket
+from threading import Thread
+from time import sleep
+
+import pytest
+
+from ceptic.client import ClientSettings
+from ceptic.common import CepticStatusCode, CommandType, CepticCapability
+from ceptic.handshake import ClientHandshake, ServerHandshake
+from ceptic.net import SocketCeptic
+from ceptic.server import ServerSettings
+from ceptic.stream import CepticRequest, CepticResponse, Timer
+from tests.helpers.cepticinitializers import create_unsecure_client, create_unsecure_server, create_secure_server
+
+
+def add_echo_route(server):
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+
+
+def test_handshake_unsecure_slow_client_dropped_by_deadline(context):
+    # Arrange
+    server = create_unsecure_server(ServerSettings(verbose=True, handshake_timeout=0.5))
+    context.server = server
+    add_echo_route(server)
+    server.start()
+
+    raw_s = socket.create_connection(("localhost", 9000))
+    raw_s.settimeout(3)
+    timer = Timer()
+    timer.start()
+    # Act
+    # trickle in bytes, never finishing handshake
+    closed = False
+    while timer.get_time_current() < 3:
+        try:
+            raw_s.send(b" ")
+            if raw_s.recv(1) == b"":
+                closed = True
+                break
+        except socket.timeout:
+            continue
+        except OSError:
+            closed = True
+            break
+    elapsed = timer.get_time_current()
+    raw_s.close()
+    # Assert
+    assert closed
+    assert elapsed < 1.5
+
+
+def test_handshake_secure_slow_client_dropped_by_deadline(context):
+    # Arrange
+    server = create_secure_server(ServerSettings(verbose=True, handshake_timeout=0.5))
+    context.server = server
+    add_echo_route(server)
+    server.start()
+
+    raw_s = socket.create_connection(("localhost", 9000))
+    raw_s.settimeout(3)
+    timer = Timer()
+    timer.start()
+    # Act
+    # never send tls client hello
+    try:
+        data = raw_s.recv(1)
+    except OSError:
+        data = b""
+    elapsed = timer.get_time_current()
+    raw_s.close()
+    # Assert
+    assert data == b""
+    assert elapsed < 1.5
+
+
+def test_handshake_unsecure_max_count_reached(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server(ServerSettings(verbose=True, handshake_timeout=0.5, handshake_max_count=1))
+    context.server = server
+    add_echo_route(server)
+    server.start()
+
+    # Act & Assert
+    # occupy only handshake slot with a client that never sends settings
+    raw_s = socket.create_connection(("localhost", 9000))
+    sleep(0.1)
+    with pytest.raises(Exception):
+        client.connect(CepticRequest(CommandType.GET, "localhost/"))
+    # once slot's deadline passes, handshakes are accepted again
+    sleep(0.6)
+    response = client.connect(CepticRequest(CommandType.GET, "localhost/", body=b"hi"))
+    raw_s.close()
+    assert response.status == CepticStatusCode.OK
+    assert response.body == b"hi"
+
+
+def test_handshake_compact_sent_as_single_message(context):
+    # Arrange
+    server = create_unsecure_server(ServerSettings(verbose=True))
+    context.server = server
+    add_echo_route(server)
+    server.start()
+
+    raw_s = socket.create_connection(("localhost", 9000))
+    raw_s.settimeout(3)
+    s = SocketCeptic(raw_s)
+    # Act
+    s.send_raw(ClientHandshake("1.0.0", 1024000, 1024000, 1024000, 1024000, 1, 5,
+                               CepticCapability.EAGER_BODY).to_bytes())
+    response = ServerHandshake.from_socket(s)
+    s.close()
+    # Assert
+    assert response.accepted
+    assert response.frame_max_size == 1024000
+    assert response.headers_max_size == 1024000
+    assert response.stream_timeout == 5
+    assert response.capabilities == CepticCapability.EAGER_BODY
+
+
+def test_handshake_compact_rejected_with_error(context):
+    # Arrange
+    server = create_unsecure_server(ServerSettings(verbose=True))
+    context.server = server
+    add_echo_route(server)
+    server.start()
+
+    raw_s = socket.create_connection(("localhost", 9000))
+    raw_s.settimeout(3)
+    s = SocketCeptic(raw_s)
+    # Act
+    # frame size bounds do not overlap with server's
+    s.send_raw(ClientHandshake("1.0.0", 1000, 1000, 1024000, 1024000, 1, 5).to_bytes())
+    response = ServerHandshake.from_socket(s)
+    s.close()
+    # Assert
+    assert not response.accepted
+    assert "frame size" in response.error
+
+
+@pytest.mark.parametrize("eager_body", [False, True])
+def test_handshake_legacy_client(context, eager_body):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(legacy_handshake=True, eager_body=eager_body))
+    server = create_unsecure_server(ServerSettings(verbose=True))
+    context.server = server
+    add_echo_route(server)
+    server.start()
+
+    # Act
+    response = client.connect(CepticRequest(CommandType.GET, "localhost/", body=b"hi"))
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert response.body == b"hi"
+
+
+def test_handshake_default_client_understood_by_legacy_server():
+    # Arrange
+    client = create_unsecure_client()
+    server_socket = socket.create_server(("localhost", 9000))
+    received = []
+
+    # server that predates compact handshake reads fixed-width fields only
+    def run_legacy_server():
+        conn, _ = server_socket.accept()
+        received.append(conn)
+        s = SocketCeptic(conn)
+        data = s.recv_raw(ClientHandshake.LEGACY_SIZE)
+        received.append(data)
+        handshake = ClientHandshake.from_legacy_bytes(data)
+        ServerHandshake(handshake.frame_max_size, handshake.headers_max_size, handshake.stream_timeout, 0).send_legacy(
+            s, ClientHandshake.requested_capabilities_legacy(data))
+
+    thread = Thread(target=run_legacy_server, daemon=True)
+    thread.start()
+
+    # Act
+    try:
+        managers = client.prewarm("localhost:9000", 1)
+        thread.join(1)
+        # Assert
+        assert len(managers) == 1
+        assert not ClientHandshake.is_compact(received[1])
+        assert not managers[0].settings.flow_control
+    finally:
+        client.stop()
+        received[0].close()
+        server_socket.close()
+
+
+def test_handshake_compact_and_legacy_clients_share_server(context):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(legacy_handshake=False))
+    legacy_client = create_unsecure_client(ClientSettings(legacy_handshake=True))
+    server = create_unsecure_server(ServerSettings(verbose=True))
+    context.server = server
+    add_echo_route(server)
+    server.start()
+
+    # Act
+    response = client.connect(CepticRequest(CommandType.GET, "localhost/", body=b"compact"))
+    legacy_response = legacy_client.connect(CepticRequest(CommandType.GET, "localhost/", body=b"legacy"))
+    legacy_client.stop()
+    # Assert
+    assert response.body == b"compact"
+    assert legacy_response.body == b"legacy"
+
+
+@pytest.mark.parametrize("client_compact, server_compact", [(True, True), (True, False), (False, True)])
+def test_handshake_compact_frames_negotiated(context, client_compact, server_compact):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(compact_frames=client_compact))
+    server = create_unsecure_server(ServerSettings(verbose=True, compact_frames=server_compact))
+    context.server = server
+    add_echo_route(server)
+    server.start()
+
+    # Act
+    response = client.connect(CepticRequest(CommandType.GET, "localhost/", body=b"hi"))
+    manager = next(iter(client.managers.values()))
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert response.body == b"hi"
+    assert manager.settings.compact_frames == (client_compact and server_compact)
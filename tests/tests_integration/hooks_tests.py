@@ -0,0 +1,119 @@
+from threading import Lock
+
+from ceptic.client import ClientSettings
+from ceptic.common import CepticStatusCode, CommandType
+from ceptic.stream import CepticRequest, CepticResponse
+from ceptic.tracing import CepticHooks
+from tests.helpers.cepticinitializers import create_unsecure_client, create_unsecure_server
+from tests.helpers.waiting import wait_until
+
+
+class RecordingHooks(CepticHooks):
+    def __init__(self):
+        self.events = []
+        self.trace_ids = []
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.lock = Lock()
+
+    def add_event(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def on_connection_accepted(self, address):
+        self.add_event("connection_accepted")
+
+    def on_handshake_done(self, manager, duration):
+        self.add_event("handshake_done")
+
+    def on_stream_opened(self, manager, handler):
+        self.add_event("stream_opened")
+
+    def on_stream_closed(self, manager, handler):
+        self.add_event("stream_closed")
+
+    def on_frame_sent(self, manager, frame):
+        self.frames_sent += 1
+
+    def on_frame_received(self, manager, frame):
+        self.frames_received += 1
+
+    def on_endpoint_start(self, request):
+        self.add_event("endpoint_start")
+        self.trace_ids.append(request.trace_id)
+
+    def on_endpoint_end(self, request, response, duration):
+        self.add_event("endpoint_end")
+
+    def on_request_start(self, request):
+        self.add_event("request_start")
+        self.trace_ids.append(request.trace_id)
+
+    def on_request_end(self, request, response, duration):
+        self.add_event("request_end")
+        self.trace_ids.append(response.trace_id)
+
+
+def test_hooks_unsecure_hooks_and_trace_id(context):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(trace_ids=True))
+    server = create_unsecure_server()
+    context.server = server
+    client_hooks = RecordingHooks()
+    server_hooks = RecordingHooks()
+    client.add_hooks(client_hooks)
+    server.add_hooks(server_hooks)
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+
+    request = CepticRequest(CommandType.GET, "localhost")
+    # Act
+    response = client.connect(request)
+    # server closes its stream after sending response
+    wait_until(lambda: "stream_closed" in server_hooks.events)
+    client.stop()
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert request.trace_id is not None
+    # trace id is sent to server and echoed back
+    assert response.trace_id == request.trace_id
+    assert client_hooks.trace_ids == [request.trace_id] * 2
+    assert server_hooks.trace_ids == [request.trace_id]
+    assert client_hooks.events[:3] == ["handshake_done", "stream_opened", "request_start"]
+    assert "request_end" in client_hooks.events
+    assert server_hooks.events[:2] == ["connection_accepted", "handshake_done"]
+    assert server_hooks.events.index("endpoint_start") < server_hooks.events.index("endpoint_end")
+    assert "stream_opened" in server_hooks.events
+    assert "stream_closed" in server_hooks.events
+    assert client_hooks.frames_sent > 0 and client_hooks.frames_received > 0
+    assert server_hooks.frames_sent > 0 and server_hooks.frames_received > 0
+
+
+def test_hooks_unsecure_removed_hooks_not_called(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server()
+    context.server = server
+    hooks = RecordingHooks()
+    client.add_hooks(hooks)
+    client.remove_hooks(hooks)
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+    # Act
+    response = client.connect(CepticRequest(CommandType.GET, "localhost"))
+    client.stop()
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert response.trace_id is None
+    assert hooks.events == []
+    assert hooks.frames_sent == 0
@@ -0,0 +1,167 @@
+from threading import Event
+from time import monotonic, sleep
+
+import pytest
+
+from ceptic.common import CepticStatusCode, CommandType, CepticException
+from ceptic.server import ServerSettings
+from ceptic.stream import CepticRequest, CepticResponse
+from tests.helpers.cepticinitializers import create_unsecure_client, create_unsecure_server
+from tests.helpers.waiting import wait_until
+
+
+def test_overload_unsecure_stream_limit(context):
+    # Arrange
+    server = create_unsecure_server(ServerSettings(stream_max_count=1))
+    context.server = server
+    release = Event()
+
+    def entry(request: CepticRequest):
+        if request.body == b"hold":
+            release.wait(5)
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+    client = create_unsecure_client()
+    held = client.connect_async(CepticRequest(CommandType.GET, "localhost/", body=b"hold"))
+    assert wait_until(lambda: server.admission.stream_count == 1)
+
+    # Act
+    rejected = client.connect(CepticRequest(CommandType.GET, "localhost/"))
+    release.set()
+    held_response = held.result(timeout=5)
+    assert wait_until(lambda: server.admission.stream_count == 0)
+    admitted = client.connect(CepticRequest(CommandType.GET, "localhost/"))
+    client.stop()
+
+    # Assert
+    assert rejected.status == CepticStatusCode.SERVICE_UNAVAILABLE
+    assert rejected.errors == ["server stream limit of 1 reached"]
+    assert held_response.status == CepticStatusCode.OK
+    assert admitted.status == CepticStatusCode.OK
+    assert server.get_stats()["streams_rejected"] == {"stream_limit": 1}
+    assert 'ceptic_streams_rejected_total{reason="stream_limit"} 1' in server.get_openmetrics()
+
+
+def test_overload_unsecure_inflight_bytes_limit(context):
+    # Arrange
+    server = create_unsecure_server(ServerSettings(inflight_bytes_max=10))
+    context.server = server
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK, body=request.body))
+    server.start()
+    client = create_unsecure_client()
+
+    # Act
+    rejected = client.connect(CepticRequest(CommandType.GET, "localhost/", body=b"x" * 11))
+    admitted = client.connect(CepticRequest(CommandType.GET, "localhost/", body=b"x" * 10))
+    client.stop()
+
+    # Assert
+    assert rejected.status == CepticStatusCode.SERVICE_UNAVAILABLE
+    assert admitted.status == CepticStatusCode.OK
+    assert admitted.body == b"x" * 10
+    assert server.admission.get_stats()["inflight_bytes"] == 0
+    assert server.get_stats()["streams_rejected"] == {"byte_limit": 1}
+
+
+def test_overload_unsecure_shed_when_overloaded(context):
+    # Arrange
+    server = create_unsecure_server(ServerSettings(shed_target=1e-9, shed_interval=60.0, worker_max_count=1))
+    context.server = server
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK))
+    server.start()
+    client = create_unsecure_client()
+    # while not overloaded, only streams waiting longer than interval are shed
+    assert client.connect(CepticRequest(CommandType.GET, "localhost/")).status == CepticStatusCode.OK
+
+    # Act
+    server.admission.codel.overloaded = True
+    response = client.connect(CepticRequest(CommandType.GET, "localhost/"))
+    client.stop()
+
+    # Assert
+    assert response.status == CepticStatusCode.SERVICE_UNAVAILABLE
+    assert response.errors == ["server is overloaded"]
+    assert server.get_stats()["admission"]["overloaded"]
+    assert server.get_stats()["streams_rejected"] == {"shed": 1}
+
+
+def test_overload_unsecure_shed_under_sustained_endpoint_slowness(context):
+    # Arrange
+    server = create_unsecure_server(ServerSettings(worker_max_count=2, shed_target=0.05, shed_interval=0.1))
+    context.server = server
+
+    def entry(request: CepticRequest):
+        sleep(0.2)
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+    client = create_unsecure_client()
+
+    # Act
+    # 30 requests take 3 seconds on 2 workers, so queue keeps growing unless streams are shed
+    start = monotonic()
+    futures = [client.connect_async(CepticRequest(CommandType.GET, "localhost/")) for _ in range(30)]
+    responses = [future.result(timeout=5) for future in futures]
+    elapsed = monotonic() - start
+    client.stop()
+
+    # Assert
+    handled = [response for response in responses if response.status == CepticStatusCode.OK]
+    shed = [response for response in responses if response.status == CepticStatusCode.SERVICE_UNAVAILABLE]
+    assert len(handled) + len(shed) == len(responses)
+    assert handled
+    assert shed
+    assert all(response.errors == ["server is overloaded"] for response in shed)
+    assert server.get_stats()["streams_rejected"] == {"shed": len(shed)}
+    assert elapsed < 2.0
+
+
+def test_overload_unsecure_connection_limit(context):
+    # Arrange
+    server = create_unsecure_server(ServerSettings(connection_max_count=1))
+    context.server = server
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK))
+    server.start()
+    first_client = create_unsecure_client()
+    second_client = create_unsecure_client()
+    assert first_client.connect(CepticRequest(CommandType.GET, "localhost/")).status == CepticStatusCode.OK
+
+    # Act and Assert
+    try:
+        with pytest.raises(CepticException):
+            second_client.connect(CepticRequest(CommandType.GET, "localhost/"))
+        assert server.get_stats()["connections"]["rejected"] == 1
+    finally:
+        first_client.stop()
+        second_client.stop()
+
+
+def test_overload_unsecure_connection_limit_counts_only_open_connections(context):
+    # Arrange
+    server = create_unsecure_server(ServerSettings(connection_max_count=2))
+    context.server = server
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK))
+    server.start()
+
+    # Act
+    responses = []
+    for _ in range(5):
+        client = create_unsecure_client()
+        responses.append(client.connect(CepticRequest(CommandType.GET, "localhost/")))
+        client.stop()
+        # closed connection no longer counts towards limit once server notices it
+        assert wait_until(lambda: not server.managers)
+
+    # Assert
+    assert [response.status for response in responses] == [CepticStatusCode.OK] * 5
+    assert server.get_stats()["connections"]["rejected"] == 0
+    assert server.get_stats()["connections"]["closed"] == 5
@@ -0,0 +1,127 @@
+import os
+import socket
+import sys
+from time import sleep
+
+import pytest
+
+from ceptic.common import CepticStatusCode, CommandType
+from ceptic.server import ServerSettings
+from ceptic.stream import CepticRequest, CepticResponse
+from tests.helpers.cepticinitializers import create_unsecure_client, create_unsecure_server, TESTS_DIR
+from tests.helpers.waiting import wait_until
+
+# serves same route as old server, but answers with b"new", until stopped or timed out
+SUCCESSOR = """
+from time import sleep
+from ceptic.common import CepticStatusCode, CommandType
+from ceptic.handoff import inherit_listen_socket
+from ceptic.security import SecuritySettings
+from ceptic.server import CepticServer
+from ceptic.stream import CepticResponse
+server = CepticServer(SecuritySettings.server_unsecure(), listen_socket=inherit_listen_socket())
+server.add_command(CommandType.GET)
+server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK, body=b"new"))
+server.start()
+sleep(20)
+server.stop()
+"""
+
+
+def create_listen_socket() -> socket.socket:
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.bind(("", 0))
+    listen_socket.listen()
+    return listen_socket
+
+
+@pytest.mark.parametrize("as_fd", [False, True])
+def test_restart_unsecure_given_listen_socket(context, as_fd):
+    # Arrange
+    listen_socket = create_listen_socket()
+    port = listen_socket.getsockname()[1]
+    server = create_unsecure_server()
+    server = type(server)(security=server.security, settings=server.settings,
+                          listen_socket=listen_socket.detach() if as_fd else listen_socket)
+    context.server = server
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK, body=b"pong"))
+    client = create_unsecure_client()
+    # Act
+    server.start()
+    response = client.connect(CepticRequest(CommandType.GET, f"localhost:{port}/"))
+    client.stop()
+    # Assert
+    assert server.port == port
+    assert response.status == CepticStatusCode.OK
+    assert response.body == b"pong"
+
+
+def test_restart_unsecure_bind_error_raised_by_start():
+    # Arrange
+    taken = create_listen_socket()
+    server = create_unsecure_server(ServerSettings(port=taken.getsockname()[1]))
+    # Act and Assert
+    try:
+        with pytest.raises(OSError):
+            server.start()
+        assert not server.run_thread.is_alive()
+    finally:
+        taken.close()
+
+
+def test_restart_unsecure_port_zero_accepting_once_started(context):
+    # Arrange
+    server = create_unsecure_server(ServerSettings(port=0))
+    context.server = server
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK))
+    client = create_unsecure_client()
+    # Act
+    server.start()
+    # no wait needed, since socket is bound and listening once start returns
+    response = client.connect(CepticRequest(CommandType.GET, f"localhost:{server.port}/"))
+    client.stop()
+    # Assert
+    assert server.port != 0
+    assert response.status == CepticStatusCode.OK
+
+
+def test_restart_unsecure_hand_off_to_new_process(context, monkeypatch):
+    # Arrange
+    repo_dir = os.path.dirname(os.path.realpath(TESTS_DIR))
+    monkeypatch.setenv("PYTHONPATH", os.pathsep.join(filter(None, [repo_dir, os.environ.get("PYTHONPATH")])))
+    server = create_unsecure_server(ServerSettings(port=0))
+    context.server = server
+
+    def entry(request: CepticRequest):
+        if request.body == b"slow":
+            sleep(0.5)
+        return CepticResponse(CepticStatusCode.OK, body=b"old")
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+    url = f"localhost:{server.port}/"
+    client = create_unsecure_client()
+    slow_future = client.connect_async(CepticRequest(CommandType.GET, url, body=b"slow"))
+    assert wait_until(lambda: any(manager.get_handler_count() for manager in list(server.managers.values())))
+
+    # Act
+    process = server.hand_off([sys.executable, "-c", SUCCESSOR], drain_timeout=5.0)
+    try:
+        slow_response = slow_future.result(timeout=5)
+        assert wait_until(server.is_stopped, timeout=5.0)
+        # old server is gone, so every connection is now accepted by new process
+        new_client = create_unsecure_client()
+        responses = [new_client.connect(CepticRequest(CommandType.GET, url)) for _ in range(3)]
+        new_client.stop()
+    finally:
+        client.stop()
+        process.kill()
+        process.wait()
+
+    # Assert
+    assert slow_response.status == CepticStatusCode.OK
+    assert slow_response.body == b"old"
+    assert [response.body for response in responses] == [b"new"] * 3
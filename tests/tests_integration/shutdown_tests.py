@@ -0,0 +1,76 @@
+from time import sleep
+
+import pytest
+
+from ceptic.client import ClientSettings
+from ceptic.common import CepticStatusCode, CommandType
+from ceptic.server import ServerSettings
+from ceptic.stream import CepticRequest, CepticResponse
+from tests.helpers.cepticinitializers import create_unsecure_client, create_unsecure_server
+from tests.helpers.waiting import wait_until
+
+
+@pytest.mark.parametrize("client_goaway", [True, False])
+def test_shutdown_unsecure_drain_finishes_in_flight(context, client_goaway):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(goaway=client_goaway))
+    server = create_unsecure_server(ServerSettings(verbose=True))
+    context.server = server
+
+    def entry(request: CepticRequest):
+        sleep(0.5)
+        return CepticResponse(CepticStatusCode.OK, body=b"done")
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+
+    # Act
+    future = client.connect_async(CepticRequest(CommandType.GET, "localhost/"))
+    assert wait_until(lambda: any(manager.get_handler_count() for manager in list(server.managers.values())))
+    client_manager = next(iter(client.managers.values()))
+    server.stop(drain_timeout=5.0)
+    response = future.result(timeout=5)
+
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert response.body == b"done"
+    # with GOAWAY, client was told to go away and closes connection once its stream is done;
+    # otherwise, server stops as soon as last stream is removed, well before drain timeout
+    assert client_manager.peer_going_away == client_goaway
+    assert wait_until(client_manager.is_stopped)
+    assert wait_until(server.is_stopped)
+    client.stop()
+
+
+@pytest.mark.parametrize("client_goaway", [True, False])
+def test_shutdown_unsecure_going_away_moves_new_streams(context, client_goaway):
+    # Arrange
+    client = create_unsecure_client(ClientSettings(goaway=client_goaway))
+    server = create_unsecure_server(ServerSettings(verbose=True))
+    context.server = server
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+    assert client.connect(CepticRequest(CommandType.GET, "localhost/")).status == CepticStatusCode.OK
+    first_manager = next(iter(client.managers.values()))
+    server_manager = next(iter(server.managers.values()))
+
+    # Act
+    server_manager.go_away()
+    if client_goaway:
+        # idle connection is closed by client as soon as it is told to go away
+        assert wait_until(first_manager.is_stopped)
+    # without GOAWAY, client learns of it when its stream is refused, and retries on a new connection
+    response = client.connect(CepticRequest(CommandType.GET, "localhost/"))
+    client.stop()
+
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert first_manager.is_going_away()
+    assert first_manager.settings.goaway == client_goaway
+    assert server.metrics.connections_opened.value == 2
@@ -0,0 +1,117 @@
+from urllib.request import urlopen
+
+from ceptic.common import CepticStatusCode, CommandType
+from ceptic.server import ServerSettings
+from ceptic.stream import CepticRequest, CepticResponse
+from tests.helpers.cepticinitializers import create_unsecure_client, create_unsecure_server
+from tests.helpers.waiting import wait_until
+
+
+def test_stats_unsecure_counts_requests_and_frames(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server()
+    context.server = server
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/items/<item>", entry)
+    server.start()
+
+    request = CepticRequest(CommandType.GET, "localhost/items/1", body=b"x" * 1000)
+    request.encoding = "gzip"
+    # Act
+    response = client.connect(request)
+    client_manager = next(iter(client.managers.values()))
+    # server records latency only after sending response
+    wait_until(lambda: "get /items/<item>" in server.metrics.request_latency)
+    # server forgets manager once client disconnects, so take per-manager stats while it is still open
+    server_stats = server.get_stats(per_manager=True)
+    client.stop()
+    stats = client.get_stats()
+    server_closed = wait_until(lambda: server.get_stats()["connections"]["closed"] == 1)
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    # removed managers are still counted
+    assert stats["connections"] == {"opened": 1, "rejected": 0, "active": 0, "closed": 1}
+    assert stats["handlers_created"] == 1
+    assert stats["frames_sent"]["header"]["frames"] == 1
+    assert stats["frames_sent"]["data"]["bytes"] == client_manager.metrics.sent.bytes[0] > 0
+    assert stats["encode_time"]["count"] >= 1
+    assert stats["decode_time"]["count"] >= 1
+    assert stats["handshake_time"]["count"] == 1
+    assert stats["request_latency"]["get"]["count"] == 1
+    # server keeps latency per route, not per requested endpoint
+    assert server_stats["request_latency"]["get /items/<item>"]["count"] == 1
+    assert server_stats["frames_received"]["data"]["bytes"] == stats["frames_sent"]["data"]["bytes"]
+    assert server_stats["connections"]["opened"] == 1
+    assert len(server_stats["managers"]) == 1
+    assert server_closed
+    assert server_stats["tls"]["handshakes"] == 0
+
+
+def test_stats_unsecure_openmetrics_exporter(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server(ServerSettings(metrics_port=0))
+    context.server = server
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+
+    # Act
+    client.connect(CepticRequest(CommandType.GET, "localhost/"))
+    with urlopen(f"http://localhost:{server.metrics_exporter.port}/metrics", timeout=5) as response:
+        content_type = response.headers["Content-Type"]
+        text = response.read().decode()
+    client.stop()
+
+    # Assert
+    assert content_type.startswith("application/openmetrics-text")
+    lines = text.splitlines()
+    assert lines[-1] == "# EOF"
+    assert "ceptic_connections_opened_total 1" in lines
+    assert "ceptic_streams_created_total 1" in lines
+    assert 'ceptic_request_duration_seconds_count{command="get",route="/"} 1' in lines
+    assert 'ceptic_frames_total{direction="received",type="header"} 1' in lines
+
+
+def test_stats_unsecure_profiling_per_route(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server(ServerSettings(profile_sample_rate=1.0))
+    context.server = server
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK, body=request.body)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/items/<item>", entry)
+    server.start()
+
+    # Act
+    for item in range(3):
+        request = CepticRequest(CommandType.GET, f"localhost/items/{item}", body=b"x" * 1000)
+        request.encoding = "gzip"
+        client.connect(request)
+    # server finishes profile only after sending response
+    wait_until(lambda: server.get_profile_stats().get("get /items/<item>", {}).get("count", 0) >= 3)
+    server.set_profiling(0.0)
+    client.connect(CepticRequest(CommandType.GET, "localhost/items/4"))
+    client.stop()
+    stats = server.get_profile_stats()
+
+    # Assert
+    route_stats = stats["get /items/<item>"]
+    assert route_stats["count"] == 3
+    assert not route_stats["profiled"]
+    for phase in ("parse", "read", "decode", "endpoint", "send", "encode"):
+        assert route_stats["phases"][phase] > 0
+    assert route_stats["wall_time"] >= route_stats["phases"]["endpoint"]
+    assert "get /items/<item>: 3 sampled" in server.dump_profile()
@@ -0,0 +1,216 @@
+import socket
+from threading import Thread
+from time import sleep
+
+from ceptic.client import ClientSettings
+from ceptic.common import CepticStatusCode, CommandType
+from ceptic.handshake import ClientHandshake, ServerHandshake
+from ceptic.net import SocketCeptic
+from ceptic.server import ServerSettings
+from ceptic.stream import CepticRequest, CepticResponse, StreamException
+from tests.helpers.cepticinitializers import create_unsecure_client, create_unsecure_server
+from tests.helpers.waiting import wait_until
+
+
+def create_short_timeout_client():
+    return create_unsecure_client(ClientSettings(stream_min_timeout=1, stream_timeout=1))
+
+
+def create_short_timeout_server():
+    return create_unsecure_server(ServerSettings(stream_min_timeout=1, stream_timeout=1, verbose=True))
+
+
+def test_timeout_unsecure_idle_manager_kept_alive(context):
+    # Arrange
+    client = create_short_timeout_client()
+    server = create_short_timeout_server()
+    context.server = server
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+
+    # Act
+    client.connect(CepticRequest(CommandType.GET, "localhost/"))
+    manager = next(iter(client.managers.values()))
+    # stay idle for longer than stream_timeout
+    sleep(2.5)
+    response = client.connect(CepticRequest(CommandType.GET, "localhost/"))
+
+    # Assert
+    assert response.status == CepticStatusCode.OK
+    assert not manager.is_stopped()
+    assert list(client.managers.values()) == [manager]
+    assert len(server.managers) == 1
+
+
+def test_timeout_unsecure_abandoned_stream_closed(context):
+    # Arrange
+    client = create_short_timeout_client()
+    server = create_short_timeout_server()
+    context.server = server
+
+    def entry(request: CepticRequest):
+        stream = request.begin_exchange()
+        if not stream:
+            return CepticResponse(CepticStatusCode.UNEXPECTED_END)
+        try:
+            while True:
+                stream.read(1000)
+        except StreamException:
+            return CepticResponse(CepticStatusCode.UNEXPECTED_END)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+
+    request = CepticRequest(CommandType.GET, "localhost/")
+    request.exchange = True
+
+    # Act
+    response = client.connect(request)
+    manager = next(iter(client.managers.values()))
+    # abandon stream
+    sleep(2.5)
+
+    # Assert
+    assert response.status == CepticStatusCode.EXCHANGE_START
+    assert response.stream.is_stopped()
+    assert manager.get_handler_count() == 0
+    assert not manager.is_stopped()
+
+
+def test_timeout_unsecure_silent_peer_manager_stopped():
+    # Arrange
+    client = create_short_timeout_client()
+    server_socket = socket.create_server(("localhost", 9000))
+    connections = []
+
+    # peer completes handshake, then never sends anything again
+    def run_silent_server():
+        conn, _ = server_socket.accept()
+        connections.append(conn)
+        s = SocketCeptic(conn)
+        data = s.recv_raw(ClientHandshake.LEGACY_SIZE)
+        handshake = ClientHandshake.from_legacy_bytes(data)
+        ServerHandshake(handshake.frame_max_size, handshake.headers_max_size, handshake.stream_timeout, 0).send_legacy(
+            s, ClientHandshake.requested_capabilities_legacy(data))
+
+    thread = Thread(target=run_silent_server, daemon=True)
+    thread.start()
+
+    # Act
+    try:
+        managers = client.prewarm("localhost:9000", 1)
+        thread.join(1)
+        sleep(2)
+        # Assert
+        assert len(managers) == 1
+        assert managers[0].is_stopped()
+        assert managers[0].stop_reason == "manager timed out"
+    finally:
+        client.stop()
+        for conn in connections:
+            conn.close()
+        server_socket.close()
+
+
+def test_timeout_unsecure_disconnected_client_manager_removed(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server()
+    context.server = server
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK))
+    server.start()
+    client.connect(CepticRequest(CommandType.GET, "localhost/"))
+    server_manager = next(iter(server.managers.values()))
+
+    # Act
+    client.stop()
+
+    # Assert
+    assert wait_until(lambda: not server.managers)
+    assert server_manager.is_stopped()
+    assert server_manager.reaper_entry is None
+    assert server.get_stats()["connections"]["closed"] == 1
+
+
+def test_timeout_unsecure_silent_client_manager_removed(context):
+    # Arrange
+    client = create_short_timeout_client()
+    server = create_short_timeout_server()
+    context.server = server
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK))
+    server.start()
+    client.connect(CepticRequest(CommandType.GET, "localhost/"))
+    server_manager = next(iter(server.managers.values()))
+
+    # Act
+    # without its reaper, client sends no keep alives, so server times manager out
+    client.reaper.stop()
+
+    # Assert
+    try:
+        assert wait_until(lambda: not server.managers, timeout=3.0)
+        assert server_manager.stop_reason == "manager timed out"
+        assert server.get_stats()["connections"]["closed"] == 1
+    finally:
+        client.stop()
+
+
+def test_timeout_unsecure_stopped_standalone_managers_removed(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server()
+    context.server = server
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", lambda request: CepticResponse(CepticStatusCode.OK))
+    server.start()
+    for _ in range(2):
+        client.connect_standalone(CepticRequest(CommandType.GET, "localhost/"))
+    assert len(client.managers) == 2
+    assert len(client.destination_map) == 2
+
+    # Act
+    server.remove_all_managers()
+
+    # Assert
+    try:
+        assert wait_until(lambda: not client.managers)
+        assert client.destination_map == {}
+        assert client.get_stats()["connections"]["closed"] == 2
+    finally:
+        client.stop()
+
+
+def test_timeout_unsecure_stop_wakes_managers_and_server(context):
+    # Arrange
+    client = create_unsecure_client()
+    server = create_unsecure_server()
+    context.server = server
+
+    def entry(request: CepticRequest):
+        return CepticResponse(CepticStatusCode.OK)
+
+    server.add_command(CommandType.GET)
+    server.add_route(CommandType.GET, "/", entry)
+    server.start()
+    client.connect(CepticRequest(CommandType.GET, "localhost/"))
+    client_manager = next(iter(client.managers.values()))
+    server_manager = next(iter(server.managers.values()))
+
+    # Act
+    client.stop()
+    server.stop()
+
+    # Assert
+    # nothing polls, so stopping is done as soon as threads are woken
+    assert client_manager.wait_until_done(0.5)
+    assert server_manager.wait_until_done(0.5)
+    server.run_thread.join(0.5)
+    assert server.is_stopped()
@@ -0,0 +1,86 @@
+import pytest
+
+from ceptic.admission import AdmissionController, CoDel
+from ceptic.endpoint import ServerSettings
+
+
+def test_codel_sheds_only_past_interval_until_overloaded():
+    # Arrange
+    codel = CoDel(target=0.005, interval=0.1)
+    start = codel.interval_end - 0.1
+    # Act and Assert
+    # above target, but not for a whole interval yet
+    assert not codel.should_shed(0.05, start + 0.01)
+    assert codel.should_shed(0.2, start + 0.02)
+    assert not codel.overloaded
+
+
+def test_codel_overloaded_after_interval_above_target():
+    # Arrange
+    codel = CoDel(target=0.005, interval=0.1)
+    start = codel.interval_end - 0.1
+    # Act
+    codel.should_shed(0.01, start + 0.05)
+    # every stream of first interval was above target, so overloaded once it ends
+    shed = codel.should_shed(0.01, start + 0.1)
+    # Assert
+    assert codel.overloaded
+    assert shed
+    assert not codel.should_shed(0.001, start + 0.15)
+
+
+def test_codel_recovers_after_interval_within_target():
+    # Arrange
+    codel = CoDel(target=0.005, interval=0.1)
+    start = codel.interval_end - 0.1
+    codel.should_shed(0.01, start + 0.1)
+    assert codel.overloaded
+    # Act
+    codel.should_shed(0.001, start + 0.15)
+    shed = codel.should_shed(0.01, start + 0.21)
+    # Assert
+    assert not codel.overloaded
+    assert not shed
+
+
+def test_admission_stream_limit():
+    # Arrange
+    admission = AdmissionController(stream_max_count=2)
+    # Act and Assert
+    assert admission.admit_stream(0.0) is None
+    assert admission.admit_stream(0.0) is None
+    assert admission.admit_stream(0.0) == AdmissionController.STREAM_LIMIT
+    admission.release_stream()
+    assert admission.admit_stream(0.0) is None
+    assert admission.get_stats() == {"streams": 2, "inflight_bytes": 0, "overloaded": False}
+
+
+def test_admission_byte_limit():
+    # Arrange
+    admission = AdmissionController(inflight_bytes_max=100)
+    # Act and Assert
+    assert admission.admit_bytes(60) is None
+    assert admission.admit_bytes(41) == AdmissionController.BYTE_LIMIT
+    assert admission.admit_bytes(40) is None
+    # requests without body are never limited
+    assert admission.admit_bytes(0) is None
+    admission.release_bytes(60)
+    assert admission.inflight_bytes == 40
+
+
+def test_admission_unlimited_by_default():
+    # Arrange
+    admission = AdmissionController()
+    # Act and Assert
+    for _ in range(100):
+        assert admission.admit_stream(10.0) is None
+        assert admission.admit_bytes(10 ** 9) is None
+    assert admission.codel is None
+
+
+def test_admission_shedding_requires_worker_pool():
+    # Act and Assert
+    # without a worker pool, streams never wait in a queue, so there is no delay to shed on
+    with pytest.raises(ValueError):
+        ServerSettings(shed_target=0.05)
+    assert ServerSettings(shed_target=0.05, worker_max_count=4).worker_max_count == 4
@@ -5,7 +5,7 @@ import re
 from contextlib import nullcontext as does_not_raise
 
 from ceptic.common import CepticStatusCode
-from ceptic.endpoint import EndpointManager, EndpointEntry, EndpointManagerException, EndpointValue
+from ceptic.endpoint import EndpointManager, EndpointEntry, EndpointManagerException, EndpointValue, CommandSettings
 from ceptic.server import ServerSettings
 from ceptic.stream import CepticResponse
 
@@ -320,3 +320,16 @@ def test_remove_endpoint(manager):
     assert removed is not None
     assert removed.entry == BASIC_ENDPOINT_ENTRY
 # endregion
+
+
+def test_get_endpoint_send_frame_size_combined(manager):
+    # Arrange
+    command = "get"
+    endpoint = "/"
+    manager.add_command(command, CommandSettings.create_with_send_frame_size(1000, 100000))
+    # Act
+    manager.add_endpoint(command, endpoint, BASIC_ENDPOINT_ENTRY, CommandSettings.create_with_send_frame_size(-1, 5000))
+    endpoint_value = manager.get_endpoint(command, endpoint)
+    # Assert
+    assert endpoint_value.settings.send_frame_min_size == 1000
+    assert endpoint_value.settings.send_frame_max_size == 5000
@@ -0,0 +1,53 @@
+import os
+import socket
+
+import pytest
+
+from ceptic.handoff import LISTEN_FD_ENV, inherit_listen_socket, get_handoff_env
+
+
+def test_inherit_listen_socket_none_without_env(monkeypatch):
+    # Arrange
+    monkeypatch.delenv(LISTEN_FD_ENV, raising=False)
+    # Act and Assert
+    assert inherit_listen_socket() is None
+
+
+def test_inherit_listen_socket_adopts_fd(monkeypatch):
+    # Arrange
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.bind(("127.0.0.1", 0))
+    listen_socket.listen()
+    fd = os.dup(listen_socket.fileno())
+    os.set_inheritable(fd, True)
+    monkeypatch.setenv(LISTEN_FD_ENV, str(fd))
+    # Act
+    inherited = inherit_listen_socket()
+    # Assert
+    try:
+        assert inherited.fileno() == fd
+        assert inherited.getsockname() == listen_socket.getsockname()
+        assert not inherited.get_inheritable()
+        assert LISTEN_FD_ENV not in os.environ
+    finally:
+        inherited.close()
+        listen_socket.close()
+
+
+def test_inherit_listen_socket_invalid_env(monkeypatch):
+    # Arrange
+    monkeypatch.setenv(LISTEN_FD_ENV, "socket")
+    # Act and Assert
+    with pytest.raises(ValueError):
+        inherit_listen_socket()
+
+
+def test_get_handoff_env():
+    # Arrange
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Act
+    env = get_handoff_env(listen_socket, {"PATH": "/bin"})
+    listen_socket.close()
+    # Assert
+    assert env == {"PATH": "/bin", LISTEN_FD_ENV: str(env[LISTEN_FD_ENV])}
+    assert int(env[LISTEN_FD_ENV]) >= 0
@@ -0,0 +1,45 @@
+import logging
+
+from ceptic.log import QueueLogging, RateLimitedLogger
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_rate_limited_logger_drops_and_reports():
+    # Arrange
+    logger = logging.getLogger("ceptic.tests.rate")
+    logger.setLevel(logging.DEBUG)
+    handler = ListHandler()
+    logger.addHandler(handler)
+    rate_limited = RateLimitedLogger(logger, rate=2, interval=60.0)
+    # Act
+    for index in range(5):
+        rate_limited.debug("frame %d", index)
+    # start next interval
+    rate_limited.window_start -= 60.0
+    rate_limited.debug("frame %d", 5)
+    logger.removeHandler(handler)
+    # Assert
+    assert handler.messages == ["frame 0", "frame 1", "3 messages dropped by rate limit", "frame 5"]
+
+
+def test_queue_logging_passes_records_to_handlers():
+    # Arrange
+    logger = logging.getLogger("ceptic.tests.queue")
+    logger.setLevel(logging.INFO)
+    handler = ListHandler()
+    queue_logging = QueueLogging([handler], "ceptic.tests.queue").start()
+    # Act
+    logger.info("started on port %d", 9000)
+    # stopping flushes queued records
+    queue_logging.stop()
+    logger.info("after stop")
+    # Assert
+    assert handler.messages == ["started on port 9000"]
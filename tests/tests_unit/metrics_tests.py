@@ -0,0 +1,71 @@
+from ceptic.metrics import FrameCounters, Histogram
+from ceptic.openmetrics import OpenMetricsBuilder
+from ceptic.stream import StreamFrame, StreamManager
+
+
+def test_histogram_percentiles_use_bucket_bounds():
+    # Arrange
+    histogram = Histogram((0.1, 1.0))
+    # Act
+    for value in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+    stats = histogram.get_stats()
+    # Assert
+    assert histogram.get_cumulative_counts() == [2, 3, 4]
+    assert stats["count"] == 4
+    assert stats["sum"] == 5.6
+    assert stats["p50"] == 0.1
+    # values above every bound are reported as max
+    assert stats["p99"] == 5.0
+
+
+def test_histogram_merge():
+    # Arrange
+    first = Histogram((0.1, 1.0))
+    second = Histogram((0.1, 1.0))
+    first.observe(0.05)
+    second.observe(0.5)
+    # Act
+    first.merge(second)
+    # Assert
+    assert first.counts == [1, 1, 0]
+    assert first.count == 2
+    assert first.max == 0.5
+
+
+def test_frame_counters_count_per_type():
+    # Arrange
+    counters = FrameCounters(StreamManager.FRAME_TYPE_NAMES)
+    # Act
+    counters.add(StreamFrame.create_data_last(1, b"hello"))
+    counters.add(StreamFrame.create_data_continued(1, b"hi"))
+    counters.add(StreamFrame.create_close(1))
+    stats = counters.get_stats()
+    # Assert
+    assert stats["data"] == {"frames": 2, "bytes": 7}
+    assert stats["close"] == {"frames": 1, "bytes": 0}
+    assert counters.get_total_frames() == 3
+
+
+def test_openmetrics_builder_histogram_and_escaping():
+    # Arrange
+    builder = OpenMetricsBuilder()
+    histogram = Histogram((0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(5.0)
+    # Act
+    name = builder.add_family("request_duration_seconds", "histogram", "Request duration.", "seconds")
+    builder.add_histogram_samples(name, histogram, {"route": "/a\"b"})
+    text = builder.build()
+    # Assert
+    assert text.splitlines() == [
+        "# TYPE ceptic_request_duration_seconds histogram",
+        "# UNIT ceptic_request_duration_seconds seconds",
+        "# HELP ceptic_request_duration_seconds Request duration.",
+        'ceptic_request_duration_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'ceptic_request_duration_seconds_bucket{route="/a\\"b",le="1.0"} 1',
+        'ceptic_request_duration_seconds_bucket{route="/a\\"b",le="+Inf"} 2',
+        'ceptic_request_duration_seconds_count{route="/a\\"b"} 2',
+        'ceptic_request_duration_seconds_sum{route="/a\\"b"} 5.05',
+        "# EOF",
+    ]
@@ -0,0 +1,48 @@
+import pytest
+
+from ceptic.profiling import Profiler
+
+
+def busy_function():
+    return sum(range(10000))
+
+
+def test_profiler_not_sampled_without_rate():
+    # Arrange
+    profiler = Profiler()
+    # Act
+    profile = profiler.start()
+    # Assert
+    assert profile is None
+
+
+def test_profiler_combines_profiles_per_route():
+    # Arrange
+    profiler = Profiler(1.0, use_cprofile=True)
+    # Act
+    for _ in range(2):
+        profile = profiler.start()
+        busy_function()
+        profile.add("endpoint", 0.5)
+        profiler.finish(profile, "get /items/<item>")
+    # requests matching no route are dropped
+    profiler.finish(profiler.start(), None)
+    stats = profiler.get_stats()
+    dump = profiler.dump()
+    # Assert
+    assert list(stats) == ["get /items/<item>"]
+    assert stats["get /items/<item>"]["count"] == 2
+    assert stats["get /items/<item>"]["phases"]["endpoint"] == 1.0
+    assert stats["get /items/<item>"]["profiled"]
+    assert "get /items/<item>: 2 sampled" in dump
+    assert "busy_function" in dump
+    # cprofile is released once request is finished
+    assert not profiler.cprofile_lock.locked()
+
+
+def test_profiler_rejects_invalid_sample_rate():
+    # Arrange
+    profiler = Profiler()
+    # Act and Assert
+    with pytest.raises(ValueError):
+        profiler.configure(1.5)
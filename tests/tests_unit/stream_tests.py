@@ -0,0 +1,377 @@
+import socket
+import uuid
+from threading import Thread
+from time import sleep
+
+import pytest
+
+from ceptic.net import SocketCeptic
+from ceptic.stream import CreditGate, FlowWindow, ReceiveWindow, SendScheduler, StreamFrame, StreamHandler, \
+    StreamHandlerStoppedException, StreamManager, StreamSettings, TimerWheel, Reaper
+
+
+def test_flow_window_consume_waits_for_grant():
+    # Arrange
+    window = FlowWindow(10)
+    results = []
+    # Act
+    window.consume(10, lambda: False)
+    thread = Thread(target=lambda: results.append(window.consume(5, lambda: False)))
+    thread.start()
+    thread.join(0.1)
+    waited = thread.is_alive()
+    window.grant(5)
+    thread.join(1)
+    # Assert
+    assert waited
+    assert results == [True]
+    assert window.value == 0
+
+
+def test_flow_window_stop_releases_waiters():
+    # Arrange
+    window = FlowWindow(0)
+    results = []
+    thread = Thread(target=lambda: results.append(window.consume(5, lambda: False)))
+    thread.start()
+    # Act
+    window.stop()
+    thread.join(1)
+    # Assert
+    assert results == [False]
+
+
+def test_credit_gate_acquire_waits_for_release():
+    # Arrange
+    gate = CreditGate(10)
+    results = []
+    # Act
+    # empty gate admits amounts larger than capacity
+    admitted_oversized = gate.acquire(15)
+    thread = Thread(target=lambda: results.append(gate.acquire(5)))
+    thread.start()
+    thread.join(0.1)
+    waited = thread.is_alive()
+    gate.release(15)
+    thread.join(1)
+    # Assert
+    assert admitted_oversized
+    assert waited
+    assert results == [True]
+    assert gate.used == 5
+
+
+def test_credit_gate_stop_releases_waiters():
+    # Arrange
+    gate = CreditGate(10)
+    gate.acquire(10)
+    results = []
+    thread = Thread(target=lambda: results.append(gate.acquire(5)))
+    thread.start()
+    # Act
+    gate.stop()
+    thread.join(1)
+    # Assert
+    assert results == [False]
+    assert gate.used == 10
+
+
+def test_receive_window_batches_credit():
+    # Arrange
+    window = ReceiveWindow(100, 10)
+    # Act & Assert
+    assert window.receive(60)
+    # credit is returned once half of window was consumed
+    assert window.consume(30) == 0
+    assert window.consume(20) == 50
+    assert window.used == 10
+
+
+def test_receive_window_exceeded():
+    # Arrange
+    window = ReceiveWindow(100, 10)
+    # Act & Assert
+    assert window.receive(100)
+    assert not window.receive(1)
+
+
+def test_receive_window_threshold_leaves_room_for_frame():
+    # Arrange & Act
+    window = ReceiveWindow(100, 90)
+    # Assert
+    # sender must regain room for a full frame once everything is consumed
+    assert window.threshold == 10
+
+
+def create_scheduler_frames(stream_id: int, count: int) -> list[StreamFrame]:
+    return [StreamFrame.create_data_continued(stream_id, b"x" * 962) for _ in range(count)]
+
+
+def test_send_scheduler_control_frames_first():
+    # Arrange
+    scheduler = SendScheduler(1000)
+    stream_id = 1
+    # Act
+    for frame in create_scheduler_frames(stream_id, 2):
+        scheduler.put(frame)
+    scheduler.put(StreamFrame.create_window_update(StreamFrame.NULL_ID, 1000))
+    # Assert
+    assert scheduler.qsize() == 3
+    assert scheduler.get(0).is_window_update()
+    assert scheduler.get(0).is_data()
+    assert scheduler.qsize() == 1
+
+
+def test_send_scheduler_stop_wakes_waiting_get():
+    # Arrange
+    scheduler = SendScheduler(1000)
+    results = []
+    thread = Thread(target=lambda: results.append(scheduler.get()))
+    thread.start()
+    thread.join(0.1)
+    waited = thread.is_alive()
+    # Act
+    scheduler.stop()
+    thread.join(1)
+    # Assert
+    assert waited
+    assert not thread.is_alive()
+    assert results == [None]
+
+
+def test_send_scheduler_round_robin_equal_priority():
+    # Arrange
+    scheduler = SendScheduler(1000)
+    first_id = 1
+    second_id = 3
+    # Act
+    for frame in create_scheduler_frames(first_id, 4):
+        scheduler.put(frame)
+    for frame in create_scheduler_frames(second_id, 2):
+        scheduler.put(frame)
+    order = [scheduler.get(0).stream_id for _ in range(6)]
+    # Assert
+    # large transfer queued first does not hold back other stream
+    assert order == [first_id, second_id, first_id, second_id, first_id, first_id]
+    assert scheduler.get(0) is None
+
+
+def test_send_scheduler_weighted_by_priority():
+    # Arrange
+    scheduler = SendScheduler(1000)
+    high_id = 1
+    low_id = 3
+    scheduler.set_priority(high_id, SendScheduler.DEFAULT_PRIORITY * 2)
+    # Act
+    for frame in create_scheduler_frames(low_id, 10):
+        scheduler.put(frame)
+    for frame in create_scheduler_frames(high_id, 10):
+        scheduler.put(frame)
+    order = [scheduler.get(0).stream_id for _ in range(9)]
+    # Assert
+    assert order.count(high_id) == 6
+    assert order.count(low_id) == 3
+
+
+def test_send_scheduler_keeps_stream_order():
+    # Arrange
+    scheduler = SendScheduler(1000)
+    stream_id = 1
+    frames = create_scheduler_frames(stream_id, 3)
+    frames.append(StreamFrame.create_close(stream_id))
+    # Act
+    for frame in frames:
+        scheduler.put(frame)
+    # Assert
+    assert [scheduler.get(0) for _ in range(4)] == frames
+
+
+def test_send_scheduler_priority_clamped():
+    # Arrange
+    scheduler = SendScheduler(1000)
+    stream_id = 1
+    # Act
+    scheduler.set_priority(stream_id, 100000)
+    # Assert
+    assert scheduler.get_priority(stream_id) == SendScheduler.MAX_PRIORITY
+    scheduler.forget(stream_id)
+    assert scheduler.get_priority(stream_id) == SendScheduler.DEFAULT_PRIORITY
+
+
+def test_frame_gen_frame_size_shrinks_with_competing_streams():
+    # Arrange
+    settings = StreamSettings(1024000, 1024000, 64000, 1024000, 5, 0)
+    manager = StreamManager(None, uuid.uuid4(), "test", settings, None, False)
+    gen = manager.create_handler().stream_frame_gen
+    # Act
+    alone_size = gen.frame_size
+    for stream_id in range(2, 8, 2):
+        manager.send_buffer.put(StreamFrame.create_data_last(stream_id, b"x"))
+    competing_size = gen.frame_size
+    for stream_id in range(8, 208, 2):
+        manager.send_buffer.put(StreamFrame.create_data_last(stream_id, b"x"))
+    crowded_size = gen.frame_size
+    # Assert
+    assert alone_size == 32000
+    assert competing_size == 8000
+    assert crowded_size == gen.frame_min_size == 2000
+
+
+def test_frame_gen_frame_size_bounds():
+    # Arrange
+    settings = StreamSettings(1024000, 1024000, 64000, 1024000, 5, 0)
+    manager = StreamManager(None, uuid.uuid4(), "test", settings, None, False)
+    gen = manager.create_handler().stream_frame_gen
+    # Act
+    gen.set_frame_size_bounds(500, 1000000)
+    # Assert
+    # max is limited to half of frame max size, to leave room for encoding
+    assert gen.frame_max_size == 32000
+    assert gen.frame_min_size == 500
+    gen.frame_size = 1000
+    assert gen.frame_size == 1000
+    frames = list(gen.from_data(b"x" * 2500))
+    assert [len(frame.data) for frame in frames] == [1000, 1000, 500]
+    assert frames[-1].is_last()
+
+
+def test_timer_wheel_runs_expired_and_skips_cancelled():
+    # Arrange
+    wheel = TimerWheel(0.01, 4)
+    fired = []
+    # Act
+    wheel.schedule(0.02, lambda: fired.append("soon"))
+    # longer than one revolution of wheel
+    wheel.schedule(0.1, lambda: fired.append("later"))
+    wheel.schedule(0.02, lambda: fired.append("cancelled")).cancel()
+    sleep(0.05)
+    wheel.advance()
+    fired_early = list(fired)
+    sleep(0.1)
+    wheel.advance()
+    # Assert
+    assert fired_early == ["soon"]
+    assert fired == ["soon", "later"]
+
+
+def test_timer_wheel_cascades_levels_without_firing_early():
+    # Arrange
+    wheel = TimerWheel(0.01, 4, 2)
+    fired = []
+    # Act
+    # second level, then beyond range of both levels
+    wheel.schedule(0.1, lambda: fired.append("second level"))
+    wheel.schedule(0.3, lambda: fired.append("beyond range"))
+    cancelled = wheel.schedule(0.3, lambda: fired.append("cancelled"))
+    cancelled.cancel()
+    entry_count = wheel.get_entry_count()
+    checks = []
+    for delay in (0.07, 0.08, 0.2):
+        sleep(delay)
+        wheel.advance()
+        checks.append(list(fired))
+    # Assert
+    assert entry_count == 2
+    assert checks == [[], ["second level"], ["second level", "beyond range"]]
+    assert wheel.get_entry_count() == 0
+
+
+def test_manager_reuses_released_handler():
+    # Arrange
+    settings = StreamSettings(1024000, 1024000, 64000, 1024000, 5, 0)
+    manager = StreamManager(None, uuid.uuid4(), "test", settings, None, False)
+    handler = manager.create_handler()
+    old_stream_id = handler.stream_id
+    wrapper = StreamHandler(handler)
+    # Act
+    # handler is reused only once both manager and owner released it
+    manager.remove_handler(handler)
+    manager.recycle_released_handlers()
+    not_yet_reused = manager.create_handler()
+    manager.release_handler(handler)
+    manager.recycle_released_handlers()
+    reused = manager.create_handler()
+    # removing by old stream id leaves reused handler alone
+    manager.remove_handler(handler, old_stream_id)
+    # Assert
+    assert not_yet_reused is not handler
+    assert reused is handler
+    assert reused.stream_id != old_stream_id
+    assert not reused.is_stopped()
+    assert manager.streams.get(reused.stream_id) is reused
+    assert wrapper.is_stopped()
+    assert wrapper.stream_id == old_stream_id
+    with pytest.raises(StreamHandlerStoppedException):
+        wrapper.read(100)
+
+
+def test_reaper_closes_timed_out_handler_without_waiting_for_send_buffer():
+    # Arrange
+    settings = StreamSettings(1024000, 1024000, 64000, 1024000, 1, 0)
+    manager = StreamManager(None, uuid.uuid4(), "test", settings, None, False)
+    handler = manager.create_handler()
+    # send buffer is full, so a blocking close would wait until stream's frames are sent
+    handler.send_buffer_gate.add(settings.send_buffer_size + 1)
+    handler.last_active_time -= 2
+    reaper = Reaper()
+    # Act
+    check_thread = Thread(target=reaper.check_handler, args=(manager, handler, handler.stream_id), daemon=True)
+    check_thread.start()
+    check_thread.join(2.0)
+    # Assert
+    assert not check_thread.is_alive()
+    assert handler.is_stopped()
+    frame = manager.send_buffer.get(0)
+    assert frame.is_close()
+    assert frame.data == b"handler timed out"
+    reaper.stop()
+
+
+def test_reaper_does_not_close_handler_reused_while_checking():
+    # Arrange
+    settings = StreamSettings(1024000, 1024000, 64000, 1024000, 1, 0)
+    manager = StreamManager(None, uuid.uuid4(), "test", settings, None, False)
+    handler = manager.create_handler()
+    stream_id = handler.stream_id
+    handler.last_active_time -= 2
+    reaper = Reaper()
+    # Act
+    with manager.handlers_lock:
+        check_thread = Thread(target=reaper.check_handler, args=(manager, handler, stream_id), daemon=True)
+        check_thread.start()
+        check_thread.join(0.1)
+        waited = check_thread.is_alive()
+        # handler is released and reused for a new stream before reaper gets to check it
+        manager.streams.pop(stream_id)
+        handler.reset(stream_id + 2)
+        manager.streams[handler.stream_id] = handler
+    check_thread.join(2.0)
+    # Assert
+    assert waited
+    assert not handler.is_stopped()
+    assert manager.send_buffer.get(0) is None
+    reaper.stop()
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_frame_round_trip(compact):
+    # Arrange
+    first, second = socket.socketpair()
+    sender, receiver = SocketCeptic(first), SocketCeptic(second)
+    frame = StreamFrame.create_data_last(3, b"payload")
+    # Act
+    try:
+        frame.send(sender, compact)
+        if not compact:
+            # legacy wire format carries stream id as uuid string
+            raw_id = second.recv(36, socket.MSG_PEEK).decode()
+        received = StreamFrame.from_socket(receiver, 1000, compact=compact)
+    finally:
+        first.close()
+        second.close()
+    # Assert
+    if not compact:
+        assert raw_id == str(uuid.UUID(int=3))
+    assert received.stream_id == 3
+    assert received.data == b"payload"
+    assert received.is_data_last()
@@ -0,0 +1,55 @@
+from ceptic.tracing import CepticHooks, HookRegistry
+
+
+class FrameHooks(CepticHooks):
+    def __init__(self):
+        self.frames = []
+
+    def on_frame_sent(self, manager, frame):
+        self.frames.append(frame)
+
+
+class FailingHooks(CepticHooks):
+    def on_frame_sent(self, manager, frame):
+        raise ValueError("broken hook")
+
+
+def test_hook_registry_only_keeps_overridden_callbacks():
+    # Arrange
+    registry = HookRegistry()
+    hooks = FrameHooks()
+    # Act
+    registry.add(hooks)
+    # Assert
+    assert len(registry) == 1
+    assert registry.frame_sent == (hooks.on_frame_sent,)
+    # methods not overridden are never called
+    assert registry.frame_received == ()
+    assert registry.endpoint_start == ()
+
+
+def test_hook_registry_remove():
+    # Arrange
+    registry = HookRegistry()
+    hooks = FrameHooks()
+    registry.add(hooks)
+    # Act
+    removed = registry.remove(hooks)
+    removed_again = registry.remove(hooks)
+    # Assert
+    assert removed
+    assert not removed_again
+    assert len(registry) == 0
+    assert registry.frame_sent == ()
+
+
+def test_hook_registry_call_ignores_hook_exceptions():
+    # Arrange
+    registry = HookRegistry()
+    hooks = FrameHooks()
+    registry.add(FailingHooks())
+    registry.add(hooks)
+    # Act
+    registry.call(registry.frame_sent, None, "frame")
+    # Assert
+    assert hooks.frames == ["frame"]